@@ -0,0 +1,20 @@
+# Loaded automatically by gunicorn from the working directory.
+import os
+import shutil
+import tempfile
+
+# Workers write their Prometheus metrics here so /metrics can add them up
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'prometheus-metrics'))
+
+
+def on_starting(server):
+    # Values of a previous run would be added to the new ones
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
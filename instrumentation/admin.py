@@ -0,0 +1,68 @@
+import json
+
+from django.contrib import admin, messages
+from django.http import HttpResponse
+from django.utils.html import format_html
+
+from .models import RequestProfile, SlowQuery
+
+
+@admin.register(RequestProfile)
+class RequestProfileAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'user', 'status_code', 'duration_ms', 'query_count', 'db_ms')
+    list_filter = ('method', 'status_code', 'url_name')
+    list_select_related = ('user',)
+    search_fields = ('path', 'url_name', 'user__username')
+    date_hierarchy = 'created_at'
+    actions = ('download_stats',)
+    fields = (
+        'created_at', 'user', 'method', 'path', 'query_string', 'url_name', 'status_code',
+        'duration_ms', 'query_count', 'db_ms', 'sql_summary_display', 'report_display',
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='SQL summary')
+    def sql_summary_display(self, obj):
+        return format_html('<pre>{}</pre>', json.dumps(obj.sql_summary, indent=2))
+
+    @admin.display(description='Profile')
+    def report_display(self, obj):
+        return format_html('<pre style="font-size: 12px">{}</pre>', obj.report)
+
+    @admin.action(description='Download pstats file of the selected profile')
+    def download_stats(self, request, queryset):
+        if queryset.count() != 1:
+            messages.warning(request, 'Select exactly one profile to download.')
+            return None
+        profile = queryset.get()
+        response = HttpResponse(bytes(profile.stats), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.prof"'
+        return response
+
+
+@admin.register(SlowQuery)
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'url_name', 'count', 'avg_ms', 'max_ms', 'last_seen')
+    list_filter = ('url_name',)
+    search_fields = ('normalized_sql', 'url_name')
+    fields = (
+        'fingerprint', 'url_name', 'count', 'avg_ms', 'max_ms', 'first_seen', 'last_seen',
+        'normalized_sql', 'example_sql', 'example_params', 'plan_display',
+    )
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description='Plan')
+    def plan_display(self, obj):
+        return format_html('<pre>{}</pre>', obj.plan)
@@ -0,0 +1,142 @@
+"""
+End-to-end endpoint benchmarks.
+
+Each Endpoint is a sequence of requests made through the Django test
+client, timed as one sample. run_benchmarks() collects p50/p95 latency and
+the query count per endpoint; compare() checks the results against a stored
+baseline. The `benchmark` management command ties both to a JSON file.
+"""
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from workspaces.models import Project
+
+AJAX_HEADERS = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+@dataclass
+class Endpoint:
+    name: str
+    # (method, url, params, extra) per request of one sample
+    requests: list = field(default_factory=list)
+
+
+def hot_endpoints(user):
+    """The endpoints users hit most, parametrized for `user`'s data."""
+    today = timezone.localdate()
+    report_range = {'start_date': (today - timedelta(days=30)).isoformat(), 'end_date': today.isoformat()}
+    project = Project.objects.filter(organization__members=user).order_by('pk').first()
+    entry_filter = dict(report_range, project=project.pk if project else '')
+
+    endpoints = [
+        Endpoint('home', [('get', reverse('workspaces:home'), {}, {})]),
+        Endpoint('timer_start_stop', [
+            ('post', reverse('workspaces:start_timer'), {'title': 'Benchmark'}, {}),
+            ('post', reverse('workspaces:stop_timer'), {}, {}),
+        ]),
+        Endpoint('entry_list', [('get', reverse('workspaces:time_entry_list'), {}, {})]),
+        Endpoint('entry_list_filtered', [('get', reverse('workspaces:time_entry_list'), entry_filter, {})]),
+    ]
+    for period in ('7d', '30d', '3m', '1y', 'all'):
+        endpoints.append(Endpoint(f'analytics_{period}', [
+            ('get', reverse('workspaces:analytics:dashboard'), {'period': period}, AJAX_HEADERS),
+        ]))
+    endpoints += [
+        Endpoint('report_html', [('get', reverse('reports:reports'), report_range, {})]),
+        Endpoint('report_csv', [('get', reverse('reports:reports'), dict(report_range, export='csv'), {})]),
+        Endpoint('report_pdf', [('get', reverse('reports:reports'), dict(report_range, export='pdf'), {})]),
+        Endpoint('invoice_list', [('get', reverse('invoicing:invoice_list'), {}, {})]),
+        Endpoint('invoice_list_json', [('get', reverse('invoicing:invoice_list'), {}, AJAX_HEADERS)]),
+    ]
+    return endpoints
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def _consume(response):
+    # Streaming responses only do their work when iterated
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+def measure(client, endpoint, repeat=20, warmup=2):
+    """Times `repeat` samples of the endpoint after `warmup` untimed ones."""
+    durations = []
+    statuses = set()
+    query_count = 0
+    for iteration in range(warmup + repeat):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for method, url, params, extra in endpoint.requests:
+                # secure: with SECURE_SSL_REDIRECT every plain request is a 301
+                response = getattr(client, method)(url, params, secure=True, **extra)
+                _consume(response)
+                statuses.add(response.status_code)
+            elapsed = time.perf_counter() - started
+        if iteration >= warmup:
+            durations.append(elapsed)
+            query_count = max(query_count, len(queries))
+    return {
+        'p50_ms': round(percentile(durations, 50) * 1000, 2),
+        'p95_ms': round(percentile(durations, 95) * 1000, 2),
+        'queries': query_count,
+        'statuses': sorted(statuses),
+    }
+
+
+def run_benchmarks(client, endpoints, repeat=20, warmup=2):
+    return {endpoint.name: measure(client, endpoint, repeat, warmup) for endpoint in endpoints}
+
+
+def compare(results, baseline, threshold=0.2, min_delta_ms=5.0):
+    """
+    Regression messages for endpoints that answered with an error, whose
+    statuses differ from the baseline's, whose p95 grew by more than
+    `threshold` (a fraction) and `min_delta_ms`, or that run more queries.
+    Endpoints missing from the baseline are only checked for errors.
+    """
+    regressions = []
+    for name, result in results.items():
+        errors = [status for status in result['statuses'] if status >= 400]
+        if errors:
+            regressions.append(f"{name}: answered {', '.join(str(status) for status in errors)}")
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result['statuses'] != previous['statuses']:
+            regressions.append(f"{name}: statuses {result['statuses']}, baseline {previous['statuses']}")
+        allowed = max(previous['p95_ms'] * (1 + threshold), previous['p95_ms'] + min_delta_ms)
+        if result['p95_ms'] > allowed:
+            regressions.append(
+                f"{name}: p95 {result['p95_ms']:.1f}ms exceeds baseline {previous['p95_ms']:.1f}ms "
+                f"by more than {threshold:.0%}"
+            )
+        if result['queries'] > previous['queries']:
+            regressions.append(f"{name}: {result['queries']} queries, baseline {previous['queries']}")
+    return regressions
+
+
+def load_baseline(path):
+    with open(path) as baseline_file:
+        return json.load(baseline_file)['endpoints']
+
+
+def save_baseline(path, results, **meta):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as baseline_file:
+        json.dump(dict(meta, endpoints=results), baseline_file, indent=2, sort_keys=True)
+        baseline_file.write('\n')
@@ -0,0 +1,84 @@
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from instrumentation.benchmarks import compare, hot_endpoints, load_baseline, run_benchmarks, save_baseline
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'baseline.json'
+
+
+class Command(BaseCommand):
+    help = (
+        'Times the hot endpoints through the test client against the current database '
+        '(see generate_load_data) and compares p50/p95 latency and query counts with a JSON baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to benchmark as. Defaults to the first non-staff member of an organization.')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed samples per endpoint.')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed samples per endpoint.')
+        parser.add_argument('--endpoint', action='append', dest='endpoints', help='Only run these endpoints.')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline JSON file.')
+        parser.add_argument('--save', action='store_true', help='Store the results as the new baseline.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed p95 growth over the baseline, as a fraction.')
+        parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                            help='p95 growth always allowed, so fast endpoints do not fail on noise.')
+
+    def handle(self, *args, **options):
+        user = self._get_user(options['user'])
+        endpoints = hot_endpoints(user)
+        if options['endpoints']:
+            endpoints = [endpoint for endpoint in endpoints if endpoint.name in options['endpoints']]
+            if not endpoints:
+                raise CommandError('None of the requested endpoints exist.')
+
+        client = Client(raise_request_exception=False)
+        client.force_login(user)
+        # Timer requests write entries; the benchmark leaves the data as it found it
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), transaction.atomic():
+            results = run_benchmarks(client, endpoints, options['repeat'], options['warmup'])
+            transaction.set_rollback(True)
+
+        self._report(results)
+
+        baseline_path = Path(options['baseline'])
+        if options['save']:
+            save_baseline(baseline_path, results, created_at=timezone.now().isoformat(), repeat=options['repeat'])
+            self.stdout.write(self.style.SUCCESS(f'Baseline saved to {baseline_path}.'))
+            return
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f'No baseline at {baseline_path}; run with --save to create one.'))
+            return
+
+        regressions = compare(results, load_baseline(baseline_path), options['threshold'], options['min_delta_ms'])
+        if regressions:
+            raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def _get_user(self, username):
+        User = get_user_model()
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User "{username}" does not exist.')
+        # Staff requests are profiled by QueryProfilingMiddleware, which would skew the timings
+        user = User.objects.filter(is_staff=False, organizations__isnull=False).order_by('pk').first()
+        if user is None:
+            raise CommandError('No organization member found; run generate_load_data first or pass --user.')
+        return user
+
+    def _report(self, results):
+        self.stdout.write(f"{'endpoint':<24}{'p50 ms':>10}{'p95 ms':>10}{'queries':>9}  status")
+        for name, result in results.items():
+            statuses = ', '.join(str(status) for status in result['statuses'])
+            line = f"{name:<24}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['queries']:>9}  {statuses}"
+            if any(status >= 400 for status in result['statuses']):
+                line = self.style.WARNING(line)
+            self.stdout.write(line)
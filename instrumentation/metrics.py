@@ -0,0 +1,93 @@
+"""
+Prometheus metrics.
+
+Process-local metrics are prometheus_client objects. Under gunicorn,
+set PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py does) so every worker
+writes its values to memory-mapped files in that directory and /metrics
+aggregates all workers, whichever one serves the scrape. Without it the
+metrics are those of the current process only, which suits runserver.
+
+Values that live in the database (running timers, pending payment
+reminders) are
+read at scrape time by DatabaseCollector instead of being tracked per
+process.
+"""
+import os
+
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+
+PDF_SPAN_NAME = 'pisa.pisaDocument'
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by URL name.', ['url_name', 'method'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30), registry=None,
+)
+REQUEST_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries per request by URL name.', ['url_name'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 250, 1000), registry=None,
+)
+DB_QUERIES = Counter('db_queries_total', 'Database queries run while serving requests.', ['url_name'], registry=None)
+PDF_RENDER = Histogram(
+    'pdf_render_duration_seconds', 'Time spent rendering PDFs with xhtml2pdf.',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60), registry=None,
+)
+OUTBOUND_CALLS = Histogram(
+    'outbound_call_duration_seconds',
+    'Traced outbound and CPU-heavy calls by URL name of the request, span name and outcome.',
+    ['endpoint', 'name', 'outcome'], registry=None,
+)
+# Hit rate: rate(..{result="hit"}) / rate(..) summed over both results
+TRANSLATION_CACHE = Counter(
+    'translation_cache_requests_total', 'Translation lookups by cache result (hit or miss).', ['result'], registry=None,
+)
+
+PROCESS_METRICS = (REQUEST_LATENCY, REQUEST_QUERIES, DB_QUERIES, PDF_RENDER, OUTBOUND_CALLS, TRANSLATION_CACHE)
+
+
+def multiprocess_mode():
+    return bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+
+class DatabaseCollector:
+    """Gauges computed from the database on every scrape."""
+
+    def collect(self):
+        from invoicing.reminders import overdue_invoices_to_remind
+        from workspaces.models import TimeEntry
+
+        yield GaugeMetricFamily(
+            'active_timers', 'Time entries currently running.',
+            value=TimeEntry.objects.filter(end_time__isnull=True).count(),
+        )
+        yield GaugeMetricFamily(
+            'payment_reminders_pending',
+            'Payment reminders not yet sent: overdue unpaid invoices of opted-in contacts never reminded.',
+            value=overdue_invoices_to_remind().count(),
+        )
+
+
+def scrape_registry():
+    registry = CollectorRegistry()
+    if multiprocess_mode():
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        for metric in PROCESS_METRICS:
+            registry.register(metric)
+    registry.register(DatabaseCollector())
+    return registry
+
+
+def render_metrics():
+    return generate_latest(scrape_registry())
+
+
+class MetricsExporter:
+    """Tracing exporter turning spans into outbound call and PDF render histograms."""
+
+    def export(self, span):
+        seconds = span.duration_ms / 1000
+        # Spans outside a request (commands, startup) have no endpoint
+        OUTBOUND_CALLS.labels(span.endpoint or '-', span.name, span.outcome).observe(seconds)
+        if span.name == PDF_SPAN_NAME:
+            PDF_RENDER.observe(seconds)
@@ -0,0 +1,372 @@
+"""
+Per-request SQL, template and CPU profiling.
+
+QueryProfilingMiddleware records every query run while the request is
+handled, plus the time spent rendering TemplateResponses, and reports them
+as Server-Timing headers (visible in the browser devtools network tab) and
+as one JSON log line on the 'instrumentation.requests' logger.
+
+TracingMiddleware attributes the spans of instrumentation.tracing to the
+endpoint they ran for and logs the dependency cost of each request.
+
+MetricsMiddleware feeds the Prometheus request latency and query count
+histograms of instrumentation.metrics.
+
+SlowQueryLogMiddleware, when SLOW_QUERY_LOG_ENABLED is set, logs statements
+over SLOW_QUERY_THRESHOLD_MS and records a sample of them with their EXPLAIN
+plan (see instrumentation.slow_queries).
+
+RequestProfilerMiddleware, when REQUEST_PROFILER_ENABLED is set, runs single
+requests of staff users under cProfile on demand and stores the result as a
+RequestProfile, browsable in the admin.
+
+The body of a StreamingHttpResponse (the NDJSON sync, CSV and zip exports)
+is produced after these middlewares return and their execute_wrappers are
+removed, so the queries it runs are not counted, timed or profiled.
+"""
+import cProfile
+import io
+import json
+import logging
+import marshal
+import pstats
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from . import metrics, slow_queries
+from .models import RequestProfile
+from .tracing import OUTCOME_ERROR, current_request
+
+logger = logging.getLogger('instrumentation.requests')
+tracing_logger = logging.getLogger('instrumentation.tracing')
+
+SLOWEST_QUERY_COUNT = 3
+DUPLICATE_GROUP_COUNT = 5
+SQL_PREVIEW_LENGTH = 80
+
+# `?_profile=1` or an `X-Profile: 1` header asks for a CPU profile
+PROFILE_QUERY_PARAM = '_profile'
+PROFILE_HEADER = 'X-Profile'
+PROFILE_REPORT_LINES = 60
+PROFILE_CALLEE_LINES = 20
+
+
+class QueryRecorder:
+    """execute_wrapper collecting (sql, duration in seconds) of each query."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    @property
+    def total_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def slowest(self, count=SLOWEST_QUERY_COUNT):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:count]
+
+    def duplicate_groups(self, count=DUPLICATE_GROUP_COUNT):
+        """
+        Statements executed more than once, most repeated first. Parameters
+        are not part of the SQL text, so an N+1 loop shows up as one group.
+        """
+        repeated = Counter(sql for sql, _ in self.queries)
+        return [(sql, times) for sql, times in repeated.most_common(count) if times > 1]
+
+
+def _header_text(text, length=SQL_PREVIEW_LENGTH):
+    """Squeezes text into a quoted-string safe for a Server-Timing desc."""
+    text = re.sub(r'\s+', ' ', text).strip()
+    text = text.encode('ascii', 'replace').decode('ascii').replace('\\', '/').replace('"', "'")
+    return text[:length]
+
+
+# URL name label of requests that match no URL pattern
+UNMATCHED_URL_NAME = 'unmatched'
+
+
+# Request attribute caching the URL name for the other middleware
+URL_NAME_ATTRIBUTE = '_instrumentation_url_name'
+
+
+def _url_name(request):
+    """View name of the request, resolved at most once per request."""
+    if not hasattr(request, URL_NAME_ATTRIBUTE):
+        match = getattr(request, 'resolver_match', None)
+        if match is None:
+            try:
+                match = resolve(request.path_info, getattr(request, 'urlconf', None))
+            except Resolver404:
+                match = None
+        setattr(request, URL_NAME_ATTRIBUTE, match.view_name if match else None)
+    return getattr(request, URL_NAME_ATTRIBUTE)
+
+
+def _sql_summary(recorder):
+    return {
+        'slowest_queries': [
+            {'sql': sql, 'ms': round(duration * 1000, 1)} for sql, duration in recorder.slowest()
+        ],
+        'duplicate_queries': [{'sql': sql, 'count': times} for sql, times in recorder.duplicate_groups()],
+    }
+
+
+def _should_profile(request):
+    if getattr(settings, 'QUERY_PROFILING_ENABLED', False):
+        return True
+    user = getattr(request, 'user', None)
+    return bool(getattr(settings, 'QUERY_PROFILING_STAFF', False) and user and user.is_staff)
+
+
+class QueryProfilingMiddleware:
+    """
+    Profiles requests when QUERY_PROFILING_ENABLED is set, and those of staff
+    users when QUERY_PROFILING_STAFF is. Must come after
+    AuthenticationMiddleware so the staff check can see the user.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _should_profile(request):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._profiling = {'template_time': 0.0}
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total_time = time.perf_counter() - started
+
+        template_time = request._profiling['template_time']
+        response['Server-Timing'] = self._server_timing(recorder, template_time, total_time)
+        self._log(request, response, recorder, template_time, total_time)
+        return response
+
+    def process_template_response(self, request, response):
+        profiling = getattr(request, '_profiling', None)
+        if profiling is not None:
+            # Called right before the handler renders the response
+            started = time.perf_counter()
+
+            def record_render_time(rendered):
+                profiling['template_time'] += time.perf_counter() - started
+
+            response.add_post_render_callback(record_render_time)
+        return response
+
+    def _server_timing(self, recorder, template_time, total_time):
+        metrics = [
+            f'db;dur={recorder.total_time * 1000:.1f};desc="{len(recorder.queries)} queries"',
+            f'tpl;dur={template_time * 1000:.1f};desc="Template render"',
+            f'total;dur={total_time * 1000:.1f}',
+        ]
+        for index, (sql, duration) in enumerate(recorder.slowest(), start=1):
+            metrics.append(f'sql-{index};dur={duration * 1000:.1f};desc="{_header_text(sql)}"')
+        duplicates = recorder.duplicate_groups()
+        if duplicates:
+            repeated = sum(times for _, times in duplicates)
+            metrics.append(f'dup;desc="{len(duplicates)} repeated statements, {repeated} executions"')
+        return ', '.join(metrics)
+
+    def _log(self, request, response, recorder, template_time, total_time):
+        user = getattr(request, 'user', None)
+        logger.info(json.dumps({
+            'event': 'request_profile',
+            'method': request.method,
+            'path': request.path,
+            'url_name': _url_name(request),
+            'status': response.status_code,
+            'user_id': user.pk if user and user.is_authenticated else None,
+            'duration_ms': round(total_time * 1000, 1),
+            'query_count': len(recorder.queries),
+            'db_ms': round(recorder.total_time * 1000, 1),
+            'template_ms': round(template_time * 1000, 1),
+            **_sql_summary(recorder),
+        }))
+
+
+def _wants_cpu_profile(request):
+    if not getattr(settings, 'REQUEST_PROFILER_ENABLED', False):
+        return False
+    user = getattr(request, 'user', None)
+    if not (user and user.is_staff):
+        return False
+    return request.GET.get(PROFILE_QUERY_PARAM) == '1' or request.headers.get(PROFILE_HEADER) == '1'
+
+
+def _profile_report(stats):
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats('cumulative').print_stats(PROFILE_REPORT_LINES)
+    stats.print_callees(PROFILE_CALLEE_LINES)
+    return stream.getvalue()
+
+
+class RequestProfilerMiddleware:
+    """
+    Runs the request under cProfile when a staff user asks for it and stores
+    a RequestProfile with the call statistics and an SQL summary. The
+    response carries the profile's id in an X-Profile-Id header. Must come
+    after AuthenticationMiddleware, and only runs with REQUEST_PROFILER_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not _wants_cpu_profile(request):
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - started
+
+        stats = pstats.Stats(profiler)
+        profile = RequestProfile.objects.create(
+            user=request.user,
+            method=request.method,
+            path=request.path,
+            query_string=request.META.get('QUERY_STRING', ''),
+            url_name=_url_name(request) or '',
+            status_code=response.status_code,
+            duration_ms=round(duration * 1000, 1),
+            query_count=len(recorder.queries),
+            db_ms=round(recorder.total_time * 1000, 1),
+            sql_summary=_sql_summary(recorder),
+            report=_profile_report(stats),
+            stats=marshal.dumps(stats.stats),
+        )
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
+
+
+def _dependency_totals(spans):
+    totals = {}
+    for span in spans:
+        dependency = totals.setdefault(span.name, {'count': 0, 'ms': 0.0, 'errors': 0})
+        dependency['count'] += 1
+        dependency['ms'] = round(dependency['ms'] + span.duration_ms, 2)
+        dependency['errors'] += span.outcome == OUTCOME_ERROR
+    return totals
+
+
+class TracingMiddleware:
+    """
+    Tags spans with the URL name of the request they ran in, and logs one
+    'request_dependencies' line per request that made traced calls.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request_spans = {'endpoint': _url_name(request), 'spans': []}
+        token = current_request.set(request_spans)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+        if request_spans['spans']:
+            tracing_logger.info(json.dumps({
+                'event': 'request_dependencies',
+                'method': request.method,
+                'path': request.path,
+                'url_name': request_spans['endpoint'],
+                'status': response.status_code,
+                'dependencies': _dependency_totals(request_spans['spans']),
+            }))
+        return response
+
+
+class QueryCounter:
+    """execute_wrapper that only counts queries."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """
+    Observes request latency and query count per URL name. Unresolved
+    paths share one label so scanners cannot blow up the label set.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        url_name = _url_name(request) or UNMATCHED_URL_NAME
+        metrics.REQUEST_LATENCY.labels(url_name, request.method).observe(duration)
+        metrics.REQUEST_QUERIES.labels(url_name).observe(counter.count)
+        metrics.DB_QUERIES.labels(url_name).inc(counter.count)
+        return response
+
+
+class SlowQueryLogMiddleware:
+    """
+    Collects slow statements while the request runs when SLOW_QUERY_LOG_ENABLED
+    is set. Once the response is ready they are logged, and only sampled
+    requests pay for the EXPLAIN and SlowQuery writes (see slow_queries.sampled).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'SLOW_QUERY_LOG_ENABLED', False):
+            return self.get_response(request)
+
+        threshold = slow_queries.threshold_ms()
+        recorders = [slow_queries.SlowQueryRecorder(connection.alias, threshold) for connection in connections.all()]
+        with ExitStack() as stack:
+            for connection, recorder in zip(connections.all(), recorders):
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        statements = [statement for recorder in recorders for statement in recorder.statements]
+        if statements and not slow_queries.sampled():
+            slow_queries.log_slow_queries(statements, _url_name(request))
+        elif statements:
+            try:
+                slow_queries.store_slow_queries(statements, _url_name(request))
+            except Exception:
+                logger.exception('Recording %d slow queries failed', len(statements))
+        return response
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.23 on 2026-10-19 09:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('instrumentation', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=64, unique=True)),
+                ('normalized_sql', models.TextField()),
+                ('example_sql', models.TextField()),
+                ('example_params', models.TextField(blank=True)),
+                ('plan', models.TextField(blank=True)),
+                ('url_name', models.CharField(blank=True, max_length=200)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('total_ms', models.FloatField()),
+                ('max_ms', models.FloatField()),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name_plural': 'slow queries',
+                'ordering': ['-last_seen'],
+            },
+        ),
+    ]
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.db import models
+
+
+class RequestProfile(models.Model):
+    """A staff-requested cProfile run of a single request."""
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name='request_profiles')
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=2000)
+    query_string = models.TextField(blank=True)
+    url_name = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField(default=0)
+    db_ms = models.FloatField(default=0)
+    # Slowest and repeated statements, as in the request profiling log line
+    sql_summary = models.JSONField(default=dict)
+    # pstats report: functions by cumulative time, then their callees
+    report = models.TextField()
+    # marshal-dumped pstats data, loadable with pstats.Stats or snakeviz
+    stats = models.BinaryField()
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class SlowQuery(models.Model):
+    """A statement fingerprint that exceeded SLOW_QUERY_THRESHOLD_MS, with its plan."""
+    fingerprint = models.CharField(max_length=64, unique=True)
+    normalized_sql = models.TextField()
+    # First occurrence, as executed; the parameters are reduced to their types
+    # unless SLOW_QUERY_LOG_PARAMS is on
+    example_sql = models.TextField()
+    example_params = models.TextField(blank=True)
+    plan = models.TextField(blank=True)
+    # URL name of the view that last issued the statement
+    url_name = models.CharField(max_length=200, blank=True)
+    count = models.PositiveIntegerField(default=1)
+    total_ms = models.FloatField()
+    max_ms = models.FloatField()
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField(db_index=True)
+
+    class Meta:
+        ordering = ['-last_seen']
+        verbose_name_plural = 'slow queries'
+
+    def __str__(self):
+        return self.normalized_sql[:80]
+
+    @property
+    def avg_ms(self):
+        return round(self.total_ms / self.count, 2)
@@ -0,0 +1,174 @@
+"""
+Slow-query log.
+
+SlowQueryRecorder is an execute_wrapper keeping every statement slower than
+SLOW_QUERY_THRESHOLD_MS. After the response they are logged, and for a
+SLOW_QUERY_LOG_SAMPLE_RATE fraction of requests store_slow_queries() also
+folds them into one SlowQuery row per statement fingerprint; the first time
+a fingerprint is seen its plan is captured with EXPLAIN (EXPLAIN QUERY PLAN
+on SQLite). The table keeps the SLOW_QUERY_LOG_MAX_ROWS most
+recently seen fingerprints.
+
+Parameter values can hold personal data, so only their types are stored
+unless SLOW_QUERY_LOG_PARAMS is turned on.
+"""
+import hashlib
+import json
+import logging
+import random
+import re
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import SlowQuery
+
+logger = logging.getLogger('instrumentation.slow_queries')
+
+DEFAULT_THRESHOLD_MS = 100
+DEFAULT_MAX_ROWS = 500
+DEFAULT_SAMPLE_RATE = 1.0
+
+
+@dataclass
+class SlowStatement:
+    alias: str
+    sql: str
+    params: object
+    many: bool
+    duration_ms: float
+
+
+def normalize_sql(sql):
+    """SQL with literals and IN-list lengths removed, so equal statements compare equal."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+    sql = re.sub(r'%s', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(...)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha256(normalize_sql(sql).encode()).hexdigest()
+
+
+def redact_params(params):
+    """The parameters as stored: their repr with SLOW_QUERY_LOG_PARAMS on, otherwise only their types."""
+    if getattr(settings, 'SLOW_QUERY_LOG_PARAMS', False):
+        return repr(params)
+    if params is None:
+        return ''
+    if isinstance(params, dict):
+        return repr({key: type(value).__name__ for key, value in params.items()})
+    return repr(tuple(type(value).__name__ for value in params))
+
+
+def threshold_ms():
+    return getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', DEFAULT_THRESHOLD_MS)
+
+
+def sampled():
+    """Whether this request's slow statements are recorded, not only logged."""
+    return random.random() < getattr(settings, 'SLOW_QUERY_LOG_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+
+
+class SlowQueryRecorder:
+    """execute_wrapper collecting the statements of one connection that exceed the threshold."""
+
+    def __init__(self, alias, threshold):
+        self.alias = alias
+        self.threshold = threshold
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms >= self.threshold:
+            self.statements.append(SlowStatement(self.alias, sql, params, many, round(duration_ms, 2)))
+        return result
+
+
+def explain(statement):
+    """The plan of a SELECT statement as text, or '' when it cannot be explained."""
+    if statement.many or not statement.sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return ''
+    connection = connections[statement.alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {statement.sql}', statement.params)
+            rows = cursor.fetchall()
+    except DatabaseError as exc:
+        return f'EXPLAIN failed: {exc}'
+    if connection.vendor == 'sqlite':
+        # (id, parent, notused, detail)
+        return '\n'.join(str(row[-1]) for row in rows)
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+def _add_occurrence(key, statement, url_name, now):
+    return SlowQuery.objects.filter(fingerprint=key).update(
+        count=F('count') + 1,
+        total_ms=F('total_ms') + statement.duration_ms,
+        max_ms=Greatest('max_ms', statement.duration_ms),
+        url_name=url_name or '',
+        last_seen=now,
+    )
+
+
+def log_slow_queries(statements, url_name=None):
+    for statement in statements:
+        logger.warning(json.dumps({
+            'event': 'slow_query',
+            'ms': statement.duration_ms,
+            'url_name': url_name,
+            'fingerprint': fingerprint(statement.sql),
+            'sql': statement.sql,
+        }))
+
+
+def store_slow_queries(statements, url_name=None):
+    """Logs the statements and records them per fingerprint, explaining new ones."""
+    log_slow_queries(statements, url_name)
+    created_any = False
+    now = timezone.now()
+    for statement in statements:
+        key = fingerprint(statement.sql)
+        if _add_occurrence(key, statement, url_name, now):
+            continue
+        plan = explain(statement)
+        try:
+            with transaction.atomic():
+                SlowQuery.objects.create(
+                    fingerprint=key,
+                    normalized_sql=normalize_sql(statement.sql),
+                    example_sql=statement.sql,
+                    example_params=redact_params(statement.params),
+                    plan=plan,
+                    url_name=url_name or '',
+                    total_ms=statement.duration_ms,
+                    max_ms=statement.duration_ms,
+                    first_seen=now,
+                    last_seen=now,
+                )
+        except IntegrityError:
+            # Another worker recorded the fingerprint first
+            _add_occurrence(key, statement, url_name, now)
+        else:
+            created_any = True
+    if created_any:
+        rotate()
+
+
+def rotate(max_rows=None):
+    """Deletes all but the `max_rows` most recently seen fingerprints."""
+    if max_rows is None:
+        max_rows = getattr(settings, 'SLOW_QUERY_LOG_MAX_ROWS', DEFAULT_MAX_ROWS)
+    stale = list(SlowQuery.objects.order_by('-last_seen', '-pk').values_list('pk', flat=True)[max_rows:])
+    if stale:
+        SlowQuery.objects.filter(pk__in=stale).delete()
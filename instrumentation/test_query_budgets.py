@@ -0,0 +1,141 @@
+"""
+Query budgets per URL name.
+
+Every view is requested against a small and a larger dataset; the query
+count must stay within its budget and must not change with the number of
+rows, so an N+1 introduced anywhere fails here.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from invoicing.models import Invoice, InvoiceItem
+from subscriptions.models import Subscription, SubscriptionPlan
+from users.models import ApiToken, Organization, hash_api_key
+from workspaces.models import Contact, Project, TimeEntry, TimeEntryImage
+
+DATASET_SIZES = (1, 30)
+
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+REPORT_RANGE = {'start_date': (date.today() - timedelta(days=60)).isoformat(), 'end_date': date.today().isoformat()}
+
+SYNC_KEY = 'query-budget-sync-key'
+
+# (label, url name, method, data, extra, max queries). Each budget includes
+# the session and user lookups of the logged-in request and, as
+# SESSION_SAVE_EVERY_REQUEST is on, the session save (three statements).
+QUERY_BUDGETS = [
+    ('home', 'workspaces:home', 'get', {}, {}, 8),
+    ('entry list', 'workspaces:time_entry_list', 'get', {}, {}, 8),
+    ('entry list filtered', 'workspaces:time_entry_list', 'get', {'show_archived': 'on'}, {}, 7),
+    ('contacts', 'workspaces:manage_contacts', 'get', {}, {}, 7),
+    ('contacts invalid post', 'workspaces:manage_contacts', 'post', {'submit_client': '1', 'name': ''}, {}, 7),
+    ('invoice list', 'invoicing:invoice_list', 'get', {}, {}, 10),
+    ('invoice list json', 'invoicing:invoice_list', 'get', {}, AJAX, 10),
+    ('analytics json', 'workspaces:analytics:dashboard', 'get', {'period': '1y'}, AJAX, 9),
+    ('analytics', 'workspaces:analytics:dashboard', 'get', {'period': '1y'}, {}, 11),
+    ('daily earnings', 'workspaces:analytics:daily_earnings_tracker', 'get', {}, {}, 7),
+    ('project list', 'workspaces:project_list', 'get', {}, {}, 7),
+    ('report preview', 'reports:reports', 'get', REPORT_RANGE, {}, 8),
+    ('report preview grouped', 'reports:reports', 'get', dict(REPORT_RANGE, group_by='project,day'), {}, 9),
+    ('report csv', 'reports:reports', 'get', dict(REPORT_RANGE, export='csv'), {}, 7),
+    ('report csv grouped', 'reports:reports', 'get', dict(REPORT_RANGE, export='csv', group_by='project'), {}, 7),
+    ('report pdf', 'reports:reports', 'get', dict(REPORT_RANGE, export='pdf'), {}, 7),
+    # Token auth; the client's session cookie is still loaded and saved
+    ('sync', 'workspaces:time_entry_sync', 'get', {}, {'HTTP_AUTHORIZATION': f'Bearer {SYNC_KEY}'}, 8),
+]
+
+# home.html and the project's timeentry_list.html still reverse URLs of the
+# retired `tracker` app and cannot render yet. Their stand-ins reproduce the
+# per-row lookups of the real pages; every other page renders its own template.
+STAND_IN_TEMPLATES = {
+    'home.html': (
+        '{% extends "base.html" %}{% block content %}'
+        '{% for project in projects %}{{ project.name }}{% endfor %}'
+        '{% for entry in recent_entries %}{{ entry.title }} {{ entry.project.name|default:"No Project" }}{% endfor %}'
+        '{% endblock %}'
+    ),
+    'workspaces/timeentry_list.html': (
+        '{% extends "base.html" %}{% block content %}'
+        '{% for entry in entries %}{{ entry.title }} {{ entry.project.name|default:"-" }}'
+        '{% with entry.images.first as first_image %}{% if first_image %}{{ first_image.image.url }}{% endif %}'
+        '{% endwith %}{% endfor %}{% endblock %}'
+    ),
+}
+
+BUDGET_TEMPLATES = [dict(
+    settings.TEMPLATES[0],
+    APP_DIRS=False,
+    OPTIONS=dict(settings.TEMPLATES[0]['OPTIONS'], loaders=[
+        ('django.template.loaders.locmem.Loader', STAND_IN_TEMPLATES),
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+)]
+
+
+@override_settings(TEMPLATES=BUDGET_TEMPLATES)
+class QueryBudgetTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.organization = Organization.objects.create(name='Test Organization')
+        self.organization.members.add(self.user)
+        plan = SubscriptionPlan.objects.create(name='Pro', price=Decimal('10.00'), description='Pro plan')
+        Subscription.objects.create(
+            organization=self.organization, plan=plan, start_date=date(2024, 1, 1), end_date=date(2099, 1, 1)
+        )
+        ApiToken.objects.create(
+            organization=self.organization, name='Budget', key_hash=hash_api_key(SYNC_KEY), prefix=SYNC_KEY[:8]
+        )
+        self.client.login(username='testuser', password='testpassword')
+        self.size = 0
+
+    def _grow(self, size):
+        """Adds rows until every listed model has `size` of them."""
+        now = timezone.now()
+        for index in range(self.size, size):
+            client = Contact.objects.create(
+                organization=self.organization, name=f'Client {index}', contact_type=Contact.ContactType.CLIENT
+            )
+            Contact.objects.create(organization=self.organization, name=f'Category {index}')
+            project = Project.objects.create(organization=self.organization, name=f'Project {index}', contact=client)
+            entry = TimeEntry.objects.create(
+                user=self.user, project=project, title=f'Entry {index}',
+                start_time=now - timedelta(days=index, hours=2), end_time=now - timedelta(days=index, hours=1),
+            )
+            TimeEntryImage.objects.create(time_entry=entry, image=f'time_entry_images/{index}.jpg')
+            invoice = Invoice.objects.create(
+                organization=self.organization, contact=client, due_date=now.date() + timedelta(days=index)
+            )
+            InvoiceItem.objects.create(invoice=invoice, description='Work', unit_price=Decimal('100.00'))
+        self.size = size
+
+    def _count_queries(self, url_name, method, data, extra):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(reverse(url_name), data, **extra)
+            # Streaming responses only query while they are read
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400)
+        return len(queries)
+
+    def test_views_stay_within_budget_regardless_of_row_count(self):
+        counts = {}
+        for size in DATASET_SIZES:
+            self._grow(size)
+            for label, url_name, method, data, extra, budget in QUERY_BUDGETS:
+                with self.subTest(view=label, rows=size):
+                    count = self._count_queries(url_name, method, data, extra)
+                    self.assertLessEqual(count, budget)
+                    counts.setdefault(label, set()).add(count)
+        for label, seen in counts.items():
+            with self.subTest(view=label):
+                self.assertEqual(len(seen), 1, f'{label} query count changes with the row count: {sorted(seen)}')
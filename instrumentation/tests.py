@@ -0,0 +1,448 @@
+import json
+import marshal
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+
+import stripe
+from googletrans import Translator
+from xhtml2pdf import pisa
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from invoicing.models import Invoice
+from users.models import Organization
+from reports.utils import translate_text
+from workspaces.models import Contact, TimeEntry
+from .benchmarks import compare, percentile
+from . import metrics, middleware, slow_queries, tracing
+from .middleware import QueryRecorder, TracingMiddleware
+from .models import RequestProfile, SlowQuery
+
+
+@override_settings(QUERY_PROFILING_STAFF=True)
+class QueryProfilingMiddlewareTest(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            username='staffuser', password='testpassword', is_staff=True, is_superuser=True
+        )
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+
+    def _timings(self, response):
+        return {
+            metric.split(';')[0].strip(): metric
+            for metric in response['Server-Timing'].split(', ')
+        }
+
+    def test_staff_requests_get_server_timing_and_log_line(self):
+        self.client.login(username='staffuser', password='testpassword')
+
+        with self.assertLogs('instrumentation.requests', level='INFO') as logs:
+            response = self.client.get(reverse('admin:index'))
+
+        self.assertEqual(response.status_code, 200)
+        timings = self._timings(response)
+        self.assertIn('db', timings)
+        self.assertRegex(timings['db'], r'desc="\d+ queries"')
+        self.assertRegex(timings['tpl'], r'dur=\d+\.\d')
+        self.assertIn('sql-1', timings)
+
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['url_name'], 'admin:index')
+        self.assertEqual(record['user_id'], self.staff.pk)
+        self.assertGreater(record['query_count'], 0)
+        self.assertGreater(record['template_ms'], 0)
+
+    def test_regular_users_are_not_profiled_by_default(self):
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get(reverse('admin:index'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(QUERY_PROFILING_STAFF=False)
+    def test_staff_profiling_is_a_setting(self):
+        self.client.login(username='staffuser', password='testpassword')
+        response = self.client.get(reverse('admin:index'))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(QUERY_PROFILING_ENABLED=True)
+    def test_setting_profiles_every_request(self):
+        response = self.client.get(reverse('workspaces:session_keep_alive'))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('Server-Timing', response)
+
+    @override_settings(QUERY_PROFILING_ENABLED=True)
+    def test_repeated_statements_are_grouped(self):
+        for index in range(4):
+            Organization.objects.create(name=f'Org {index}')
+        self.client.login(username='staffuser', password='testpassword')
+        response = self.client.get(reverse('admin:users_organization_changelist'))
+        self.assertEqual(response.status_code, 200)
+
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for organization in Organization.objects.all():
+                list(organization.members.all())
+        groups = recorder.duplicate_groups()
+        self.assertEqual(groups[0][1], 4)
+        self.assertEqual(len(recorder.queries), 5)
+
+
+class BenchmarkTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.organization = Organization.objects.create(name='Test Organization')
+        self.organization.members.add(self.user)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.baseline = Path(directory.name) / 'baseline.json'
+
+    def _benchmark(self, *args):
+        call_command(
+            'benchmark', '--endpoint', 'timer_start_stop', '--repeat', '3', '--warmup', '0',
+            '--baseline', str(self.baseline), *args, stdout=StringIO(),
+        )
+
+    def test_percentile_uses_nearest_rank(self):
+        values = [5, 1, 4, 2, 3]
+        self.assertEqual(percentile(values, 50), 3)
+        self.assertEqual(percentile(values, 95), 5)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_compare_flags_latency_and_query_regressions(self):
+        baseline = {
+            'home': {'p95_ms': 100.0, 'queries': 5, 'statuses': [200]},
+            'gone': {'p95_ms': 1.0, 'queries': 1, 'statuses': [200]},
+        }
+        self.assertEqual(compare({'home': {'p95_ms': 119.0, 'queries': 5, 'statuses': [200]}}, baseline), [])
+        regressions = compare({
+            'home': {'p95_ms': 130.0, 'queries': 6, 'statuses': [200]},
+            'new': {'p95_ms': 1.0, 'queries': 1, 'statuses': [200]},
+        }, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertTrue(all(message.startswith('home:') for message in regressions))
+        # Small absolute changes on fast endpoints are noise
+        self.assertEqual(compare({'gone': {'p95_ms': 4.0, 'queries': 1, 'statuses': [200]}}, baseline), [])
+
+    def test_compare_flags_errors_and_changed_statuses(self):
+        baseline = {'home': {'p95_ms': 100.0, 'queries': 5, 'statuses': [200]}}
+        fast = {'p95_ms': 1.0, 'queries': 1}
+        self.assertEqual(compare({'home': dict(fast, statuses=[301])}, baseline), ['home: statuses [301], baseline [200]'])
+        self.assertEqual(compare({'new': dict(fast, statuses=[200, 500])}, baseline), ['new: answered 500'])
+        self.assertEqual(len(compare({'home': dict(fast, statuses=[404])}, baseline)), 2)
+
+    @override_settings(SECURE_SSL_REDIRECT=True)
+    def test_requests_are_not_redirected_to_https(self):
+        self._benchmark('--save')
+        saved = json.loads(self.baseline.read_text())
+        self.assertEqual(saved['endpoints']['timer_start_stop']['statuses'], [302])
+
+    def test_saves_baseline_and_leaves_data_untouched(self):
+        self._benchmark('--save')
+
+        saved = json.loads(self.baseline.read_text())
+        result = saved['endpoints']['timer_start_stop']
+        self.assertEqual(result['statuses'], [302])
+        self.assertGreater(result['queries'], 0)
+        self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+        self.assertFalse(TimeEntry.objects.exists())
+
+    def test_fails_on_regression(self):
+        self._benchmark('--save')
+        saved = json.loads(self.baseline.read_text())
+        saved['endpoints']['timer_start_stop'].update(p95_ms=0.0, queries=0)
+        self.baseline.write_text(json.dumps(saved))
+
+        with self.assertRaisesMessage(CommandError, 'timer_start_stop'):
+            self._benchmark('--min-delta-ms', '0')
+
+
+@override_settings(REQUEST_PROFILER_ENABLED=True)
+class RequestProfilerTest(TestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            username='staffuser', password='testpassword', is_staff=True, is_superuser=True
+        )
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+
+    def test_staff_query_param_stores_profile(self):
+        self.client.login(username='staffuser', password='testpassword')
+        response = self.client.get(reverse('admin:index'), {'_profile': '1'})
+
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response['X-Profile-Id'], str(profile.pk))
+        self.assertEqual(profile.user, self.staff)
+        self.assertEqual(profile.path, reverse('admin:index'))
+        self.assertEqual(profile.query_string, '_profile=1')
+        self.assertEqual(profile.url_name, 'admin:index')
+        self.assertEqual(profile.status_code, 200)
+        self.assertGreater(profile.query_count, 0)
+        self.assertIn('cumulative', profile.report)
+        self.assertIn('index', profile.report)
+        self.assertIn('slowest_queries', profile.sql_summary)
+        # The raw stats load back as pstats data
+        self.assertTrue(marshal.loads(bytes(profile.stats)))
+
+    def test_header_requests_profile(self):
+        self.client.login(username='staffuser', password='testpassword')
+        response = self.client.get(reverse('admin:index'), HTTP_X_PROFILE='1')
+        self.assertIn('X-Profile-Id', response)
+        self.assertEqual(RequestProfile.objects.count(), 1)
+
+    def test_only_staff_can_profile(self):
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get(reverse('workspaces:session_keep_alive'), {'_profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(REQUEST_PROFILER_ENABLED=False)
+    def test_setting_disables_profiler(self):
+        self.client.login(username='staffuser', password='testpassword')
+        self.client.get(reverse('admin:index'), {'_profile': '1'})
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_admin_shows_and_downloads_profiles(self):
+        self.client.login(username='staffuser', password='testpassword')
+        self.client.get(reverse('admin:index'), {'_profile': '1'})
+        profile = RequestProfile.objects.get()
+
+        response = self.client.get(reverse('admin:instrumentation_requestprofile_changelist'))
+        self.assertContains(response, profile.path)
+        response = self.client.get(reverse('admin:instrumentation_requestprofile_change', args=[profile.pk]))
+        self.assertContains(response, 'cumulative')
+
+        response = self.client.post(reverse('admin:instrumentation_requestprofile_changelist'), {
+            'action': 'download_stats', '_selected_action': [profile.pk],
+        })
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="profile-{profile.pk}.prof"')
+        self.assertEqual(response.content, bytes(profile.stats))
+
+
+class TracingTest(SimpleTestCase):
+    def test_span_records_duration_and_outcome(self):
+        with tracing.capture_spans() as spans:
+            with tracing.span('test.ok', size=3):
+                pass
+            with self.assertRaises(ValueError):
+                with tracing.span('test.failing'):
+                    raise ValueError('boom')
+
+        ok, failing = spans.spans
+        self.assertEqual((ok.name, ok.outcome, ok.attributes), ('test.ok', tracing.OUTCOME_OK, {'size': 3}))
+        self.assertGreaterEqual(ok.duration_ms, 0)
+        self.assertEqual((failing.outcome, failing.error), (tracing.OUTCOME_ERROR, 'ValueError'))
+
+    def test_log_exporter_writes_json_lines(self):
+        with self.assertLogs('instrumentation.tracing', level='INFO') as logs:
+            with tracing.span('test.logged'):
+                pass
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual((record['event'], record['name']), ('span', 'test.logged'))
+
+    def test_outbound_calls_are_wrapped(self):
+        self.assertTrue(Translator.translate.__traced__)
+        self.assertTrue(stripe.Subscription.retrieve.__traced__)
+        self.assertTrue(pisa.pisaDocument.__traced__)
+
+    def test_pdf_rendering_records_payload_sizes(self):
+        html = b'<html><body><p>Report</p></body></html>'
+        with tracing.capture_spans() as spans:
+            pisa.pisaDocument(BytesIO(html), BytesIO())
+
+        span = spans.spans[0]
+        self.assertEqual(span.name, 'pisa.pisaDocument')
+        self.assertEqual(span.outcome, tracing.OUTCOME_OK)
+        self.assertEqual(span.attributes['request_size'], len(html))
+        self.assertGreater(span.attributes['response_size'], 0)
+
+    def test_stripe_errors_are_recorded(self):
+        with mock.patch.object(stripe, 'api_key', None), tracing.capture_spans() as spans:
+            with self.assertRaises(stripe.error.AuthenticationError):
+                stripe.Subscription.retrieve('sub_123')
+        self.assertEqual(spans.spans[0].name, 'stripe.Subscription.retrieve')
+        self.assertEqual(spans.spans[0].error, 'AuthenticationError')
+
+    def test_spans_are_aggregated_per_endpoint(self):
+        def view(request):
+            with tracing.span('test.dependency'):
+                pass
+            with tracing.span('test.dependency'):
+                pass
+            return HttpResponse()
+
+        request = RequestFactory().get(reverse('workspaces:home'))
+        with tracing.capture_spans() as spans, self.assertLogs('instrumentation.tracing', level='INFO') as logs:
+            TracingMiddleware(view)(request)
+
+        self.assertEqual({span.endpoint for span in spans.spans}, {'workspaces:home'})
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record['event'], 'request_dependencies')
+        self.assertEqual(record['dependencies']['test.dependency']['count'], 2)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+
+    def _sample(self, name, labels=None):
+        return metrics.scrape_registry().get_sample_value(name, labels or {}) or 0
+
+    def test_metrics_require_token_or_staff(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('http_request_duration_seconds', response.content.decode())
+
+    def test_requests_observe_latency_and_queries(self):
+        labels = {'url_name': 'workspaces:session_keep_alive', 'method': 'GET'}
+        before = self._sample('http_request_duration_seconds_count', labels)
+        queries_before = self._sample('db_queries_total', {'url_name': 'workspaces:session_keep_alive'})
+        self.client.login(username='testuser', password='testpassword')
+        self.client.get(reverse('workspaces:session_keep_alive'))
+
+        self.assertEqual(self._sample('http_request_duration_seconds_count', labels), before + 1)
+        self.assertGreater(self._sample('db_queries_total', {'url_name': 'workspaces:session_keep_alive'}), queries_before)
+
+    def test_database_gauges(self):
+        TimeEntry.objects.create(user=self.user, title='Running', start_time=timezone.now())
+        TimeEntry.objects.create(user=self.user, title='Done', start_time=timezone.now(), end_time=timezone.now())
+        self.assertEqual(self._sample('active_timers'), 1)
+        self.assertEqual(self._sample('payment_reminders_pending'), 0)
+
+    def test_pending_reminders_gauge_counts_overdue_unreminded_invoices(self):
+        organization = Organization.objects.create(name='Test Organization')
+        contact = Contact.objects.create(
+            organization=organization, name='Acme', contact_type=Contact.ContactType.CLIENT,
+            email='billing@acme.test', send_reminders=True,
+        )
+        overdue = timezone.localdate() - timedelta(days=5)
+        Invoice.objects.create(organization=organization, contact=contact, due_date=overdue)
+        Invoice.objects.create(organization=organization, contact=contact, due_date=overdue, reminder_sent_at=timezone.now())
+        Invoice.objects.create(organization=organization, contact=contact, due_date=overdue, is_paid=True)
+        self.assertEqual(self._sample('payment_reminders_pending'), 1)
+
+    def test_pdf_spans_feed_render_histogram(self):
+        before = self._sample('pdf_render_duration_seconds_count')
+        pisa.pisaDocument(BytesIO(b'<p>Report</p>'), BytesIO())
+        self.assertEqual(self._sample('pdf_render_duration_seconds_count'), before + 1)
+
+    def test_spans_feed_outbound_histogram_per_endpoint(self):
+        labels = {'endpoint': 'workspaces:home', 'name': 'test.dependency', 'outcome': tracing.OUTCOME_OK}
+        before = self._sample('outbound_call_duration_seconds_count', labels)
+
+        def view(request):
+            with tracing.span('test.dependency'):
+                pass
+            return HttpResponse()
+
+        with self.assertLogs('instrumentation.tracing', level='INFO'):
+            TracingMiddleware(view)(RequestFactory().get(reverse('workspaces:home')))
+        self.assertEqual(self._sample('outbound_call_duration_seconds_count', labels), before + 1)
+
+    def test_translation_cache_counts_hits_and_misses(self):
+        cache.clear()
+        translator = mock.Mock()
+        translator.translate.return_value.text = 'Projekt'
+        hits = self._sample('translation_cache_requests_total', {'result': 'hit'})
+        misses = self._sample('translation_cache_requests_total', {'result': 'miss'})
+
+        self.assertEqual(translate_text(translator, 'Project', 'sv'), 'Projekt')
+        self.assertEqual(translate_text(translator, 'Project', 'sv'), 'Projekt')
+
+        translator.translate.assert_called_once_with('Project', dest='sv', src='auto')
+        self.assertEqual(self._sample('translation_cache_requests_total', {'result': 'hit'}), hits + 1)
+        self.assertEqual(self._sample('translation_cache_requests_total', {'result': 'miss'}), misses + 1)
+
+    def test_url_is_resolved_once_per_request(self):
+        with mock.patch('instrumentation.middleware.resolve', wraps=middleware.resolve) as resolve:
+            self.client.get(reverse('workspaces:session_keep_alive'))
+        self.assertEqual(resolve.call_count, 1)
+
+
+@override_settings(SLOW_QUERY_LOG_ENABLED=True, SLOW_QUERY_LOG_SAMPLE_RATE=1)
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+
+    def test_fingerprint_ignores_literals_and_in_list_length(self):
+        self.assertEqual(
+            slow_queries.normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?',
+        )
+        self.assertEqual(
+            slow_queries.fingerprint('SELECT a FROM t WHERE id IN (%s)'),
+            slow_queries.fingerprint('SELECT a  FROM t WHERE id IN (%s, %s)'),
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_statements_are_recorded_once_per_fingerprint_with_plan(self):
+        with self.assertLogs('instrumentation.slow_queries', level='WARNING'):
+            self.client.get(reverse('workspaces:session_keep_alive'))
+            recorded = SlowQuery.objects.count()
+            self.client.get(reverse('workspaces:session_keep_alive'))
+        self.assertGreater(recorded, 0)
+        self.assertEqual(SlowQuery.objects.count(), recorded)
+
+        session_lookup = SlowQuery.objects.get(normalized_sql__startswith='SELECT', normalized_sql__contains='django_session')
+        self.assertEqual(session_lookup.count, 2)
+        self.assertEqual(session_lookup.url_name, 'workspaces:session_keep_alive')
+        self.assertIn('django_session', session_lookup.plan)
+        self.assertGreaterEqual(session_lookup.max_ms, session_lookup.avg_ms)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_parameter_values_are_only_kept_when_enabled(self):
+        recorder = slow_queries.SlowQueryRecorder('default', 0)
+        with connection.execute_wrapper(recorder):
+            list(TimeEntry.objects.filter(title='secret@example.com'))
+        with self.assertLogs('instrumentation.slow_queries', level='WARNING'):
+            slow_queries.store_slow_queries(recorder.statements)
+        stored = SlowQuery.objects.get()
+        self.assertEqual(stored.example_params, "('str',)")
+        self.assertNotIn('secret@example.com', stored.example_sql + stored.plan)
+
+        SlowQuery.objects.all().delete()
+        with self.settings(SLOW_QUERY_LOG_PARAMS=True), self.assertLogs('instrumentation.slow_queries', level='WARNING'):
+            slow_queries.store_slow_queries(recorder.statements)
+        self.assertIn('secret@example.com', SlowQuery.objects.get().example_params)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_only_logged(self):
+        with self.assertLogs('instrumentation.slow_queries', level='WARNING'):
+            self.client.get(reverse('workspaces:session_keep_alive'))
+        self.assertFalse(SlowQuery.objects.exists())
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_ENABLED=False)
+    def test_disabled_by_setting(self):
+        self.client.get(reverse('workspaces:session_keep_alive'))
+        self.assertFalse(SlowQuery.objects.exists())
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=60_000)
+    def test_fast_statements_are_ignored(self):
+        self.client.get(reverse('workspaces:session_keep_alive'))
+        self.assertFalse(SlowQuery.objects.exists())
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_LOG_MAX_ROWS=2)
+    def test_table_keeps_most_recent_fingerprints(self):
+        with self.assertLogs('instrumentation.slow_queries', level='WARNING'):
+            self.client.get(reverse('workspaces:session_keep_alive'))
+        self.assertEqual(SlowQuery.objects.count(), 2)
+
+    def test_explain_shows_date_lookups_scanning_the_table(self):
+        recorder = slow_queries.SlowQueryRecorder('default', 0)
+        with connection.execute_wrapper(recorder):
+            list(TimeEntry.objects.filter(start_time__date__gte=timezone.localdate()))
+        plan = slow_queries.explain(recorder.statements[0])
+        self.assertIn('SCAN', plan)
+        self.assertIn('workspaces_timeentry', plan)
@@ -0,0 +1,252 @@
+"""
+Lightweight span tracing for slow outbound and CPU-heavy calls.
+
+`span()` times a block and hands the finished Span to the configured
+exporters (TRACING_EXPORTERS, dotted paths); MetricsExporter keeps the
+per-endpoint totals as histograms. `install()` wraps the calls that dominate slow
+requests: googletrans Translator.translate, stripe.Subscription.retrieve,
+Secret Manager access_secret_version and xhtml2pdf's pisaDocument.
+
+Spans finished before settings are configured (the Secret Manager lookups
+in settings.py) are kept and exported once the app is ready.
+"""
+import functools
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('instrumentation.tracing')
+
+OUTCOME_OK = 'ok'
+OUTCOME_ERROR = 'error'
+
+DEFAULT_EXPORTERS = ['instrumentation.tracing.LogExporter']
+
+# Set by TracingMiddleware for the duration of a request
+current_request = ContextVar('tracing_request', default=None)
+
+
+@dataclass
+class Span:
+    name: str
+    endpoint: str = None
+    started_at: float = 0.0
+    duration_ms: float = 0.0
+    outcome: str = OUTCOME_OK
+    error: str = ''
+    attributes: dict = field(default_factory=dict)
+
+    def as_dict(self):
+        return asdict(self)
+
+
+# --- Exporters ---
+
+class InMemoryExporter:
+    """Keeps finished spans in a list; meant for tests."""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def names(self):
+        return [span.name for span in self.spans]
+
+    def clear(self):
+        self.spans.clear()
+
+
+class LogExporter:
+    """Writes each span as a JSON line on the 'instrumentation.tracing' logger."""
+
+    def export(self, span):
+        logger.info(json.dumps(dict(span.as_dict(), event='span'), default=str))
+
+
+_captures = []
+_pending = []
+_ready = False
+
+
+@functools.lru_cache(maxsize=None)
+def _configured_exporters(paths):
+    return [import_string(path)() for path in paths]
+
+
+def _exporters():
+    from django.conf import settings
+
+    return _configured_exporters(tuple(getattr(settings, 'TRACING_EXPORTERS', DEFAULT_EXPORTERS))) + _captures
+
+
+def _export(span):
+    if not _ready:
+        _pending.append(span)
+        return
+    request_spans = current_request.get()
+    if request_spans is not None:
+        request_spans['spans'].append(span)
+    for exporter in _exporters():
+        try:
+            exporter.export(span)
+        except Exception:
+            logger.exception('Exporting span %s failed', span.name)
+
+
+@contextmanager
+def capture_spans():
+    """Collects the spans finished inside the block in an InMemoryExporter."""
+    exporter = InMemoryExporter()
+    _captures.append(exporter)
+    try:
+        yield exporter
+    finally:
+        _captures.remove(exporter)
+
+
+# --- Spans ---
+
+@contextmanager
+def span(name, **attributes):
+    """Times the block as a span; exceptions mark it as failed and propagate."""
+    request_spans = current_request.get()
+    current = Span(
+        name, endpoint=request_spans['endpoint'] if request_spans else None,
+        started_at=time.time(), attributes=attributes,
+    )
+    started = time.perf_counter()
+    try:
+        yield current
+    except Exception as exc:
+        current.outcome = OUTCOME_ERROR
+        current.error = type(exc).__name__
+        raise
+    finally:
+        current.duration_ms = round((time.perf_counter() - started) * 1000, 2)
+        _export(current)
+
+
+def _measure(size, *args):
+    # Measuring must never break the traced call
+    try:
+        return size(*args)
+    except Exception:
+        return None
+
+
+def traced(name, request_size=None, response_size=None, failed=None):
+    """
+    Decorator running the function inside span(name). request_size(args,
+    kwargs) and response_size(result, args, kwargs) record payload sizes;
+    failed(result) marks calls that report errors without raising.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name) as current:
+                if request_size:
+                    current.attributes['request_size'] = _measure(request_size, args, kwargs)
+                result = func(*args, **kwargs)
+                if response_size:
+                    current.attributes['response_size'] = _measure(response_size, result, args, kwargs)
+                if failed and _measure(failed, result):
+                    current.outcome = OUTCOME_ERROR
+                return result
+        wrapper.__traced__ = True
+        return wrapper
+    return decorator
+
+
+# --- Instrumented libraries ---
+
+def _text_size(value):
+    if isinstance(value, (list, tuple)):
+        return sum(len(item or '') for item in value)
+    return len(value or '')
+
+
+def _bytes_size(value):
+    if hasattr(value, 'getbuffer'):
+        return value.getbuffer().nbytes
+    return len(value)
+
+
+def _argument(args, kwargs, position, name):
+    return args[position] if len(args) > position else kwargs.get(name)
+
+
+def instrument_translator():
+    try:
+        from googletrans import Translator
+    except ImportError:
+        return
+    if getattr(Translator.translate, '__traced__', False):
+        return
+    Translator.translate = traced(
+        'googletrans.translate',
+        request_size=lambda args, kwargs: _text_size(_argument(args, kwargs, 1, 'text')),
+        response_size=lambda result, args, kwargs: _text_size(
+            [item.text for item in result] if isinstance(result, list) else result.text
+        ),
+    )(Translator.translate)
+
+
+def instrument_stripe():
+    try:
+        import stripe
+    except ImportError:
+        return
+    retrieve = stripe.Subscription.retrieve
+    if getattr(retrieve, '__traced__', False):
+        return
+    stripe.Subscription.retrieve = classmethod(traced(
+        'stripe.Subscription.retrieve',
+        response_size=lambda result, args, kwargs: len(str(result)),
+    )(retrieve.__func__))
+
+
+def instrument_secret_manager():
+    try:
+        from google.cloud.secretmanager import SecretManagerServiceClient
+    except ImportError:
+        return
+    if getattr(SecretManagerServiceClient.access_secret_version, '__traced__', False):
+        return
+    SecretManagerServiceClient.access_secret_version = traced(
+        'secretmanager.access_secret_version',
+        response_size=lambda result, args, kwargs: len(result.payload.data),
+    )(SecretManagerServiceClient.access_secret_version)
+
+
+def instrument_pisa():
+    try:
+        from xhtml2pdf import pisa
+    except ImportError:
+        return
+    if getattr(pisa.pisaDocument, '__traced__', False):
+        return
+    pisa.pisaDocument = traced(
+        'pisa.pisaDocument',
+        request_size=lambda args, kwargs: _bytes_size(_argument(args, kwargs, 0, 'src')),
+        response_size=lambda result, args, kwargs: _bytes_size(_argument(args, kwargs, 1, 'dest')),
+        failed=lambda result: result.err,
+    )(pisa.pisaDocument)
+
+
+def install():
+    """Wraps the traced libraries and exports spans kept from before startup."""
+    global _ready
+    instrument_translator()
+    instrument_stripe()
+    instrument_secret_manager()
+    instrument_pisa()
+    _ready = True
+    while _pending:
+        _export(_pending.pop(0))
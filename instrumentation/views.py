@@ -0,0 +1,23 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+from prometheus_client import CONTENT_TYPE_LATEST
+
+from .metrics import render_metrics
+
+
+def _may_scrape(request):
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    return settings.DEBUG or request.user.is_staff
+
+
+@require_GET
+def metrics(request):
+    """Prometheus text exposition of all workers' metrics."""
+    if not _may_scrape(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type=CONTENT_TYPE_LATEST)
@@ -1,3 +1,29 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.http import StreamingHttpResponse
+from .models import Invoice, InvoiceItem
+from .pdf import generate_invoice_pdfs, stream_zip
 
-# Register your models here.
+class InvoiceItemInline(admin.TabularInline):
+    model = InvoiceItem
+    extra = 0
+    readonly_fields = ('total_price',)
+
+@admin.register(Invoice)
+class InvoiceAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'organization', 'contact', 'created_at', 'due_date', 'total_amount', 'is_paid')
+    list_filter = ('is_paid', 'organization')
+    list_select_related = ('organization', 'contact')
+    inlines = (InvoiceItemInline,)
+    actions = ('download_pdfs',)
+
+    @admin.action(description='Download PDFs of selected invoices (zip)')
+    def download_pdfs(self, request, queryset):
+        result = generate_invoice_pdfs(queryset, workers=getattr(settings, 'INVOICE_PDF_WORKERS', None))
+        if result.failed:
+            messages.warning(request, f"Could not render invoices: {', '.join(map(str, result.failed))}")
+        if not result.paths:
+            return None
+        response = StreamingHttpResponse(stream_zip(result.paths), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="invoices.zip"'
+        return response
@@ -0,0 +1,100 @@
+"""
+Invoice generation from tracked time.
+
+Unbilled time entries are aggregated per client and project in SQL, and the
+invoices, their items and the billed marker on the entries are written with a
+fixed number of set-based queries, so a run costs the same number of round
+trips for one client or hundreds.
+"""
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.utils import timezone
+
+from workspaces.models import Contact, TimeEntry
+from workspaces.utils import date_range_q, worked_duration_expression
+from .models import CENT, Invoice, InvoiceItem
+
+DEFAULT_PAYMENT_TERMS_DAYS = 30
+
+
+def unbilled_entries(organization, start_date, end_date, contacts=None):
+    """
+    Completed, not yet invoiced entries on client projects of an organization
+    that started between start_date and end_date (local dates, inclusive).
+    """
+    entries = TimeEntry.objects.filter(
+        date_range_q(start_date, end_date),
+        project__organization=organization,
+        project__contact__contact_type=Contact.ContactType.CLIENT,
+        invoice__isnull=True,
+        end_time__isnull=False,
+    )
+    if contacts is not None:
+        entries = entries.filter(project__contact__in=contacts)
+    return entries
+
+
+def _hours(duration):
+    return (Decimal(duration.total_seconds()) / 3600).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def generate_invoices(organization, start_date, end_date, contacts=None, due_date=None):
+    """
+    Creates one invoice per client with one item per project for the unbilled
+    time between start_date and end_date, and links the entries to it.
+
+    Items bill the worked hours (rounded to hundredths) at the project's
+    hourly rate. Everything runs in one transaction; returns the created
+    invoices.
+    """
+    due_date = due_date or timezone.localdate() + timedelta(days=DEFAULT_PAYMENT_TERMS_DAYS)
+
+    with transaction.atomic():
+        entries = unbilled_entries(organization, start_date, end_date, contacts)
+        rows = list(
+            entries.order_by()
+            .values('project__contact_id', 'project_id', 'project__name', 'project__hourly_rate')
+            .annotate(worked=Sum(worked_duration_expression()), entry_count=Count('id'))
+            .order_by('project__contact_id', 'project__name')
+        )
+        if not rows:
+            return []
+
+        contact_ids = list(dict.fromkeys(row['project__contact_id'] for row in rows))
+        invoices = Invoice.objects.bulk_create([
+            Invoice(organization=organization, contact_id=contact_id, due_date=due_date)
+            for contact_id in contact_ids
+        ])
+        invoice_by_contact = {invoice.contact_id: invoice for invoice in invoices}
+
+        items = []
+        for row in rows:
+            quantity = _hours(row['worked'])
+            unit_price = row['project__hourly_rate']
+            items.append(InvoiceItem(
+                invoice=invoice_by_contact[row['project__contact_id']],
+                project_id=row['project_id'],
+                description=f"{row['project__name']} ({start_date:%Y-%m-%d} - {end_date:%Y-%m-%d})",
+                quantity=quantity,
+                unit_price=unit_price,
+            ))
+        # Prices the lines and sets the invoice totals in one UPDATE
+        InvoiceItem.objects.bulk_create(items)
+
+        invoice_ids = [invoice.pk for invoice in invoices]
+
+        # Each entry's project points to exactly one client, hence one new invoice
+        invoice_for_entry = Invoice.objects.filter(
+            pk__in=invoice_ids, contact__projects=OuterRef('project_id')
+        ).values('pk')[:1]
+        billed = entries.update(invoice=Subquery(invoice_for_entry))
+
+        expected = sum(row['entry_count'] for row in rows)
+        if billed != expected:
+            # Entries changed between the aggregate and the update; roll back
+            raise RuntimeError(f"Billed {billed} time entries but invoiced {expected}.")
+
+    return list(Invoice.objects.filter(pk__in=invoice_ids).order_by('pk'))
@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+
+from invoicing.models import Invoice
+
+
+class Command(BaseCommand):
+    help = 'Verifies that every invoice total matches the sum of its items, optionally fixing mismatches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Invoices checked per query.')
+        parser.add_argument('--fix', action='store_true', help='Recompute the totals that do not match.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        checked = 0
+        mismatched = 0
+        last_pk = 0
+
+        while True:
+            # Keyset pagination keeps every chunk an indexed range scan
+            rows = list(
+                Invoice.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .annotate(items_total=Coalesce(
+                    Sum('items__total_price'),
+                    Value(Decimal('0.00')),
+                    output_field=DecimalField(max_digits=10, decimal_places=2),
+                ))
+                .values_list('pk', 'total_amount', 'items_total')[:chunk_size]
+            )
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            checked += len(rows)
+
+            wrong = []
+            for pk, total_amount, items_total in rows:
+                if total_amount != items_total:
+                    wrong.append(pk)
+                    self.stdout.write(f"Invoice #{pk}: stored {total_amount}, items sum to {items_total}")
+            if wrong:
+                mismatched += len(wrong)
+                if options['fix']:
+                    Invoice.objects.filter(pk__in=wrong).update_totals()
+
+        message = f"Checked {checked} invoice(s), {mismatched} mismatched."
+        if mismatched and options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"{message} Fixed."))
+        elif mismatched:
+            self.stdout.write(self.style.ERROR(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,50 @@
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoicing.models import Invoice
+from invoicing.pdf import DEFAULT_CHUNK_SIZE, generate_invoice_pdfs, stream_zip
+from workspaces.utils import date_range_q
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = 'Renders invoice PDFs to storage in a process pool, optionally writing them to a zip archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organization', type=int, action='append', dest='organizations',
+                            help='Only render invoices of this organization id. Can be given several times.')
+        parser.add_argument('--start', type=_parse_date, help='First invoice date to render (YYYY-MM-DD).')
+        parser.add_argument('--end', type=_parse_date, help='Last invoice date to render (YYYY-MM-DD).')
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of worker processes.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Invoices per worker task.')
+        parser.add_argument('--zip', dest='zip_path', help='Also write all PDFs to this zip file.')
+
+    def handle(self, *args, **options):
+        invoices = Invoice.objects.all()
+        if options['organizations']:
+            invoices = invoices.filter(organization__in=options['organizations'])
+        # Invoice dates are local calendar days
+        invoices = invoices.filter(date_range_q(options['start'], options['end'], field='created_at'))
+
+        result = generate_invoice_pdfs(invoices, workers=options['workers'], chunk_size=options['chunk_size'])
+
+        for invoice_id in result.failed:
+            self.stdout.write(self.style.WARNING(f"Could not render invoice #{invoice_id}"))
+        if options['zip_path'] and result.paths:
+            with open(options['zip_path'], 'wb') as archive:
+                for chunk in stream_zip(result.paths):
+                    archive.write(chunk)
+            self.stdout.write(f"Wrote {options['zip_path']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {len(result.paths)} invoice PDF(s) in {result.elapsed:.1f}s "
+            f"({result.rate:.1f} invoices/s)."
+        ))
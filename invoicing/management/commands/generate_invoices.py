@@ -0,0 +1,47 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from invoicing.billing import generate_invoices
+from users.models import Organization
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f"Invalid date '{value}', expected YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = 'Creates invoices from unbilled time entries. Defaults to the previous calendar month.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=_parse_date, help='First day to bill (YYYY-MM-DD).')
+        parser.add_argument('--end', type=_parse_date, help='Last day to bill (YYYY-MM-DD).')
+        parser.add_argument('--organization', type=int, action='append', dest='organizations',
+                            help='Only bill this organization id. Can be given several times.')
+        parser.add_argument('--due-days', type=int, default=30, help='Payment terms in days from today.')
+
+    def handle(self, *args, **options):
+        first_of_month = timezone.localdate().replace(day=1)
+        end_date = options['end'] or first_of_month - timedelta(days=1)
+        start_date = options['start'] or end_date.replace(day=1)
+        if start_date > end_date:
+            raise CommandError('--start must not be after --end.')
+
+        due_date = timezone.localdate() + timedelta(days=options['due_days'])
+        organizations = Organization.objects.order_by('pk')
+        if options['organizations']:
+            organizations = organizations.filter(pk__in=options['organizations'])
+
+        self.stdout.write(f"Billing time from {start_date} to {end_date}")
+        invoice_count = 0
+        for organization in organizations:
+            invoices = generate_invoices(organization, start_date, end_date, due_date=due_date)
+            if invoices:
+                invoice_count += len(invoices)
+                self.stdout.write(f"{organization.name}: {len(invoices)} invoice(s)")
+
+        self.stdout.write(self.style.SUCCESS(f"Created {invoice_count} invoice(s)."))
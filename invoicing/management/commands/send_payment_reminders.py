@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from invoicing.reminders import DEFAULT_BATCH_SIZE, send_payment_reminders
+
+
+class Command(BaseCommand):
+    help = 'Emails payment reminders for overdue unpaid invoices of contacts that opted in. Safe to rerun.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Messages sent per batch.')
+        parser.add_argument('--repeat-after', type=int, metavar='DAYS',
+                            help='Remind again when the last reminder is older than this. Default: remind once.')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the reminders that would be sent.')
+
+    def handle(self, *args, **options):
+        repeat_after = timedelta(days=options['repeat_after']) if options['repeat_after'] is not None else None
+        sent = send_payment_reminders(
+            repeat_after=repeat_after, batch_size=options['batch_size'], dry_run=options['dry_run']
+        )
+        if options['dry_run']:
+            self.stdout.write(f"{sent} payment reminder(s) would be sent.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Sent {sent} payment reminder(s)."))
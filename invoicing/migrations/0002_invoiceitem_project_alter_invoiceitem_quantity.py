@@ -0,0 +1,25 @@
+# Generated by Django 4.2.23 on 2026-10-19 09:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workspaces', '0002_remove_project_category_remove_timeentry_category_and_more'),
+        ('invoicing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoiceitem',
+            name='project',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoice_items', to='workspaces.project'),
+        ),
+        migrations.AlterField(
+            model_name='invoiceitem',
+            name='quantity',
+            field=models.DecimalField(decimal_places=2, default=1, max_digits=8),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-19 09:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0002_invoiceitem_project_alter_invoiceitem_quantity'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['organization', 'is_paid', 'due_date'], name='invoice_org_paid_due_idx'),
+        ),
+    ]
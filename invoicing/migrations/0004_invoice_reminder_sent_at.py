@@ -0,0 +1,22 @@
+# Generated by Django 4.2.23 on 2026-10-19 09:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0003_invoice_org_paid_due_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='reminder_sent_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('is_paid', False)), fields=['due_date'], name='invoice_unpaid_due_idx'),
+        ),
+    ]
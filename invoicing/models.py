@@ -1,6 +1,86 @@
-from django.db import models
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import models, transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.conf import settings
-from workspaces.models import Contact
+from workspaces.models import Contact, TimeEntry
+
+CENT = Decimal('0.01')
+
+
+def line_total(quantity, unit_price):
+    """Price of an invoice line, rounded to whole cents."""
+    return (Decimal(quantity) * Decimal(unit_price)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class InvoiceQuerySet(models.QuerySet):
+    def update_totals(self):
+        """Recomputes total_amount from the items of every invoice in one UPDATE."""
+        item_totals = (
+            InvoiceItem.objects.filter(invoice=OuterRef('pk'))
+            .order_by()
+            .values('invoice')
+            .annotate(total=Sum('total_price'))
+            .values('total')
+        )
+        return self.update(
+            total_amount=Coalesce(
+                Subquery(item_totals, output_field=models.DecimalField(max_digits=10, decimal_places=2)),
+                Decimal('0.00'),
+            )
+        )
+
+
+class InvoiceItemQuerySet(models.QuerySet):
+    """
+    Bulk operations that skip InvoiceItem.save() but still keep line and
+    invoice totals in sync: lines are priced in Python and the totals of the
+    touched invoices are refreshed with a single UPDATE afterwards.
+    """
+
+    def _update_invoice_totals(self, invoice_ids):
+        if invoice_ids:
+            Invoice.objects.filter(pk__in=invoice_ids).update_totals()
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for item in objs:
+            item.total_price = line_total(item.quantity, item.unit_price)
+        with transaction.atomic(using=self.db, savepoint=False):
+            created = super().bulk_create(objs, *args, **kwargs)
+            self._update_invoice_totals({item.invoice_id for item in objs})
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        if {'quantity', 'unit_price'} & set(fields):
+            for item in objs:
+                item.total_price = line_total(item.quantity, item.unit_price)
+            if 'total_price' not in fields:
+                fields.append('total_price')
+        invoice_ids = {item.invoice_id for item in objs}
+        with transaction.atomic(using=self.db, savepoint=False):
+            if 'invoice' in fields:
+                # Items may move between invoices, so refresh the old ones too
+                invoice_ids.update(
+                    self.model.objects.filter(pk__in=[item.pk for item in objs]).values_list('invoice_id', flat=True)
+                )
+            updated = super().bulk_update(objs, fields, *args, **kwargs)
+            self._update_invoice_totals(invoice_ids)
+        return updated
+
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            invoice_ids = set(self.values_list('invoice_id', flat=True))
+            deleted = super().delete()
+            self._update_invoice_totals(invoice_ids)
+        return deleted
+
 
 class Invoice(models.Model):
     organization = models.ForeignKey('users.Organization', on_delete=models.CASCADE, related_name='invoices')
@@ -9,21 +89,53 @@ class Invoice(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     due_date = models.DateField()
     is_paid = models.BooleanField(default=False)
+    # Last payment reminder, so scheduled reminder runs do not repeat themselves
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
+    # Sum of the items' total_price, maintained by InvoiceItem and its queryset
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
+    objects = InvoiceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Invoice list: organization scope, paid filter and due date ordering
+            models.Index(fields=['organization', 'is_paid', 'due_date'], name='invoice_org_paid_due_idx'),
+            # Payment reminders: only unpaid invoices are ever scanned
+            models.Index(fields=['due_date'], condition=models.Q(is_paid=False), name='invoice_unpaid_due_idx'),
+        ]
+
     def __str__(self):
         return f"Invoice #{self.pk} for {self.contact.name}"
 
 class InvoiceItem(models.Model):
     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='items')
+    project = models.ForeignKey('workspaces.Project', on_delete=models.SET_NULL, null=True, blank=True, related_name='invoice_items')
     description = models.CharField(max_length=255)
-    quantity = models.PositiveIntegerField(default=1)
+    # Hours for items generated from time entries, so fractions are allowed
+    quantity = models.DecimalField(max_digits=8, decimal_places=2, default=1)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    objects = InvoiceItemQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
-        self.total_price = self.quantity * self.unit_price
-        super().save(*args, **kwargs)
+        self.total_price = line_total(self.quantity, self.unit_price)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Invoice.objects.filter(pk=self.invoice_id).update_totals()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            Invoice.objects.filter(pk=self.invoice_id).update_totals()
+        return result
 
     def __str__(self):
-        return self.description
\ No newline at end of file
+        return self.description
+
+
+@receiver(pre_delete, sender=Invoice)
+def touch_unbilled_entries(sender, instance, **kwargs):
+    # SET_NULL unlinks the entries without going through TimeEntry's queryset,
+    # so mark them changed here for incremental sync
+    TimeEntry.objects.filter(invoice=instance).update(updated_at=timezone.now())
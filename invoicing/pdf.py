@@ -0,0 +1,151 @@
+"""
+Batch rendering of invoice PDFs.
+
+Invoices are rendered with the shared render_to_pdf machinery, in chunks
+spread over a process pool, and written to default_storage. The resulting
+files can then be streamed to the client as a zip without holding the whole
+archive in memory.
+"""
+import logging
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+import django
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connections
+
+from workspaces.utils import render_pdf_bytes
+from .models import Invoice
+from .utils import generate_epc_qr_code
+
+logger = logging.getLogger(__name__)
+
+PDF_STORAGE_DIR = 'invoices/pdf'
+DEFAULT_CHUNK_SIZE = 20
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class BatchResult:
+    paths: list = field(default_factory=list)
+    failed: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def rate(self):
+        """Rendered invoices per second."""
+        return len(self.paths) / self.elapsed if self.elapsed else 0.0
+
+
+def invoice_pdf_path(invoice):
+    return f'{PDF_STORAGE_DIR}/{invoice.organization_id}/invoice-{invoice.pk}.pdf'
+
+
+def render_invoice_pdf(invoice):
+    """Renders one invoice, EPC QR code included, and returns the PDF bytes or None."""
+    qr_code = None
+    if invoice.organization.iban and invoice.total_amount > 0:
+        try:
+            qr_code = generate_epc_qr_code(invoice)
+        except ValueError:
+            # Invalid bank details should not block the invoice itself
+            logger.warning("Could not build the EPC QR code for invoice #%s", invoice.pk)
+    return render_pdf_bytes('invoicing/invoice_pdf.html', {'invoice': invoice, 'qr_code': qr_code})
+
+
+def _render_chunk(invoice_ids):
+    """Renders and stores a chunk of invoices. Runs inside the pool workers."""
+    close_old_connections()
+    invoices = (
+        Invoice.objects.filter(pk__in=invoice_ids)
+        .select_related('organization', 'contact')
+        .prefetch_related('items')
+    )
+    paths, failed = [], []
+    for invoice in invoices:
+        content = render_invoice_pdf(invoice)
+        if content is None:
+            failed.append(invoice.pk)
+            continue
+        path = invoice_pdf_path(invoice)
+        # Overwrite instead of letting the storage pick a new name
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        paths.append(default_storage.save(path, ContentFile(content)))
+    return paths, failed
+
+
+def _init_worker():
+    # Needed when the pool spawns instead of forking
+    django.setup()
+
+
+def generate_invoice_pdfs(invoices, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Renders the PDFs of an invoice queryset to default_storage.
+
+    With more than one worker the chunks are rendered in a process pool;
+    workers=1 renders in the current process. Returns a BatchResult with
+    the stored paths, the ids that failed to render and the elapsed time.
+    """
+    started = time.perf_counter()
+    invoice_ids = list(invoices.order_by('pk').values_list('pk', flat=True))
+    chunks = [invoice_ids[i:i + chunk_size] for i in range(0, len(invoice_ids), chunk_size)]
+    workers = min(workers or os.cpu_count() or 1, len(chunks) or 1)
+
+    if workers == 1:
+        outcomes = list(map(_render_chunk, chunks))
+    else:
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            outcomes = list(executor.map(_render_chunk, chunks))
+
+    result = BatchResult()
+    for paths, failed in outcomes:
+        result.paths.extend(paths)
+        result.failed.extend(failed)
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+class _StreamBuffer:
+    """Write-only file object collecting what ZipFile writes between reads."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(paths):
+    """
+    Yields a zip archive of the given storage files chunk by chunk.
+
+    PDFs are already compressed, so entries are stored as is.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for path in paths:
+            with default_storage.open(path, 'rb') as source, archive.open(os.path.basename(path), mode='w') as target:
+                for chunk in iter(lambda: source.read(STREAM_CHUNK_SIZE), b''):
+                    target.write(chunk)
+                    data = buffer.pop()
+                    if data:
+                        yield data
+    # Closing the archive writes the central directory
+    yield buffer.pop()
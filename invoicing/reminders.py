@@ -0,0 +1,89 @@
+"""
+Payment reminders for overdue invoices.
+
+Reminders go to clients whose Contact has send_reminders enabled. Messages
+are sent in batches over one reused mail connection, and each sent batch is
+stamped with reminder_sent_at so a rerun does not remind twice. A batch the
+backend only partly accepted is left unstamped, to be retried next run.
+"""
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.template.loader import get_template
+from django.utils import timezone
+
+from .models import Invoice
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+
+
+def overdue_invoices_to_remind(today=None, repeat_after=None):
+    """
+    Unpaid invoices past their due date whose contact opted in to reminders
+    and has an email address. Invoices already reminded are skipped, unless
+    the last reminder is older than the `repeat_after` timedelta.
+    """
+    today = today or timezone.localdate()
+    not_reminded = Q(reminder_sent_at__isnull=True)
+    if repeat_after is not None:
+        not_reminded |= Q(reminder_sent_at__lt=timezone.now() - repeat_after)
+
+    return (
+        Invoice.objects.filter(not_reminded, is_paid=False, due_date__lt=today, contact__send_reminders=True)
+        .exclude(contact__email__isnull=True)
+        .exclude(contact__email='')
+        .select_related('contact', 'organization')
+        .order_by('pk')
+    )
+
+
+def send_payment_reminders(today=None, repeat_after=None, batch_size=DEFAULT_BATCH_SIZE, connection=None,
+                           dry_run=False):
+    """
+    Sends reminders for every invoice from overdue_invoices_to_remind().
+
+    Returns the number of reminders sent (or that would be sent with
+    dry_run). A batch is only stamped once the backend accepted all of it.
+    """
+    invoices = overdue_invoices_to_remind(today, repeat_after)
+    if dry_run:
+        return invoices.count()
+
+    # Templates are compiled once per run, not once per message
+    subject_template = get_template('invoicing/email/payment_reminder_subject.txt')
+    body_template = get_template('invoicing/email/payment_reminder.txt')
+    connection = connection or get_connection()
+
+    sent = 0
+    last_pk = 0
+    with connection:
+        while True:
+            batch = list(invoices.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            messages = [
+                EmailMessage(
+                    subject=' '.join(subject_template.render({'invoice': invoice}).split()),
+                    body=body_template.render({'invoice': invoice}),
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[invoice.contact.email],
+                    connection=connection,
+                )
+                for invoice in batch
+            ]
+            accepted = connection.send_messages(messages) or 0
+            if accepted < len(messages):
+                # The backend does not say which ones failed, so retry them all next run
+                logger.warning(
+                    'Mail backend accepted %d of %d payment reminders; leaving invoices %s unstamped.',
+                    accepted, len(messages), ', '.join(str(invoice.pk) for invoice in batch),
+                )
+                continue
+            Invoice.objects.filter(pk__in=[invoice.pk for invoice in batch]).update(reminder_sent_at=timezone.now())
+            sent += len(batch)
+    return sent
@@ -1,3 +1,530 @@
-from django.test import TestCase
+import base64
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from subscriptions.models import Subscription, SubscriptionPlan
+from users.models import Organization
+from workspaces.models import Contact, Project, TimeEntry
+from . import utils
+from .billing import generate_invoices
+from .pdf import generate_invoice_pdfs, stream_zip
+from .reminders import send_payment_reminders
+from .models import Invoice, InvoiceItem
+
+
+class GenerateInvoicesTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.organization = Organization.objects.create(name='Test Organization')
+        self.organization.members.add(self.user)
+        self.start_date = date(2024, 3, 1)
+        self.end_date = date(2024, 3, 31)
+
+    def _client(self, name):
+        return Contact.objects.create(
+            organization=self.organization, name=name, contact_type=Contact.ContactType.CLIENT
+        )
+
+    def _project(self, contact, name, rate):
+        return Project.objects.create(
+            organization=self.organization, contact=contact, name=name, hourly_rate=Decimal(rate)
+        )
+
+    def _entry(self, project, day, minutes, paused_minutes=0, **kwargs):
+        start = timezone.make_aware(datetime.combine(day, time(9)))
+        return TimeEntry.objects.create(
+            user=self.user, project=project, title='Work', start_time=start,
+            end_time=start + timedelta(minutes=minutes), paused_duration=timedelta(minutes=paused_minutes),
+            **kwargs
+        )
+
+    def test_bills_hours_per_project_at_hourly_rate(self):
+        client = self._client('Acme')
+        design = self._project(client, 'Design', '800.00')
+        build = self._project(client, 'Build', '1000.00')
+        self._entry(design, date(2024, 3, 4), 90)
+        self._entry(design, date(2024, 3, 5), 60, paused_minutes=30)
+        self._entry(build, date(2024, 3, 6), 20)
+
+        invoices = generate_invoices(self.organization, self.start_date, self.end_date)
+
+        self.assertEqual(len(invoices), 1)
+        invoice = invoices[0]
+        self.assertEqual(invoice.contact, client)
+        items = {item.project_id: item for item in invoice.items.all()}
+        self.assertEqual(items[design.pk].quantity, Decimal('2.00'))
+        self.assertEqual(items[design.pk].total_price, Decimal('1600.00'))
+        self.assertEqual(items[build.pk].quantity, Decimal('0.33'))
+        self.assertEqual(items[build.pk].total_price, Decimal('330.00'))
+        self.assertEqual(invoice.total_amount, Decimal('1930.00'))
+        self.assertEqual(TimeEntry.objects.filter(invoice=invoice).count(), 3)
+
+    def test_only_unbilled_client_entries_in_range_are_billed(self):
+        client = self._client('Acme')
+        project = self._project(client, 'Design', '100.00')
+        category_project = self._project(
+            Contact.objects.create(organization=self.organization, name='Internal'), 'Admin', '100.00'
+        )
+        in_range = self._entry(project, date(2024, 3, 31), 60)
+        outside = self._entry(project, date(2024, 4, 1), 60)
+        not_a_client = self._entry(category_project, date(2024, 3, 10), 60)
+        running = TimeEntry.objects.create(
+            user=self.user, project=project, title='Running',
+            start_time=timezone.make_aware(datetime(2024, 3, 12, 9)),
+        )
+
+        generate_invoices(self.organization, self.start_date, self.end_date)
+        second_run = generate_invoices(self.organization, self.start_date, self.end_date)
+
+        self.assertEqual(second_run, [])
+        self.assertEqual(Invoice.objects.count(), 1)
+        in_range.refresh_from_db()
+        self.assertIsNotNone(in_range.invoice)
+        for entry in (outside, not_a_client, running):
+            entry.refresh_from_db()
+            self.assertIsNone(entry.invoice)
+
+    def test_query_count_does_not_grow_with_clients(self):
+        def run(client_count):
+            for index in range(client_count):
+                project = self._project(self._client(f'Client {client_count}-{index}'), f'P{index}', '100.00')
+                self._entry(project, date(2024, 3, 4), 60)
+                self._entry(project, date(2024, 3, 5), 30)
+            with CaptureQueriesContext(connection) as queries:
+                invoices = generate_invoices(self.organization, self.start_date, self.end_date)
+            self.assertEqual(len(invoices), client_count)
+            return len(queries)
+
+        self.assertEqual(run(1), run(25))
+        self.assertEqual(InvoiceItem.objects.count(), 26)
+        self.assertFalse(TimeEntry.objects.filter(invoice__isnull=True).exists())
+
+    def test_generate_invoices_command_defaults_to_previous_month(self):
+        project = self._project(self._client('Acme'), 'Design', '100.00')
+        last_month = timezone.localdate().replace(day=1) - timedelta(days=1)
+        self._entry(project, last_month, 60)
+        self._entry(project, timezone.localdate().replace(day=1), 60)
+
+        call_command('generate_invoices', stdout=StringIO())
+
+        invoice = Invoice.objects.get()
+        self.assertEqual(invoice.total_amount, Decimal('100.00'))
+
+
+class InvoiceTotalsTest(TestCase):
+    def setUp(self):
+        self.organization = Organization.objects.create(name='Test Organization')
+        self.contact = Contact.objects.create(
+            organization=self.organization, name='Acme', contact_type=Contact.ContactType.CLIENT
+        )
+
+    def _invoice(self):
+        return Invoice.objects.create(organization=self.organization, contact=self.contact, due_date=date(2024, 4, 30))
+
+    def test_bulk_create_prices_items_and_updates_totals_in_constant_queries(self):
+        invoices = [self._invoice() for _ in range(3)]
+        items = [
+            InvoiceItem(invoice=invoice, description='Work', quantity=Decimal('1.5'), unit_price=Decimal('99.99'))
+            for invoice in invoices for _ in range(4)
+        ]
+
+        with CaptureQueriesContext(connection) as queries:
+            InvoiceItem.objects.bulk_create(items)
+
+        self.assertLessEqual(len(queries), 4)
+        self.assertEqual(items[0].total_price, Decimal('149.99'))
+        for invoice in invoices:
+            invoice.refresh_from_db()
+            self.assertEqual(invoice.total_amount, Decimal('599.96'))
+
+    def test_bulk_update_reprices_and_moves_items(self):
+        first, second = self._invoice(), self._invoice()
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(invoice=first, description='A', quantity=1, unit_price=Decimal('100.00')),
+            InvoiceItem(invoice=first, description='B', quantity=2, unit_price=Decimal('50.00')),
+        ])
+        items = list(InvoiceItem.objects.order_by('description'))
+        items[0].quantity = 3
+        items[1].invoice = second
+
+        InvoiceItem.objects.bulk_update(items, ['quantity', 'invoice'])
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.total_amount, Decimal('300.00'))
+        self.assertEqual(second.total_amount, Decimal('100.00'))
+
+    def test_save_and_delete_keep_total_in_sync(self):
+        invoice = self._invoice()
+        item = InvoiceItem.objects.create(invoice=invoice, description='A', quantity=2, unit_price=Decimal('10.00'))
+        InvoiceItem.objects.create(invoice=invoice, description='B', quantity=1, unit_price=Decimal('5.00'))
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total_amount, Decimal('25.00'))
+
+        item.delete()
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total_amount, Decimal('5.00'))
+
+        InvoiceItem.objects.filter(invoice=invoice).delete()
+        invoice.refresh_from_db()
+        self.assertEqual(invoice.total_amount, Decimal('0.00'))
+
+    def test_check_invoice_totals_reports_and_fixes_mismatches(self):
+        invoices = [self._invoice() for _ in range(5)]
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(invoice=invoice, description='Work', quantity=1, unit_price=Decimal('10.00'))
+            for invoice in invoices
+        ])
+        Invoice.objects.filter(pk__in=[invoices[1].pk, invoices[3].pk]).update(total_amount=Decimal('1.00'))
+
+        out = StringIO()
+        call_command('check_invoice_totals', chunk_size=2, stdout=out)
+        self.assertIn('Checked 5 invoice(s), 2 mismatched.', out.getvalue())
+        self.assertEqual(Invoice.objects.filter(total_amount=Decimal('1.00')).count(), 2)
+
+        call_command('check_invoice_totals', chunk_size=2, fix=True, stdout=StringIO())
+        out = StringIO()
+        call_command('check_invoice_totals', stdout=out)
+        self.assertIn('Checked 5 invoice(s), 0 mismatched.', out.getvalue())
+
+
+class EpcQrCodeCacheTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        cache.clear()
+        self.organization = Organization.objects.create(
+            name='Test Organization', iban='DE89370400440532013000', bic='COBADEFFXXX'
+        )
+        contact = Contact.objects.create(
+            organization=self.organization, name='Acme', contact_type=Contact.ContactType.CLIENT
+        )
+        self.invoice = Invoice.objects.create(
+            organization=self.organization, contact=contact, due_date=date(2024, 4, 30),
+            total_amount=Decimal('125.50'),
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        cache.clear()
+
+    def test_unchanged_code_is_rendered_once(self):
+        with mock.patch.object(utils, '_render_epc_qr', wraps=utils._render_epc_qr) as render:
+            first = utils.generate_epc_qr_code(self.invoice)
+            second = utils.generate_epc_qr_code(Invoice.objects.get(pk=self.invoice.pk))
+            # A cold cache falls back to the stored file
+            cache.clear()
+            third = utils.generate_epc_qr_code(self.invoice)
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(first, third)
+
+    def test_payload_change_produces_a_new_code(self):
+        key = utils.epc_qr_key(self.invoice)
+        self.invoice.total_amount = Decimal('130.00')
+        self.assertNotEqual(utils.epc_qr_key(self.invoice), key)
+
+        self.organization.iban = 'SE4550000000058398257466'
+        self.invoice.total_amount = Decimal('125.50')
+        self.assertNotEqual(utils.epc_qr_key(self.invoice), key)
+
+    def test_code_is_a_png(self):
+        png = base64.b64decode(utils.generate_epc_qr_code(self.invoice))
+        self.assertTrue(png.startswith(b'\x89PNG'))
+
+
+class InvoicePdfBatchTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        cache.clear()
+        self.organization = Organization.objects.create(
+            name='Test Organization', iban='DE89370400440532013000', bic='COBADEFFXXX'
+        )
+        contact = Contact.objects.create(
+            organization=self.organization, name='Acme', contact_type=Contact.ContactType.CLIENT
+        )
+        self.invoices = []
+        for index in range(3):
+            invoice = Invoice.objects.create(organization=self.organization, contact=contact, due_date=date(2024, 4, 30))
+            InvoiceItem.objects.create(invoice=invoice, description=f'Work {index}', quantity=2, unit_price=Decimal('50.00'))
+            self.invoices.append(invoice)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        cache.clear()
+
+    def test_renders_pdfs_to_storage_and_streams_zip(self):
+        result = generate_invoice_pdfs(Invoice.objects.all(), workers=1, chunk_size=2)
+
+        self.assertEqual(result.failed, [])
+        self.assertEqual(len(result.paths), 3)
+        self.assertGreater(result.rate, 0)
+        with open(os.path.join(self.media_root, result.paths[0]), 'rb') as pdf:
+            self.assertTrue(pdf.read().startswith(b'%PDF'))
+
+        archive = zipfile.ZipFile(BytesIO(b''.join(stream_zip(result.paths))))
+        self.assertEqual(
+            sorted(archive.namelist()), sorted(f'invoice-{invoice.pk}.pdf' for invoice in self.invoices)
+        )
+        self.assertIsNone(archive.testzip())
+
+    def test_rerendering_overwrites_existing_files(self):
+        first = generate_invoice_pdfs(Invoice.objects.all(), workers=1)
+        second = generate_invoice_pdfs(Invoice.objects.all(), workers=1)
+        self.assertEqual(first.paths, second.paths)
+
+    def test_command_reports_throughput_and_writes_zip(self):
+        zip_path = os.path.join(self.media_root, 'batch.zip')
+        out = StringIO()
+        call_command('generate_invoice_pdfs', organizations=[self.organization.pk], workers=1,
+                     zip_path=zip_path, stdout=out)
+
+        self.assertIn('Rendered 3 invoice PDF(s)', out.getvalue())
+        self.assertIn('invoices/s', out.getvalue())
+        self.assertEqual(len(zipfile.ZipFile(zip_path).namelist()), 3)
+
+    @override_settings(INVOICE_PDF_WORKERS=1)
+    def test_admin_action_streams_zip(self):
+        admin_user = get_user_model().objects.create_superuser(username='admin', password='testpassword')
+        self.client.force_login(admin_user)
+        response = self.client.post(reverse('admin:invoicing_invoice_changelist'), {
+            'action': 'download_pdfs',
+            '_selected_action': [invoice.pk for invoice in self.invoices[:2]],
+        })
+
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(len(archive.namelist()), 2)
+
+
+class InvoiceListViewTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.organization = Organization.objects.create(name='Test Organization')
+        self.organization.members.add(self.user)
+        plan = SubscriptionPlan.objects.create(name='Pro', price=Decimal('10.00'), description='Pro plan')
+        Subscription.objects.create(
+            organization=self.organization, plan=plan, start_date=date(2024, 1, 1), end_date=date(2099, 1, 1)
+        )
+        self.contact = Contact.objects.create(
+            organization=self.organization, name='Acme', contact_type=Contact.ContactType.CLIENT
+        )
+        self.client.login(username='testuser', password='testpassword')
+        self.url = reverse('invoicing:invoice_list')
+        self.today = timezone.localdate()
+
+    def _invoice(self, due_date, is_paid=False, organization=None, items=1):
+        invoice = Invoice.objects.create(
+            organization=organization or self.organization, contact=self.contact, due_date=due_date, is_paid=is_paid
+        )
+        InvoiceItem.objects.bulk_create([
+            InvoiceItem(invoice=invoice, description='Work', quantity=1, unit_price=Decimal('10.00'))
+            for _ in range(items)
+        ])
+        return invoice
+
+    def _get(self, **params):
+        return self.client.get(self.url, params, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_annotates_status_item_count_and_days_outstanding(self):
+        paid = self._invoice(self.today - timedelta(days=5), is_paid=True, items=2)
+        overdue = self._invoice(self.today - timedelta(days=1), items=3)
+        open_invoice = self._invoice(self.today + timedelta(days=10))
+        Invoice.objects.filter(pk=overdue.pk).update(created_at=timezone.now() - timedelta(days=40))
+        self._invoice(self.today, organization=Organization.objects.create(name='Other'))
+
+        data = self._get().json()
+
+        rows = {row['id']: row for row in data['invoices']}
+        self.assertEqual(list(rows), [open_invoice.pk, overdue.pk, paid.pk])
+        self.assertEqual(rows[paid.pk]['status'], 'paid')
+        self.assertEqual(rows[paid.pk]['item_count'], 2)
+        self.assertIsNone(rows[paid.pk]['days_outstanding'])
+        self.assertEqual(rows[overdue.pk]['status'], 'overdue')
+        self.assertEqual(rows[overdue.pk]['days_outstanding'], 40)
+        self.assertEqual(rows[open_invoice.pk]['status'], 'open')
+        self.assertEqual(rows[open_invoice.pk]['contact'], 'Acme')
+
+    def test_keyset_pages_cover_every_invoice_once(self):
+        # Several invoices share a due date, so the pk breaks the ties
+        created = [self._invoice(self.today + timedelta(days=index % 4)) for index in range(60)]
+
+        seen = []
+        cursor = None
+        while True:
+            params = {'after': cursor} if cursor else {}
+            data = self._get(**params).json()
+            seen.extend(row['id'] for row in data['invoices'])
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        expected = sorted(created, key=lambda invoice: (invoice.due_date, invoice.pk), reverse=True)
+        self.assertEqual(seen, [invoice.pk for invoice in expected])
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        for index in range(30):
+            self._invoice(self.today + timedelta(days=index), items=2)
+        with CaptureQueriesContext(connection) as queries:
+            self._get()
+        query_count = len(queries)
+        Invoice.objects.all().delete()
+        self._invoice(self.today)
+        with self.assertNumQueries(query_count):
+            self._get()
+
+    def test_filters_on_paid_and_due_date(self):
+        self._invoice(self.today - timedelta(days=3), is_paid=True)
+        unpaid_old = self._invoice(self.today - timedelta(days=3))
+        self._invoice(self.today + timedelta(days=3))
+
+        data = self._get(is_paid='false', due_to=(self.today - timedelta(days=1)).isoformat()).json()
+        self.assertEqual([row['id'] for row in data['invoices']], [unpaid_old.pk])
+
+        data = self._get(due_from=self.today.isoformat()).json()
+        self.assertEqual(len(data['invoices']), 1)
+
+    def test_invalid_cursor_returns_404(self):
+        self.assertEqual(self._get(after='not-a-cursor').status_code, 404)
+
+
+class CountingEmailBackend(LocmemEmailBackend):
+    """Locmem backend recording how often a connection is opened and used."""
+    opened = 0
+    send_calls = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        CountingEmailBackend.send_calls += 1
+        return super().send_messages(messages)
+
+
+class ShortEmailBackend(LocmemEmailBackend):
+    """Locmem backend dropping the first message of each call, as when a recipient is refused."""
+
+    def send_messages(self, messages):
+        return super().send_messages(messages[1:])
+
+
+@override_settings(EMAIL_BACKEND='invoicing.tests.CountingEmailBackend')
+class PaymentReminderTest(TestCase):
+    def setUp(self):
+        CountingEmailBackend.opened = 0
+        CountingEmailBackend.send_calls = 0
+        self.organization = Organization.objects.create(name='Test Organization', iban='DE89370400440532013000')
+        self.opted_in = Contact.objects.create(
+            organization=self.organization, name='Acme', contact_type=Contact.ContactType.CLIENT,
+            email='billing@acme.test', send_reminders=True,
+        )
+        self.today = timezone.localdate()
+
+    def _invoice(self, contact=None, days_overdue=5, is_paid=False):
+        return Invoice.objects.create(
+            organization=self.organization, contact=contact or self.opted_in,
+            due_date=self.today - timedelta(days=days_overdue), is_paid=is_paid, total_amount=Decimal('100.00'),
+        )
+
+    def test_sends_only_for_overdue_unpaid_opted_in_invoices(self):
+        overdue = self._invoice()
+        self._invoice(days_overdue=0)
+        self._invoice(is_paid=True)
+        opted_out = Contact.objects.create(
+            organization=self.organization, name='Quiet', contact_type=Contact.ContactType.CLIENT,
+            email='quiet@example.test',
+        )
+        self._invoice(contact=opted_out)
+        no_email = Contact.objects.create(
+            organization=self.organization, name='No Email', contact_type=Contact.ContactType.CLIENT,
+            send_reminders=True,
+        )
+        self._invoice(contact=no_email)
+
+        sent = send_payment_reminders()
+
+        self.assertEqual(sent, 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['billing@acme.test'])
+        self.assertIn(f'INV-{overdue.pk}', mail.outbox[0].subject)
+        self.assertIn('100.00', mail.outbox[0].body)
+        overdue.refresh_from_db()
+        self.assertIsNotNone(overdue.reminder_sent_at)
+
+    def test_batches_share_one_connection_and_reruns_are_idempotent(self):
+        for _ in range(7):
+            self._invoice()
+
+        out = StringIO()
+        call_command('send_payment_reminders', batch_size=3, stdout=out)
+
+        self.assertIn('Sent 7 payment reminder(s).', out.getvalue())
+        self.assertEqual(len(mail.outbox), 7)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertEqual(CountingEmailBackend.send_calls, 3)
+
+        call_command('send_payment_reminders', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 7)
+
+    def test_names_are_not_html_escaped(self):
+        self.organization.name = 'Acme <AB>'
+        self.organization.save()
+        contact = Contact.objects.create(
+            organization=self.organization, name="O'Brien & Sons", contact_type=Contact.ContactType.CLIENT,
+            email='billing@obrien.test', send_reminders=True,
+        )
+        self._invoice(contact=contact)
+
+        send_payment_reminders()
+
+        message = mail.outbox[0]
+        self.assertIn('from Acme <AB>', message.subject)
+        self.assertIn("Hello O'Brien & Sons,", message.body)
+        self.assertTrue(message.body.rstrip().endswith('Acme <AB>'))
+
+    def test_partly_accepted_batch_is_not_stamped(self):
+        invoices = [self._invoice() for _ in range(3)]
+
+        with self.assertLogs('invoicing.reminders', level='WARNING'):
+            sent = send_payment_reminders(batch_size=2, connection=ShortEmailBackend())
+
+        self.assertEqual(sent, 0)
+        self.assertFalse(Invoice.objects.filter(reminder_sent_at__isnull=False).exists())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(send_payment_reminders(), 3)
+        for invoice in invoices:
+            invoice.refresh_from_db()
+            self.assertIsNotNone(invoice.reminder_sent_at)
+
+    def test_repeat_after_reminds_again_once_interval_passed(self):
+        invoice = self._invoice()
+        send_payment_reminders()
+        Invoice.objects.filter(pk=invoice.pk).update(reminder_sent_at=timezone.now() - timedelta(days=8))
+
+        self.assertEqual(send_payment_reminders(repeat_after=timedelta(days=14)), 0)
+        self.assertEqual(send_payment_reminders(repeat_after=timedelta(days=7)), 1)
+        self.assertEqual(len(mail.outbox), 2)
@@ -1,31 +1,78 @@
 import base64
+import hashlib
 from io import BytesIO
-import segno
 
-def generate_epc_qr_code(invoice):
-    """
-    Generates a SEPA EPC QR code for an invoice.
-    """
+from segno import helpers
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+QR_CACHE_PREFIX = 'epc-qr'
+QR_STORAGE_DIR = 'invoices/qr'
+QR_SCALE = 5
+# Codes only change with their payload, so keep them for a long time
+QR_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _epc_qr_data(invoice):
     # EPC QR Code data structure
     # See: https://www.europeanpaymentscouncil.eu/document-library/guidance-documents/quick-response-code-guidelines-enable-data-capture-initiation
-    data = {
+    # The reference is free text, structured references must be ISO 11649
+    return {
         'name': invoice.organization.name,
         'iban': invoice.organization.iban,
         'amount': str(invoice.total_amount),
         'bic': invoice.organization.bic,
-        'reference': f'INV-{invoice.pk}',
-        'purpose': 'Invoice payment',
+        'text': f'INV-{invoice.pk}',
     }
 
-    # Create the EPC QR code
-    qrcode = segno.helpers.make_epc_qr(data)
 
-    # Save the QR code to a buffer
+def epc_qr_key(invoice):
+    """
+    Content hash identifying an invoice's QR code.
+
+    Covers everything encoded in the code (IBAN, BIC, amount, reference and
+    payee name), so a code is only regenerated when one of them changes.
+    """
+    data = _epc_qr_data(invoice)
+    payload = '\n'.join(data[field] for field in ('iban', 'bic', 'amount', 'text', 'name'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _render_epc_qr(data):
+    qrcode = helpers.make_epc_qr(**dict(data, bic=data['bic'] or None))
     buffer = BytesIO()
-    qrcode.save(buffer, kind='png', scale=5)
-    buffer.seek(0)
+    qrcode.save(buffer, kind='png', scale=QR_SCALE)
+    return buffer.getvalue()
 
-    # Encode the image to base64
-    encoded_img = base64.b64encode(buffer.read()).decode('utf-8')
 
-    return encoded_img
+def get_epc_qr_code(invoice):
+    """
+    Returns the EPC QR code of an invoice as PNG bytes.
+
+    Looks in the cache first, then in default_storage, and only renders the
+    code with segno when neither has it for the current payload.
+    """
+    key = epc_qr_key(invoice)
+    cache_key = f'{QR_CACHE_PREFIX}:{key}'
+    content = cache.get(cache_key)
+    if content is not None:
+        return content
+
+    path = f'{QR_STORAGE_DIR}/{key}.png'
+    if default_storage.exists(path):
+        with default_storage.open(path, 'rb') as stored:
+            content = stored.read()
+    else:
+        content = _render_epc_qr(_epc_qr_data(invoice))
+        default_storage.save(path, ContentFile(content))
+
+    cache.set(cache_key, content, QR_CACHE_TIMEOUT)
+    return content
+
+
+def generate_epc_qr_code(invoice):
+    """
+    Generates a SEPA EPC QR code for an invoice as a base64 encoded PNG.
+    """
+    return base64.b64encode(get_epc_qr_code(invoice)).decode('utf-8')
@@ -1,12 +1,108 @@
+from datetime import date
+
+from django.db.models import Case, CharField, Count, DurationField, ExpressionWrapper, F, Value, When
+from django.db.models.functions import Now
+from django.http import Http404, JsonResponse
+from django.utils import timezone
 from django.views.generic import ListView
 from .models import Invoice
 from workspaces.mixins import OrganizationPermissionMixin
+from workspaces.pagination import InvalidCursor, KeysetPaginator
 from django.contrib.auth.mixins import LoginRequiredMixin
 from subscriptions.decorators import subscription_required
 from django.utils.decorators import method_decorator
 
+STATUS_PAID = 'paid'
+STATUS_OVERDUE = 'overdue'
+STATUS_OPEN = 'open'
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
 @method_decorator(subscription_required('Pro'), name='dispatch')
 class InvoiceListView(LoginRequiredMixin, OrganizationPermissionMixin, ListView):
+    """
+    Invoices of the user's organization, newest due date first.
+
+    Status, item count and days outstanding are computed in SQL and pages are
+    keyset-paginated with the opaque `after` cursor. Filters: `is_paid`
+    (true/false), `due_from` and `due_to` (YYYY-MM-DD).
+    """
     model = Invoice
     template_name = 'invoicing/invoice_list.html'
     context_object_name = 'invoices'
+    paginate_by = 25
+    ordering = ('-due_date', '-pk')
+
+    def get_queryset(self):
+        today = timezone.localdate()
+        invoices = super().get_queryset().select_related('contact').annotate(
+            item_count=Count('items'),
+            status=Case(
+                When(is_paid=True, then=Value(STATUS_PAID)),
+                When(due_date__lt=today, then=Value(STATUS_OVERDUE)),
+                default=Value(STATUS_OPEN),
+                output_field=CharField(),
+            ),
+            days_outstanding=Case(
+                When(is_paid=False, then=ExpressionWrapper(Now() - F('created_at'), output_field=DurationField())),
+                default=None,
+                output_field=DurationField(),
+            ),
+        )
+
+        is_paid = self.request.GET.get('is_paid', '').lower()
+        if is_paid in ('true', 'false'):
+            invoices = invoices.filter(is_paid=is_paid == 'true')
+        due_from = _parse_date(self.request.GET.get('due_from'))
+        if due_from:
+            invoices = invoices.filter(due_date__gte=due_from)
+        due_to = _parse_date(self.request.GET.get('due_to'))
+        if due_to:
+            invoices = invoices.filter(due_date__lte=due_to)
+        return invoices
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, self.ordering, page_size)
+        try:
+            page = paginator.get_page(self.request.GET.get('after'))
+        except InvalidCursor:
+            raise Http404('Invalid page cursor.')
+        return paginator, page, page.object_list, page.has_next
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        page = context['page_obj']
+        query = self.request.GET.copy()
+        if 'after' in query:
+            del query['after']
+            context['first_page_query'] = query.urlencode()
+        if page.has_next:
+            query['after'] = page.next_cursor
+            context['next_page_query'] = query.urlencode()
+        return context
+
+    def render_to_response(self, context, **response_kwargs):
+        if self.request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            page = context['page_obj']
+            return JsonResponse({
+                'invoices': [
+                    {
+                        'id': invoice.pk,
+                        'contact': invoice.contact.name,
+                        'due_date': invoice.due_date.isoformat(),
+                        'total_amount': str(invoice.total_amount),
+                        'item_count': invoice.item_count,
+                        'status': invoice.status,
+                        'days_outstanding': invoice.days_outstanding.days if invoice.days_outstanding is not None else None,
+                    }
+                    for invoice in page
+                ],
+                'next_cursor': page.next_cursor,
+            })
+        return super().render_to_response(context, **response_kwargs)
@@ -1,10 +1,12 @@
 from django import forms
 from workspaces.models import Project
+from .rollup import GROUP_BY_CHOICES
 
 class ReportForm(forms.Form):
     start_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
     end_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date', 'class': 'form-control'}))
     project = forms.ModelChoiceField(queryset=Project.objects.none(), required=False, widget=forms.Select(attrs={'class': 'form-select', 'id': 'id_project'}))
+    group_by = forms.ChoiceField(choices=[('', 'No grouping')] + GROUP_BY_CHOICES, required=False, widget=forms.Select(attrs={'class': 'form-select'}))
 
     def __init__(self, *args, **kwargs):
         user = kwargs.pop('user', None)
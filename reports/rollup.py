@@ -0,0 +1,185 @@
+"""
+Grouped report rows with subtotals.
+
+`rollup_rows()` groups a report's entries by project, local day or both in
+a single query. On PostgreSQL the subtotals come from GROUP BY ROLLUP;
+elsewhere the finest groups are read in order and their parents are
+accumulated in one pass. `grouped_report_rows()` streams the entries in
+the same order and slots each one in before its group's subtotals, so an
+export holds one chunk of entries in memory, never the whole report.
+"""
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+
+from django.db import connections
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+
+from workspaces.models import TimeEntry
+from workspaces.utils import worked_duration_expression
+
+GROUP_BY_CHOICES = [
+    ('project', 'Project'),
+    ('day', 'Day'),
+    ('project,day', 'Project, then day'),
+]
+
+ROW_ENTRY = 'entry'
+ROW_SUBTOTAL = 'subtotal'
+ROW_TOTAL = 'total'
+
+# Entries fetched per round trip while streaming an export
+STREAM_CHUNK_SIZE = 2000
+
+# Columns holding the key of each grouping level, then the columns it is sorted on
+LEVEL_COLUMNS = {
+    'project': ('group_project_id', 'group_project_name'),
+    'day': ('group_day',),
+}
+LEVEL_ORDERING = {
+    'project': ('group_project_name', 'group_project_id'),
+    'day': ('group_day',),
+}
+ROW_ATTRIBUTES = {'group_project_id': 'project_id', 'group_project_name': 'project_name', 'group_day': 'day'}
+
+
+@dataclass
+class ReportRow:
+    kind: str
+    # Number of grouping levels the row is keyed on: the finest groups have
+    # one per level, the grand total none
+    depth: int
+    project_id: int = None
+    project_name: str = None
+    day: date = None
+    entry: TimeEntry = None
+    entry_count: int = 0
+    worked: timedelta = field(default_factory=timedelta)
+
+
+def parse_group_by(value):
+    """The grouping levels of a `group_by` value such as 'project,day'. Raises ValueError."""
+    if value not in dict(GROUP_BY_CHOICES):
+        raise ValueError(f"Invalid group_by: {value!r}")
+    return tuple(value.split(','))
+
+
+def _group_annotations(levels, tz=None):
+    annotations = {}
+    if 'project' in levels:
+        annotations.update(group_project_id=F('project_id'), group_project_name=F('project__name'))
+    if 'day' in levels:
+        annotations['group_day'] = TruncDate('start_time', tzinfo=tz)
+    return annotations
+
+
+def _ordering(levels):
+    return [column for level in levels for column in LEVEL_ORDERING[level]]
+
+
+def _key(lookup, levels):
+    return tuple(tuple(lookup(column) for column in LEVEL_COLUMNS[level]) for level in levels)
+
+
+def _subtotal(levels, key, depth, entry_count, worked):
+    row = ReportRow(ROW_SUBTOTAL if depth else ROW_TOTAL, depth, entry_count=entry_count, worked=worked or timedelta())
+    for level, values in zip(levels[:depth], key):
+        if level == 'project':
+            row.project_id, row.project_name = values
+        else:
+            row.day, = values
+    return row
+
+
+def _emulated_rollup(entries, levels, tz):
+    """Finest groups in order, with the parent subtotals accumulated as they close."""
+    grouped = entries.order_by().annotate(**_group_annotations(levels, tz)).values(
+        *[column for level in levels for column in LEVEL_COLUMNS[level]]
+    ).annotate(
+        entry_count=Count('pk'),
+        worked=Sum(worked_duration_expression()),
+    ).order_by(*_ordering(levels))
+
+    finest = len(levels)
+    # Running count and worked time per depth, 0 being the grand total
+    totals = [[0, timedelta()] for _ in range(finest)]
+    previous = None
+    for values in grouped.iterator(chunk_size=STREAM_CHUNK_SIZE):
+        key = _key(values.get, levels)
+        if previous is not None:
+            changed = next(index for index in range(finest) if key[index] != previous[index])
+            for depth in range(finest - 1, changed, -1):
+                yield _subtotal(levels, previous, depth, *totals[depth])
+                totals[depth] = [0, timedelta()]
+        worked = values['worked'] or timedelta()
+        yield _subtotal(levels, key, finest, values['entry_count'], worked)
+        for totals_at_depth in totals:
+            totals_at_depth[0] += values['entry_count']
+            totals_at_depth[1] += worked
+        previous = key
+    if previous is not None:
+        for depth in range(finest - 1, 0, -1):
+            yield _subtotal(levels, previous, depth, *totals[depth])
+    yield _subtotal(levels, (), 0, *totals[0])
+
+
+def _rollup(entries, levels, tz):
+    """Subtotals of every level and the grand total from GROUP BY ROLLUP (PostgreSQL)."""
+    connection = connections[entries.db]
+    quote = connection.ops.quote_name
+    columns = [column for level in levels for column in LEVEL_COLUMNS[level]]
+    inner_sql, params = entries.order_by().annotate(
+        **_group_annotations(levels, tz), worked=worked_duration_expression()
+    ).values(*columns, 'worked').query.sql_with_params()
+
+    groupings = [f'GROUPING({quote(LEVEL_COLUMNS[level][0])})' for level in levels]
+    elements = ', '.join(f"({', '.join(quote(column) for column in LEVEL_COLUMNS[level])})" for level in levels)
+    # Within each level, its grouped rows sort before the subtotal closing them
+    ordering = ', '.join(
+        ', '.join([grouping] + [quote(column) for column in LEVEL_ORDERING[level]])
+        for level, grouping in zip(levels, groupings)
+    )
+    sql = (
+        f"SELECT {', '.join(quote(column) for column in columns)}, COUNT(*), SUM({quote('worked')}), "
+        f"{', '.join(groupings)} FROM ({inner_sql}) AS report_rows "
+        f"GROUP BY ROLLUP({elements}) ORDER BY {ordering}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for row in cursor:
+            values = dict(zip(columns, row))
+            entry_count, worked = row[len(columns)], row[len(columns) + 1]
+            depth = list(row[len(columns) + 2:]).count(0)
+            yield _subtotal(levels, _key(values.get, levels), depth, entry_count, worked)
+
+
+def rollup_rows(entries, levels, tz=None):
+    """
+    Subtotal rows of `entries` grouped by `levels` (see parse_group_by), in
+    report order: each group's rows before its subtotal, the grand total
+    last. Days are local to `tz`, the current timezone by default.
+    """
+    if connections[entries.db].vendor == 'postgresql':
+        return _rollup(entries, levels, tz)
+    return _emulated_rollup(entries, levels, tz)
+
+
+def grouped_report_rows(entries, levels, tz=None):
+    """The rows of rollup_rows() with each finest group preceded by its entries."""
+    stream = entries.select_related('project').annotate(**_group_annotations(levels, tz)).order_by(
+        *_ordering(levels), 'start_time', 'pk'
+    ).iterator(chunk_size=STREAM_CHUNK_SIZE)
+    pending = next(stream, None)
+    finest = len(levels)
+    for row in rollup_rows(entries, levels, tz):
+        if row.depth == finest:
+            key = _key(lambda column: getattr(row, ROW_ATTRIBUTES[column]), levels)
+            while pending is not None and _key(lambda column: getattr(pending, column), levels) == key:
+                yield ReportRow(
+                    ROW_ENTRY, finest, project_id=pending.project_id,
+                    project_name=pending.project.name if pending.project else None,
+                    day=getattr(pending, 'group_day', None), entry=pending,
+                    entry_count=1, worked=max(pending.duration, timedelta()),
+                )
+                pending = next(stream, None)
+        yield row
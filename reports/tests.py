@@ -1,3 +1,210 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import Organization
+from workspaces.models import Project, TimeEntry
+from . import views
+from .rollup import grouped_report_rows, parse_group_by, rollup_rows
+from .utils import translate_text
+
+class ReportViewTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.organization = Organization.objects.create(name='Test Organization')
+        self.organization.members.add(self.user)
+        self.alpha = Project.objects.create(name='Alpha', organization=self.organization)
+        self.beta = Project.objects.create(name='Beta', organization=self.organization)
+        self.client.login(username='testuser', password='testpassword')
+        self.today = timezone.localdate()
+        self.params = {'start_date': (self.today - timedelta(days=30)).isoformat(), 'end_date': self.today.isoformat()}
+
+    def _create_entries(self, count, project, hours=1, paused=timedelta(0)):
+        now = timezone.now()
+        for index in range(count):
+            start = now - timedelta(days=index % 20, hours=hours + index % 3 + 1)
+            TimeEntry.objects.create(
+                user=self.user, project=project, title=f'{project.name} {index}',
+                start_time=start, end_time=start + timedelta(hours=hours), paused_duration=paused,
+            )
+
+    def test_totals_are_computed_per_project(self):
+        self._create_entries(3, self.alpha, hours=2)
+        self._create_entries(2, self.beta, hours=1, paused=timedelta(minutes=30))
+        response = self.client.get(reverse('reports:reports'), self.params)
+        self.assertEqual(response.context['entry_count'], 5)
+        self.assertEqual(response.context['total_duration'], timedelta(hours=7))
+        self.assertEqual(
+            [(row['project__name'], row['entry_count'], row['worked']) for row in response.context['project_totals']],
+            [('Alpha', 3, timedelta(hours=6)), ('Beta', 2, timedelta(hours=1))],
+        )
+
+    def test_preview_is_paginated_with_a_cursor(self):
+        self._create_entries(7, self.alpha)
+        seen = []
+        with patch.object(views, 'REPORT_PAGE_SIZE', 3):
+            response = self.client.get(reverse('reports:reports'), self.params)
+            while True:
+                page = response.context['entries']
+                self.assertLessEqual(len(page), 3)
+                seen.extend(entry.pk for entry in page)
+                if not response.context.get('next_page_query'):
+                    break
+                response = self.client.get(f"{reverse('reports:reports')}?{response.context['next_page_query']}")
+        expected = list(TimeEntry.objects.order_by('-start_time', '-pk').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(response.context['entry_count'], 7)
+
+    def test_query_count_does_not_grow_with_entries(self):
+        # Session and user, the grouped totals, one page, the form's project
+        # choices, and the session save
+        self._create_entries(2, self.alpha)
+        with self.assertNumQueries(8):
+            self.client.get(reverse('reports:reports'), self.params)
+        self._create_entries(120, self.beta)
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse('reports:reports'), self.params)
+        self.assertEqual(len(response.context['entries']), views.REPORT_PAGE_SIZE)
+        self.assertTrue(response.context['next_page_query'])
+
+    def test_pdf_export_renders_the_entries(self):
+        self._create_entries(2, self.alpha)
+        response = self.client.get(reverse('reports:reports'), dict(self.params, export='pdf'))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('attachment; filename="report_', response['Content-Disposition'])
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse('reports:reports'), dict(self.params, after='not-a-cursor'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_entries_of_other_users_are_excluded(self):
+        other = get_user_model().objects.create_user(username='other', password='testpassword')
+        TimeEntry.objects.create(
+            user=other, title='Other', start_time=timezone.now() - timedelta(hours=2), end_time=timezone.now(),
+        )
+        response = self.client.get(reverse('reports:reports'), self.params)
+        self.assertEqual(response.context['entry_count'], 0)
+
+
+class GroupedReportTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.organization = Organization.objects.create(name='Test Organization')
+        self.organization.members.add(self.user)
+        self.alpha = Project.objects.create(name='Alpha', organization=self.organization)
+        self.beta = Project.objects.create(name='Beta', organization=self.organization)
+        self.client.login(username='testuser', password='testpassword')
+        self.tz = ZoneInfo('Europe/Stockholm')
+        utc = ZoneInfo('UTC')
+        # (project, UTC start, hours); 22:30 UTC on June 1st is June 2nd in Stockholm
+        for project, start, hours in [
+            (self.alpha, datetime(2024, 6, 1, 8, 0, tzinfo=utc), 2),
+            (self.alpha, datetime(2024, 6, 1, 22, 30, tzinfo=utc), 1),
+            (self.alpha, datetime(2024, 6, 2, 9, 0, tzinfo=utc), 3),
+            (self.beta, datetime(2024, 6, 2, 9, 0, tzinfo=utc), 1),
+            (None, datetime(2024, 6, 3, 9, 0, tzinfo=utc), 4),
+        ]:
+            TimeEntry.objects.create(
+                user=self.user, project=project, title=f'{project.name if project else "Loose"} {start:%d %H}',
+                start_time=start, end_time=start + timedelta(hours=hours),
+            )
+        self.params = {'start_date': '2024-06-01', 'end_date': '2024-06-30'}
+
+    def _summary(self, rows):
+        return [
+            (row.kind, row.depth, row.project_name, row.day and row.day.isoformat(), row.entry_count, row.worked)
+            for row in rows
+        ]
+
+    def test_parse_group_by(self):
+        self.assertEqual(parse_group_by('project,day'), ('project', 'day'))
+        with self.assertRaises(ValueError):
+            parse_group_by('day,project')
+
+    def test_rollup_by_project_and_local_day(self):
+        with timezone.override(self.tz), self.assertNumQueries(1):
+            rows = list(rollup_rows(TimeEntry.objects.all(), ('project', 'day')))
+        hour = timedelta(hours=1)
+        self.assertEqual(self._summary(rows), [
+            ('subtotal', 2, None, '2024-06-03', 1, 4 * hour),
+            ('subtotal', 1, None, None, 1, 4 * hour),
+            ('subtotal', 2, 'Alpha', '2024-06-01', 1, 2 * hour),
+            ('subtotal', 2, 'Alpha', '2024-06-02', 2, 4 * hour),
+            ('subtotal', 1, 'Alpha', None, 3, 6 * hour),
+            ('subtotal', 2, 'Beta', '2024-06-02', 1, hour),
+            ('subtotal', 1, 'Beta', None, 1, hour),
+            ('total', 0, None, None, 5, 11 * hour),
+        ])
+
+    def test_rollup_by_day(self):
+        with timezone.override(self.tz):
+            rows = list(rollup_rows(TimeEntry.objects.all(), ('day',)))
+        self.assertEqual(
+            [(row.day and row.day.isoformat(), row.entry_count) for row in rows],
+            [('2024-06-01', 1), ('2024-06-02', 3), ('2024-06-03', 1), (None, 5)],
+        )
+
+    def test_rollup_of_no_entries_is_a_zero_total(self):
+        rows = list(rollup_rows(TimeEntry.objects.none(), ('project',)))
+        self.assertEqual(self._summary(rows), [('total', 0, None, None, 0, timedelta())])
+
+    def test_entries_precede_their_group_subtotal(self):
+        with timezone.override(self.tz), self.assertNumQueries(2):
+            rows = list(grouped_report_rows(TimeEntry.objects.all(), ('project', 'day')))
+        self.assertEqual(
+            [row.entry.title if row.kind == 'entry' else (row.kind, row.depth) for row in rows][:8],
+            ['Loose 03 09', ('subtotal', 2), ('subtotal', 1),
+             'Alpha 01 08', ('subtotal', 2), 'Alpha 01 22', 'Alpha 02 09', ('subtotal', 2)],
+        )
+        self.assertEqual(len([row for row in rows if row.kind == 'entry']), 5)
+
+    def test_csv_export_streams_groups_with_subtotals(self):
+        with timezone.override(self.tz):
+            response = self.client.get(
+                reverse('reports:reports'), dict(self.params, group_by='project', export='csv')
+            )
+            self.assertTrue(response.streaming)
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Project,Day,Title,Start Time,End Time,Duration (HH:MM:SS),Entries')
+        self.assertIn(',,Subtotal,,,06:00:00,3', [line.replace('Alpha', '') for line in lines])
+        self.assertEqual(lines[-1], ',,Total,,,11:00:00,5')
+        self.assertEqual(len(lines), 1 + 5 + 3 + 1)
+
+    def test_pdf_export_renders_the_groups(self):
+        response = self.client.get(reverse('reports:reports'), dict(self.params, group_by='project,day', export='pdf'))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+    def test_preview_lists_group_subtotals(self):
+        response = self.client.get(reverse('reports:reports'), dict(self.params, group_by='day'))
+        self.assertEqual([row.entry_count for row in response.context['group_rows']], [2, 2, 1])
+
+    def test_invalid_group_by_is_a_form_error(self):
+        response = self.client.get(reverse('reports:reports'), dict(self.params, group_by='week'))
+        self.assertIn('group_by', response.context['form'].errors)
+
+
+class TranslateTextTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.translator = Mock()
+        self.translator.translate.side_effect = lambda text, dest, src: Mock(text=f'{dest}:{text}')
+
+    def test_repeated_text_is_translated_once(self):
+        self.assertEqual(translate_text(self.translator, 'Project', 'sv'), 'sv:Project')
+        self.assertEqual(translate_text(self.translator, 'Project', 'sv'), 'sv:Project')
+        self.translator.translate.assert_called_once_with('Project', dest='sv', src='auto')
+
+    def test_cache_is_keyed_by_text_and_languages(self):
+        translate_text(self.translator, 'Project', 'sv')
+        self.assertEqual(translate_text(self.translator, 'Project', 'de'), 'de:Project')
+        self.assertEqual(translate_text(self.translator, 'Details', 'sv'), 'sv:Details')
+        translate_text(self.translator, 'Project', 'sv', src='en')
+        self.assertEqual(self.translator.translate.call_count, 4)
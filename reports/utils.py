@@ -1,9 +1,15 @@
+import hashlib
 from io import BytesIO
+from django.core.cache import cache
 from django.http import HttpResponse
 from django.template.loader import get_template
 from xhtml2pdf import pisa
 from django.conf import settings
 from django.contrib.staticfiles import finders
+from instrumentation.metrics import TRANSLATION_CACHE
+
+# Report labels and entry texts rarely change; keep their translations a month
+TRANSLATION_CACHE_TIMEOUT = 60 * 60 * 24 * 30
 
 def link_callback(uri, rel):
     """
@@ -30,3 +36,15 @@ def render_to_pdf(template_src, context_dict={}):
     if not pdf.err:
         return HttpResponse(result.getvalue(), content_type='application/pdf')
     return None
+
+def translate_text(translator, text, dest, src='auto'):
+    """Translates text through the cache, so repeated labels skip the network call."""
+    key = 'translation:' + hashlib.sha256(f'{src}:{dest}:{text}'.encode()).hexdigest()
+    translated = cache.get(key)
+    if translated is not None:
+        TRANSLATION_CACHE.labels('hit').inc()
+        return translated
+    TRANSLATION_CACHE.labels('miss').inc()
+    translated = translator.translate(text, dest=dest, src=src).text
+    cache.set(key, translated, TRANSLATION_CACHE_TIMEOUT)
+    return translated
@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.views import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
@@ -8,17 +8,112 @@ from django.urls import reverse
 from workspaces.models import TimeEntry, Project
 from .forms import ReportForm
 from django.contrib import messages
-from django.db.models import Sum, F, Min, Max
+from django.db.models import Count, Sum, F, Min, Max
 from django.http import JsonResponse
 from datetime import timedelta, date, datetime, time
 from decimal import Decimal, InvalidOperation
 from collections import defaultdict
 import csv
 from googletrans import Translator, LANGUAGES
-from .utils import render_to_pdf
+from .rollup import ROW_ENTRY, ROW_SUBTOTAL, grouped_report_rows, parse_group_by, rollup_rows
+from .utils import render_to_pdf, translate_text
 from workspaces.mixins import OrganizationPermissionMixin
+from workspaces.pagination import InvalidCursor, KeysetPaginator
+from workspaces.utils import date_range_q, worked_duration_expression
+
+# Entries shown per page in the HTML preview; exports include every entry
+REPORT_PAGE_SIZE = 50
+REPORT_ORDERING = ('-start_time', '-pk')
+
+def _format_hms(duration):
+    total_seconds = int(duration.total_seconds())
+    hours, remainder = divmod(total_seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f'{hours:02}:{minutes:02}:{seconds:02}'
+
+def _report_totals(entries):
+    """
+    Entry count and worked time per project, and over all projects, from a
+    single grouped query.
+    """
+    project_totals = list(
+        entries.order_by().values('project_id', 'project__name').annotate(
+            entry_count=Count('pk'),
+            worked=Sum(worked_duration_expression()),
+        ).order_by('project__name')
+    )
+    for row in project_totals:
+        row['worked'] = row['worked'] or timedelta()
+    return {
+        'project_totals': project_totals,
+        'entry_count': sum(row['entry_count'] for row in project_totals),
+        'total_worked': sum((row['worked'] for row in project_totals), timedelta()),
+    }
+
+class _Echo:
+    """Write-only file object returning what csv.writer writes, for streaming."""
+    def write(self, value):
+        return value
+
+def _grouped_csv_rows(rows, levels):
+    yield ['Project', 'Day', 'Title', 'Start Time', 'End Time', 'Duration (HH:MM:SS)', 'Entries']
+    for row in rows:
+        if row.kind == ROW_ENTRY:
+            entry = row.entry
+            yield [
+                row.project_name or '-',
+                (row.day or timezone.localtime(entry.start_time).date()).isoformat(),
+                entry.title,
+                entry.start_time.strftime('%Y-%m-%d %H:%M:%S'),
+                entry.end_time.strftime('%Y-%m-%d %H:%M:%S'),
+                str(entry.duration),
+                '',
+            ]
+            continue
+        # Subtotals leave the levels they are not keyed on blank
+        keyed = levels[:row.depth]
+        yield [
+            (row.project_name or '-') if 'project' in keyed else '',
+            row.day.isoformat() if 'day' in keyed else '',
+            'Subtotal' if row.kind == ROW_SUBTOTAL else 'Total',
+            '',
+            '',
+            _format_hms(row.worked),
+            row.entry_count,
+        ]
+
+def _grouped_csv_response(entries, levels, start_date, end_date):
+    """Streams the grouped rows as CSV, one chunk of entries in memory at a time."""
+    writer = csv.writer(_Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in _grouped_csv_rows(grouped_report_rows(entries, levels), levels)),
+        content_type='text/csv',
+    )
+    response['Content-Disposition'] = f'attachment; filename="time_report_{start_date}_to_{end_date}.csv"'
+    return response
+
+def _grouped_pdf_response(context, entries, levels, start_date, end_date):
+    # xhtml2pdf lays out the whole document at once; the template consumes
+    # the grouped rows lazily so no list of entries is built on the way
+    pdf_context = dict(context, rows=grouped_report_rows(entries, levels), levels=levels)
+    response = render_to_pdf('reports/report_grouped_pdf.html', pdf_context)
+    if response:
+        response['Content-Disposition'] = f'attachment; filename="report_{start_date}_to_{end_date}.pdf"'
+        return response
+    return HttpResponse('Error generating PDF', status=500)
+
+def _generate_pdf_response(template_name, context, filename):
+    response = render_to_pdf(template_name, context)
+    if response:
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+    return HttpResponse('Error generating PDF', status=500)
 
 class ReportView(LoginRequiredMixin, OrganizationPermissionMixin, View):
+    def get_queryset(self):
+        # TimeEntry has no organization, so entries are scoped to their owner
+        return TimeEntry.objects.filter(user=self.request.user)
+
     def get(self, request, *args, **kwargs):
         form = ReportForm(request.GET or None, user=request.user)
         context = {'form': form, 'entries': None}
@@ -42,8 +137,7 @@ class ReportView(LoginRequiredMixin, OrganizationPermissionMixin, View):
             export_format = request.GET.get('export')
 
             entries = self.get_queryset().filter(
-                start_time__date__gte=start_date,
-                end_time__date__lte=end_date,
+                date_range_q(start_date, end_date, end_field='end_time'),
                 end_time__isnull=False,
                 is_archived=False
             ).select_related('project')
@@ -51,24 +145,18 @@ class ReportView(LoginRequiredMixin, OrganizationPermissionMixin, View):
             if project:
                 entries = entries.filter(project=project)
 
-            # Pre-format durations for the PDF context
-            for entry in entries:
-                if entry.duration:
-                    total_seconds = int(entry.duration.total_seconds())
-                    hours, remainder = divmod(total_seconds, 3600)
-                    minutes, seconds = divmod(remainder, 60)
-                    entry.formatted_duration = f'{hours:02}:{minutes:02}:{seconds:02}'
-
-            total_duration_val = sum([entry.duration for entry in entries if entry.duration], timedelta())
-            
-            total_seconds = int(total_duration_val.total_seconds())
-            hours, remainder = divmod(total_seconds, 3600)
-            minutes, seconds = divmod(remainder, 60)
-            formatted_total_duration = f'{hours:02}:{minutes:02}:{seconds:02}'
+            group_by = form.cleaned_data.get('group_by')
+            if group_by:
+                levels = parse_group_by(group_by)
+                context['group_by'] = group_by
+                if export_format == 'csv':
+                    return _grouped_csv_response(entries, levels, start_date, end_date)
 
+            totals = _report_totals(entries)
+            context.update(totals)
             context.update({
                 'entries': entries,
-                'total_duration': formatted_total_duration,
+                'total_duration': _format_hms(totals['total_worked']),
                 'start_date': start_date,
                 'end_date': end_date,
                 'project': project,
@@ -92,16 +180,40 @@ class ReportView(LoginRequiredMixin, OrganizationPermissionMixin, View):
                     ])
                 return response
             
+            if export_format == 'pdf' and group_by:
+                return _grouped_pdf_response(context, entries, levels, start_date, end_date)
+
             if export_format == 'pdf':
+                # Pre-format durations for the PDF context
+                entries = list(entries)
+                for entry in entries:
+                    if entry.duration:
+                        entry.formatted_duration = _format_hms(entry.duration)
+                context['entries'] = entries
                 return _generate_pdf_response(
-                    'reports/report_untranslated_pdf.html',
+                    'tracker/report_untranslated_pdf.html',
                     context,
                     f"report_{start_date}_to_{end_date}.pdf"
                 )
 
-
-            # Use the already calculated total_duration for the HTML view
-            context['total_duration'] = total_duration_val
+            # The HTML preview shows one keyset page, continued with `after`
+            paginator = KeysetPaginator(entries, REPORT_ORDERING, REPORT_PAGE_SIZE)
+            try:
+                page = paginator.get_page(request.GET.get('after'))
+            except InvalidCursor:
+                raise Http404('Invalid page cursor.')
+            query = request.GET.copy()
+            if 'after' in query:
+                del query['after']
+                context['first_page_query'] = query.urlencode()
+            if page.has_next:
+                query['after'] = page.next_cursor
+                context['next_page_query'] = query.urlencode()
+            context['entries'] = page
+            context['total_duration'] = totals['total_worked']
+            if group_by:
+                # Subtotals only; the entries stay on their keyset pages
+                context['group_rows'] = [row for row in rollup_rows(entries, levels) if row.kind == ROW_SUBTOTAL]
         
         return render(request, 'reports/report_form.html', context)
 
@@ -113,7 +225,7 @@ def _get_translation_context(translator, target_language):
         if not text:
             return default_text if default_text is not None else ""
         try:
-            return translator.translate(text, dest=target_language).text
+            return translate_text(translator, text, target_language)
         except (TypeError, AttributeError):
             return default_text if default_text is not None else text
 
@@ -198,8 +310,7 @@ class TranslateReportView(LoginRequiredMixin, OrganizationPermissionMixin, View)
             return redirect('reports:reports')
 
         entries = self.get_queryset().filter(
-            start_time__date__gte=start_date,
-            end_time__date__lte=end_date,
+            date_range_q(start_date, end_date, end_field='end_time'),
             end_time__isnull=False
         ).select_related('project')
 
@@ -217,7 +328,7 @@ class TranslateReportView(LoginRequiredMixin, OrganizationPermissionMixin, View)
         # Get the English name of the target language and then translate it.
         target_language_english_name = LANGUAGES.get(target_language, target_language).capitalize()
         try:
-            translated_language_name = translator.translate(target_language_english_name, dest=target_language).text
+            translated_language_name = translate_text(translator, target_language_english_name, target_language)
         except (TypeError, AttributeError):
             translated_language_name = target_language_english_name
 
@@ -252,7 +363,7 @@ class TranslateReportView(LoginRequiredMixin, OrganizationPermissionMixin, View)
 
         try:
             translator = Translator()
-            translated_text = translator.translate(text, src=source_language, dest=dest_language).text
+            translated_text = translate_text(translator, text, dest_language, source_language or 'auto')
             return JsonResponse({'text': translated_text})
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
@@ -11,6 +11,36 @@ document.addEventListener('DOMContentLoaded', function() {
         return colors;
     };
 
+    // Target point count for downsampled activity series fetched over AJAX
+    const ACTIVITY_MAX_POINTS = 120;
+    // How often an open dashboard asks for new activity buckets
+    const ACTIVITY_REFRESH_INTERVAL = 5 * 60 * 1000;
+
+    // Builds Chart.js line datasets from the columnar activity payload.
+    // Downsampled series carry an 'x' list of indices into the shared labels.
+    const buildActivityDatasets = (labels, datasets) => {
+        const lineColors = generateColors(datasets.length);
+        return datasets.map((dataset, index) => {
+            const color = lineColors[index];
+            const data = dataset.x
+                ? dataset.x.map((labelIndex, i) => ({ x: labels[labelIndex], y: dataset.data[i] }))
+                : dataset.data;
+            return {
+                label: dataset.label,
+                data: data,
+                fill: false, // Set to false to see individual lines clearly
+                borderColor: color,
+                originalBorderColor: color, // Store the original color
+                backgroundColor: color, // For legend and tooltips
+                borderWidth: 2,
+                originalBorderWidth: 2,
+                tension: 0.1,
+                pointRadius: 2, // Make points smaller
+                pointHoverRadius: 5 // Enlarge points on hover
+            };
+        });
+    };
+
     // 1. Category Doughnut Chart
     try {
         const categoryLabelsEl = document.getElementById('category_chart_labels');
@@ -68,6 +98,75 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // 3. Activity Line Chart
     let activityChart; // Make chart instance accessible
+
+    // Full-resolution series currently on the chart, kept to request delta refreshes
+    const activityState = { labels: [], datasets: [], version: null, head: null };
+
+    const setActivityState = (labels, datasets, data) => {
+        const downsampled = datasets.some(dataset => dataset.x);
+        activityState.labels = downsampled ? [] : labels;
+        activityState.datasets = downsampled ? [] : datasets;
+        // Downsampled series cannot be patched bucket by bucket, so force a full reload next time
+        activityState.version = downsampled ? null : data.version;
+        activityState.head = downsampled ? null : data.head_version;
+    };
+
+    const updateActivityChart = (labels, datasets, resolution) => {
+        activityChart.data.labels = labels;
+        activityChart.data.datasets = buildActivityDatasets(labels, datasets);
+        activityChart.options.scales.y.max = resolution === 'day' ? 24 : undefined;
+        activityChart.update();
+    };
+
+    // Splices a delta response (buckets from `since` onwards) into the stored series
+    const mergeActivityDelta = (data) => {
+        const keepCount = activityState.labels.indexOf(data.activity_chart_labels[0]);
+        if (keepCount < 0) return null;
+        const labels = activityState.labels.slice(0, keepCount).concat(data.activity_chart_labels);
+        const series = new Map(activityState.datasets.map(dataset => [dataset.label, dataset.data.slice(0, keepCount)]));
+        data.activity_chart_datasets.forEach(dataset => {
+            const head = series.get(dataset.label) || new Array(keepCount).fill(0);
+            series.set(dataset.label, head.concat(dataset.data));
+        });
+        // Series without entries in the refreshed buckets are zero there
+        series.forEach(values => {
+            while (values.length < labels.length) values.push(0);
+        });
+        // Drop buckets that slid out of a rolling period
+        const firstIndex = Math.max(labels.indexOf(data.activity_chart_first_label), 0);
+        return {
+            labels: labels.slice(firstIndex),
+            datasets: Array.from(series, ([label, values]) => ({ label: label, data: values.slice(firstIndex) })),
+        };
+    };
+
+    const refreshActivityChart = () => {
+        if (!activityChart || document.hidden) return;
+        const url = new URL(window.location.href);
+        url.searchParams.delete('points');
+        if (activityState.version && activityState.labels.length > 0) {
+            url.searchParams.set('version', activityState.version);
+            url.searchParams.set('since', activityState.labels[activityState.labels.length - 1]);
+            url.searchParams.set('head', activityState.head);
+        }
+        fetch(url.toString(), { headers: { 'X-Requested-With': 'XMLHttpRequest' } })
+        .then(response => (response.status === 304 ? null : response.json()))
+        .then(data => {
+            if (!data) return; // Nothing changed since the last refresh
+            let series = data.delta ? mergeActivityDelta(data) : null;
+            if (!series) {
+                if (data.delta) {
+                    // The stored series no longer lines up; fetch everything again
+                    activityState.version = null;
+                    return refreshActivityChart();
+                }
+                series = { labels: data.activity_chart_labels, datasets: data.activity_chart_datasets };
+            }
+            setActivityState(series.labels, series.datasets, data);
+            updateActivityChart(series.labels, series.datasets, data.activity_chart_resolution);
+        })
+        .catch(error => console.error('Error refreshing activity chart:', error));
+    };
     try {
         const activityLabelsEl = document.getElementById('activity_chart_labels');
         const activityDatasetsEl = document.getElementById('activity_chart_datasets');
@@ -75,24 +174,13 @@ document.addEventListener('DOMContentLoaded', function() {
             const activityLabels = JSON.parse(activityLabelsEl.textContent);
             const activityDatasets = JSON.parse(activityDatasetsEl.textContent);
             
+            const activityResolutionEl = document.getElementById('activity_chart_resolution');
+            const activityResolution = activityResolutionEl ? JSON.parse(activityResolutionEl.textContent) : 'day';
+
             if (activityDatasets && activityDatasets.length > 0) {
-                const lineColors = generateColors(activityDatasets.length);
-                const datasetsForChart = activityDatasets.map((dataset, index) => {
-                    const color = lineColors[index];
-                    return {
-                        label: dataset.label,
-                        data: dataset.data,
-                        fill: false, // Set to false to see individual lines clearly
-                        borderColor: color,
-                        originalBorderColor: color, // Store the original color
-                        backgroundColor: color, // For legend and tooltips
-                        borderWidth: 2,
-                        originalBorderWidth: 2,
-                        tension: 0.1,
-                        pointRadius: 2, // Make points smaller
-                        pointHoverRadius: 5 // Enlarge points on hover
-                    };
-                });
+                activityState.labels = activityLabels;
+                activityState.datasets = activityDatasets;
+                const datasetsForChart = buildActivityDatasets(activityLabels, activityDatasets);
 
                 activityChart = new Chart(document.getElementById('activityLineChart'), {
                     type: 'line',
@@ -106,7 +194,8 @@ document.addEventListener('DOMContentLoaded', function() {
                         scales: { 
                             y: { 
                                 beginAtZero: true,
-                                max: 24,
+                                // A day can hold at most 24 hours; weeks and months are open-ended
+                                max: activityResolution === 'day' ? 24 : undefined,
                                 title: {
                                     display: true,
                                     text: 'Hours'
@@ -165,6 +254,9 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     } catch (e) { console.error("Error rendering activity chart:", e); }
 
+    // Keep long-lived dashboard tabs current; unchanged data costs a 304
+    setInterval(refreshActivityChart, ACTIVITY_REFRESH_INTERVAL);
+
     // AJAX for category filter
     document.querySelectorAll('.category-filter-item').forEach(item => {
         item.addEventListener('click', function(e) {
@@ -173,8 +265,12 @@ document.addEventListener('DOMContentLoaded', function() {
             const category = this.dataset.category;
             const url = new URL(this.href); // Use the href to construct the new URL
 
+            // Ask the server to downsample long series before sending them
+            const requestUrl = new URL(url);
+            requestUrl.searchParams.set('points', ACTIVITY_MAX_POINTS);
+
             // Add a header to signify an AJAX request
-            fetch(url.toString(), {
+            fetch(requestUrl.toString(), {
                 headers: {
                     'X-Requested-With': 'XMLHttpRequest'
                 }
@@ -183,26 +279,8 @@ document.addEventListener('DOMContentLoaded', function() {
             .then(data => {
                 // Update chart data
                 if (activityChart && data.activity_chart_datasets) {
-                    const newDatasets = data.activity_chart_datasets;
-                    const lineColors = generateColors(newDatasets.length);
-                    activityChart.data.labels = data.activity_chart_labels;
-                    activityChart.data.datasets = newDatasets.map((dataset, index) => {
-                        const color = lineColors[index];
-                        return {
-                            label: dataset.label,
-                            data: dataset.data,
-                            fill: false,
-                            borderColor: color,
-                            originalBorderColor: color,
-                            backgroundColor: color,
-                            borderWidth: 2,
-                            originalBorderWidth: 2,
-                            tension: 0.1,
-                            pointRadius: 2,
-                            pointHoverRadius: 5
-                        };
-                    });
-                    activityChart.update();
+                    setActivityState(data.activity_chart_labels, data.activity_chart_datasets, data);
+                    updateActivityChart(data.activity_chart_labels, data.activity_chart_datasets, data.activity_chart_resolution);
                 }
 
                 // Update the URL in the browser
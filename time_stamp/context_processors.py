@@ -1 +1,7 @@
 # Custom context processors for time_stamp project
+from django.conf import settings
+
+
+def version(request):
+    """Exposes the deployed version (the VERSION file) to every template."""
+    return {'APP_VERSION': settings.APP_VERSION}
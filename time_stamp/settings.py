@@ -23,6 +23,9 @@ with open(os.path.join(BASE_DIR, 'VERSION')) as f:
 # Fetch secrets from Google Cloud Secret Manager
 try:
     from google.cloud import secretmanager
+    from instrumentation.tracing import instrument_secret_manager
+    # Time the lookups below; they block every process start
+    instrument_secret_manager()
     # Create the Secret Manager client.
     client = secretmanager.SecretManagerServiceClient()
 
@@ -85,6 +88,7 @@ INSTALLED_APPS = [
     'reports.apps.ReportsConfig',
     'invoicing.apps.InvoicingConfig',
     'subscriptions.apps.SubscriptionsConfig',
+    'instrumentation.apps.InstrumentationConfig',
 
 ]
 
@@ -100,6 +104,11 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'instrumentation.middleware.MetricsMiddleware',
+    'instrumentation.middleware.TracingMiddleware',
+    'instrumentation.middleware.SlowQueryLogMiddleware',
+    'instrumentation.middleware.QueryProfilingMiddleware',
+    'instrumentation.middleware.RequestProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',
@@ -120,6 +129,10 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'time_stamp.context_processors.version',
             ],
+            # The tracker app is retired, but its tags are still used by the templates
+            'libraries': {
+                'tracker_tags': 'tracker.templatetags.tracker_tags',
+            },
         },
     },
 ]
@@ -253,6 +266,36 @@ ACCOUNT_FORMS = {
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# Request profiling (query count, SQL and template time as Server-Timing headers
+# and a JSON log line). Off by default: set QUERY_PROFILING_STAFF=True to profile
+# requests of staff users, or QUERY_PROFILING=True to profile every request.
+QUERY_PROFILING_ENABLED = os.environ.get('QUERY_PROFILING', 'False') == 'True'
+QUERY_PROFILING_STAFF = os.environ.get('QUERY_PROFILING_STAFF', 'False') == 'True'
+# With REQUEST_PROFILER=True, staff can run a single request under cProfile with
+# ?_profile=1 or an "X-Profile: 1" header; the results are listed under Request
+# profiles in the admin. Off by default.
+REQUEST_PROFILER_ENABLED = os.environ.get('REQUEST_PROFILER', 'False') == 'True'
+# Spans of outbound calls (googletrans, Stripe, Secret Manager, PDF rendering)
+TRACING_EXPORTERS = ['instrumentation.tracing.LogExporter', 'instrumentation.metrics.MetricsExporter']
+# Bearer token Prometheus must send to scrape /metrics. Without one, only
+# staff users (or anyone, with DEBUG on) can read the endpoint.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# With SLOW_QUERY_LOG=True, statements slower than this are logged and, for a
+# SLOW_QUERY_LOG_SAMPLE_RATE fraction of requests, kept with their EXPLAIN plan
+# under Slow queries in the admin (most recent SLOW_QUERY_LOG_MAX_ROWS only).
+# Off by default.
+SLOW_QUERY_LOG_ENABLED = os.environ.get('SLOW_QUERY_LOG', 'False') == 'True'
+SLOW_QUERY_THRESHOLD_MS = int(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '100'))
+SLOW_QUERY_LOG_SAMPLE_RATE = float(os.environ.get('SLOW_QUERY_LOG_SAMPLE_RATE', '0.1'))
+SLOW_QUERY_LOG_MAX_ROWS = 500
+# Keep the example parameter values, not just their types (they may hold personal data)
+SLOW_QUERY_LOG_PARAMS = os.environ.get('SLOW_QUERY_LOG_PARAMS', 'False') == 'True'
+# Incremental sync (/api/sync/time-entries/): cursors lag the export start so
+# late commits are not skipped, and deletions are kept this long for clients
+# (purge older ones with the purge_sync_tombstones command)
+SYNC_CURSOR_OVERLAP_SECONDS = 300
+SYNC_TOMBSTONE_RETENTION_DAYS = 90
+
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY', 'pk_test_dummy')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', 'sk_test_dummy')
 STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', 'whsec_dummy')
\ No newline at end of file
@@ -3,9 +3,11 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from users.views import CustomLoginView
+from instrumentation.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
 
     # Override the default allauth login URL with our custom view.
     # This MUST come BEFORE the include('allauth.urls') line.
@@ -1,9 +1,48 @@
 from allauth.socialaccount.adapter import DefaultSocialAccountAdapter
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 import re
 
 User = get_user_model()
 
+# Attempts at saving a new social user before giving up on username races
+MAX_USERNAME_ATTEMPTS = 5
+
+def username_base_from_social_data(extra_data):
+    """Builds the lower-case alphanumeric username stem from social account data."""
+    email = extra_data.get('email')
+    if email:
+        # Take the part of the email before the "@"
+        username_base = email.split('@')[0].lower()
+    else:
+        # Fallback to first/last name if email is not available
+        first_name = extra_data.get('given_name', '')
+        last_name = extra_data.get('family_name', '')
+        username_base = f"{first_name}{last_name}".lower()
+    # Remove any characters that are not letters or numbers
+    username_base = re.sub(r'[^a-z0-9]', '', username_base)
+    # Ensure the username is not empty
+    return username_base or "user"
+
+def next_free_username(username_base):
+    """
+    Returns username_base, or username_base followed by the smallest free
+    numeric suffix (1, 2, ...), using a single prefix query.
+    """
+    suffix_pattern = re.compile(rf'^{re.escape(username_base)}([1-9][0-9]*)?$', re.IGNORECASE)
+    taken = set()
+    for username in User.objects.filter(username__istartswith=username_base).values_list('username', flat=True):
+        match = suffix_pattern.match(username)
+        if match:
+            taken.add(int(match.group(1) or 0))
+
+    if 0 not in taken:
+        return username_base
+    suffix = 1
+    while suffix in taken:
+        suffix += 1
+    return f"{username_base}{suffix}"
+
 class CustomSocialAccountAdapter(DefaultSocialAccountAdapter):
     def pre_social_login(self, request, sociallogin):
         """
@@ -12,38 +51,33 @@ class CustomSocialAccountAdapter(DefaultSocialAccountAdapter):
         This is our chance to pre-fill user data for new users.
         """
         user = sociallogin.user
-        
+
         # If the user is new (has no primary key), generate a unique username
         if not user.pk:
-            # Try to generate a base username from email
-            email = sociallogin.account.extra_data.get('email')
-            if email:
-                # Take the part of the email before the "@"
-                username_base = email.split('@')[0].lower()
-                # Remove any characters that are not letters or numbers
-                username_base = re.sub(r'[^a-z0-9]', '', username_base)
-            else:
-                # Fallback to first/last name if email is not available
-                first_name = sociallogin.account.extra_data.get('given_name', '')
-                last_name = sociallogin.account.extra_data.get('family_name', '')
-                username_base = f"{first_name}{last_name}".lower()
-                username_base = re.sub(r'[^a-z0-9]', '', username_base)
-
-            # Ensure the username is not empty
-            if not username_base:
-                username_base = "user"
-
-            # Check for uniqueness and append a number if needed
-            username = username_base
-            i = 1
-            while User.objects.filter(username=username).exists():
-                username = f"{username_base}{i}"
-                i += 1
-            
-            user.username = username
+            user.username = next_free_username(username_base_from_social_data(sociallogin.account.extra_data))
 
             # Populate first and last name from social account data if they are empty
             if not user.first_name:
                 user.first_name = sociallogin.account.extra_data.get('given_name', '')
             if not user.last_name:
                 user.last_name = sociallogin.account.extra_data.get('family_name', '')
+
+    def save_user(self, request, sociallogin, form=None):
+        """
+        Saves the new user, picking the next free username again when a
+        concurrent sign-up took the generated one in the meantime.
+        """
+        user = sociallogin.user
+        for attempt in range(MAX_USERNAME_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    return super().save_user(request, sociallogin, form)
+            except IntegrityError:
+                # Only retry usernames we generated, and only username clashes
+                if form is not None or attempt == MAX_USERNAME_ATTEMPTS - 1:
+                    raise
+                if not User.objects.filter(username=user.username).exists():
+                    raise
+                user.pk = None
+                user._state.adding = True
+                user.username = next_free_username(username_base_from_social_data(sociallogin.account.extra_data))
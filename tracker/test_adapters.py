@@ -0,0 +1,40 @@
+from unittest.mock import MagicMock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from .adapters import CustomSocialAccountAdapter, next_free_username
+
+
+class UniqueUsernameTest(TestCase):
+    def setUp(self):
+        self.adapter = CustomSocialAccountAdapter()
+
+    def _sociallogin(self, email):
+        user = get_user_model()(email=email)
+        sociallogin = MagicMock()
+        sociallogin.user = user
+        sociallogin.account.extra_data = {'email': email}
+        sociallogin.save.side_effect = lambda request: user.save()
+        return sociallogin
+
+    def test_next_free_suffix_found_with_one_query(self):
+        for username in ['john', 'john1', 'john2', 'john4', 'johnny', 'john05', 'JOHN3x']:
+            get_user_model().objects.create_user(username=username, password='password')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(next_free_username('john'), 'john3')
+        with self.assertNumQueries(1):
+            self.assertEqual(next_free_username('jane'), 'jane')
+
+    def test_save_user_retries_when_username_taken_concurrently(self):
+        sociallogin = self._sociallogin('race@example.com')
+        self.adapter.pre_social_login(request=None, sociallogin=sociallogin)
+        self.assertEqual(sociallogin.user.username, 'race')
+
+        # Another sign-up grabs the same username before this one is saved
+        get_user_model().objects.create_user(username='race', password='password')
+        user = self.adapter.save_user(request=None, sociallogin=sociallogin)
+
+        self.assertIsNotNone(user.pk)
+        self.assertEqual(user.username, 'race1')
@@ -1,5 +1,6 @@
-from django.contrib import admin
-from .models import CustomUser, Organization, Membership
+from django.contrib import admin, messages
+from django.utils import timezone
+from .models import ApiToken, CustomUser, Organization, Membership
 
 class MembershipInline(admin.TabularInline):
     model = Membership
@@ -19,3 +20,22 @@ class OrganizationAdmin(admin.ModelAdmin):
 class MembershipAdmin(admin.ModelAdmin):
     list_display = ('user', 'organization', 'role')
     list_filter = ('organization', 'role')
+
+@admin.register(ApiToken)
+class ApiTokenAdmin(admin.ModelAdmin):
+    list_display = ('name', 'prefix', 'organization', 'created_at', 'last_used_at', 'revoked_at')
+    list_filter = ('organization',)
+    fields = ('organization', 'name', 'prefix', 'created_at', 'last_used_at', 'revoked_at')
+    readonly_fields = ('prefix', 'created_at', 'last_used_at', 'revoked_at')
+    actions = ('revoke',)
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            key = obj.set_new_key()
+            messages.warning(request, f"API key for {obj.name}: {key} (copy it now, it is not shown again)")
+        super().save_model(request, obj, form, change)
+
+    @admin.action(description='Revoke selected tokens')
+    def revoke(self, request, queryset):
+        revoked = queryset.filter(revoked_at__isnull=True).update(revoked_at=timezone.now())
+        messages.success(request, f"Revoked {revoked} token(s).")
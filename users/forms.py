@@ -1,4 +1,10 @@
+import csv
+import io
+import re
+
 from django import forms
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
 from django.contrib.auth.forms import UserChangeForm
 from .models import CustomUser, Invitation, Membership
 from allauth.account.forms import SignupForm
@@ -42,3 +48,71 @@ class InvitationForm(forms.ModelForm):
             'email': forms.EmailInput(attrs={'class': 'form-control'}),
             'role': forms.Select(attrs={'class': 'form-select'}),
         }
+
+class BulkInvitationForm(forms.Form):
+    """
+    Invites many people at once from a pasted list and/or an uploaded CSV.
+
+    cleaned_data['emails'] holds the valid addresses, lower-cased and without
+    duplicates, in input order; cleaned_data['invalid_emails'] the rejected
+    entries.
+    """
+    MAX_INVITATIONS = 500
+
+    emails = forms.CharField(
+        required=False,
+        label='Email addresses',
+        help_text='Separate addresses with commas, semicolons, spaces or new lines.',
+        widget=forms.Textarea(attrs={'class': 'form-control', 'rows': 6}),
+    )
+    csv_file = forms.FileField(
+        required=False,
+        label='CSV file',
+        help_text='Uses the "email" column if there is one, otherwise every cell containing an address.',
+        widget=forms.ClearableFileInput(attrs={'class': 'form-control', 'accept': '.csv,text/csv'}),
+    )
+    role = forms.ChoiceField(
+        choices=Membership.Role.choices,
+        initial=Membership.Role.MEMBER,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+
+    def _csv_candidates(self, csv_file):
+        try:
+            text = csv_file.read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise ValidationError('The CSV file must be UTF-8 encoded.')
+        rows = list(csv.reader(io.StringIO(text)))
+        if not rows:
+            return []
+        header = [cell.strip().lower() for cell in rows[0]]
+        if 'email' in header:
+            column = header.index('email')
+            return [row[column] for row in rows[1:] if len(row) > column]
+        return [cell for row in rows for cell in row if '@' in cell]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        candidates = re.split(r'[\s,;]+', cleaned_data.get('emails') or '')
+        if cleaned_data.get('csv_file'):
+            candidates += self._csv_candidates(cleaned_data['csv_file'])
+
+        emails, invalid_emails = {}, []
+        for candidate in candidates:
+            candidate = candidate.strip()
+            if not candidate:
+                continue
+            try:
+                validate_email(candidate)
+            except ValidationError:
+                invalid_emails.append(candidate)
+                continue
+            emails.setdefault(candidate.lower(), None)
+
+        if not emails and not invalid_emails:
+            raise ValidationError('Enter at least one email address or upload a CSV file.')
+        if len(emails) > self.MAX_INVITATIONS:
+            raise ValidationError(f'At most {self.MAX_INVITATIONS} people can be invited at once.')
+        cleaned_data['emails'] = list(emails)
+        cleaned_data['invalid_emails'] = invalid_emails
+        return cleaned_data
@@ -0,0 +1,97 @@
+"""
+Bulk invitations.
+
+Deduplication against existing invitations and members is a single query
+and the invitations are bulk-created, flagged as email_pending. The
+send_invitations command then emails them outside the web request, in
+batches over one mail connection instead of one SMTP session per address.
+An invitation stays pending until the backend accepted its batch in full.
+"""
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models.functions import Lower
+from django.urls import reverse
+
+from .models import Invitation, Membership
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 100
+
+INVITATION_SUBJECT = 'You have been invited to join an organization'
+
+
+def existing_invitees(organization, emails):
+    """Lower-cased addresses among `emails` already invited to or member of the organization."""
+    invited = (
+        Invitation.objects.filter(organization=organization)
+        .annotate(normalized_email=Lower('email'))
+        .filter(normalized_email__in=emails)
+        .values_list('normalized_email', flat=True)
+    )
+    members = (
+        Membership.objects.filter(organization=organization)
+        .annotate(normalized_email=Lower('user__email'))
+        .filter(normalized_email__in=emails)
+        .values_list('normalized_email', flat=True)
+    )
+    return set(invited.union(members))
+
+
+def create_invitations(request, organization, emails, role):
+    """
+    Bulk-creates pending invitations for the addresses that are neither
+    invited nor members yet. Returns (invitations, skipped_emails).
+    """
+    skipped = existing_invitees(organization, emails)
+    invitations = []
+    for email in emails:
+        if email in skipped:
+            continue
+        invitation = Invitation(email=email, organization=organization, role=role, email_pending=True)
+        # The link is built here, where the request knows the site's address
+        invitation.accept_url = request.build_absolute_uri(reverse('users:accept_invitation', args=[invitation.token]))
+        invitations.append(invitation)
+    return Invitation.objects.bulk_create(invitations), [email for email in emails if email in skipped]
+
+
+def invitation_message(invitation, invitation_link, connection=None):
+    return EmailMessage(
+        subject=INVITATION_SUBJECT,
+        body=f'Click the link to accept the invitation: {invitation_link}',
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[invitation.email],
+        connection=connection,
+    )
+
+
+def send_pending_invitations(batch_size=DEFAULT_BATCH_SIZE, connection=None):
+    """
+    Emails the pending invitations over one mail connection and returns how
+    many were sent. A batch the backend only partly accepted stays pending,
+    to be retried next run, since send_messages() does not say which failed.
+    """
+    pending = Invitation.objects.filter(email_pending=True).order_by('pk')
+    connection = connection or get_connection()
+
+    sent = 0
+    last_pk = 0
+    with connection:
+        while True:
+            batch = list(pending.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            messages = [invitation_message(invitation, invitation.accept_url, connection) for invitation in batch]
+            accepted = connection.send_messages(messages) or 0
+            if accepted < len(messages):
+                logger.warning(
+                    'Mail backend accepted %d of %d invitations; leaving invitations %s pending.',
+                    accepted, len(messages), ', '.join(str(invitation.pk) for invitation in batch),
+                )
+                continue
+            Invitation.objects.filter(pk__in=[invitation.pk for invitation in batch]).update(email_pending=False)
+            sent += len(batch)
+    return sent
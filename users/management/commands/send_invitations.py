@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.invitations import DEFAULT_BATCH_SIZE, send_pending_invitations
+
+
+class Command(BaseCommand):
+    help = 'Emails pending bulk invitations. Run it from the scheduler; safe to rerun.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Messages sent per batch.')
+
+    def handle(self, *args, **options):
+        sent = send_pending_invitations(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} invitation(s)."))
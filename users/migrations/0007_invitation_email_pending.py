@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-19 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_apitoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invitation',
+            name='accept_url',
+            field=models.URLField(blank=True, max_length=500),
+        ),
+        migrations.AddField(
+            model_name='invitation',
+            name='email_pending',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -1,3 +1,4 @@
+import hashlib
 import uuid
 import secrets
 from django.db import models
@@ -50,6 +51,54 @@ class Invitation(models.Model):
     role = models.CharField(max_length=10, choices=Membership.Role.choices, default=Membership.Role.MEMBER)
     token = models.CharField(max_length=64, default=create_token, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bulk invitations are emailed by the send_invitations command, which
+    # clears the flag once the mail backend accepted the message
+    email_pending = models.BooleanField(default=False, db_index=True)
+    accept_url = models.URLField(max_length=500, blank=True)
 
     def __str__(self):
         return f"Invitation for {self.email} to join {self.organization.name}"
+
+def hash_api_key(key):
+    return hashlib.sha256(key.encode()).hexdigest()
+
+class ApiToken(models.Model):
+    """
+    Bearer token giving a machine client, such as a nightly BI job, read
+    access to an organization's data. Only a hash of the key is stored;
+    the key itself is shown once, when the token is created.
+    """
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='api_tokens')
+    name = models.CharField(max_length=100)
+    key_hash = models.CharField(max_length=64, unique=True, editable=False)
+    # First characters of the key, to tell tokens apart
+    prefix = models.CharField(max_length=8, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(null=True, blank=True)
+    revoked_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.prefix}...)"
+
+    def set_new_key(self):
+        """Generates the key of an unsaved token and returns it."""
+        key = secrets.token_urlsafe(32)
+        self.key_hash, self.prefix = hash_api_key(key), key[:8]
+        return key
+
+    @classmethod
+    def create_for(cls, organization, name):
+        """Creates a token and returns it with its key."""
+        token = cls(organization=organization, name=name)
+        key = token.set_new_key()
+        token.save()
+        return token, key
+
+    @classmethod
+    def authenticate(cls, key):
+        """The active token with this key, or None."""
+        if not key:
+            return None
+        return cls.objects.select_related('organization').filter(
+            key_hash=hash_api_key(key), revoked_at__isnull=True
+        ).first()
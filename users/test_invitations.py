@@ -0,0 +1,111 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import get_connection
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .invitations import send_pending_invitations
+from .models import Invitation, Membership, Organization
+
+
+class ShortEmailBackend(LocmemEmailBackend):
+    """Locmem backend dropping the first message of each call, as when a recipient is refused."""
+
+    def send_messages(self, messages):
+        return super().send_messages(messages[1:])
+
+
+class BulkInvitationTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.organization = Organization.objects.create(name='Test Organization')
+        Membership.objects.create(user=self.user, organization=self.organization, role=Membership.Role.ADMIN)
+        self.client.login(username='testuser', password='testpassword')
+        self.url = reverse('users:bulk_send_invitation')
+
+    def test_pasted_list_is_deduplicated_against_invitations_and_members(self):
+        member = get_user_model().objects.create_user(username='member', password='pw', email='Member@Example.com')
+        Membership.objects.create(user=member, organization=self.organization)
+        Invitation.objects.create(email='Invited@example.com', organization=self.organization)
+
+        response = self.client.post(self.url, {
+            'emails': 'new@example.com, NEW@example.com; invited@example.com\nmember@example.com not-an-email',
+            'role': Membership.Role.MANAGER,
+        })
+
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        new_invitation = Invitation.objects.get(email='new@example.com')
+        self.assertEqual(new_invitation.role, Membership.Role.MANAGER)
+        self.assertEqual(Invitation.objects.filter(organization=self.organization).count(), 2)
+        self.assertEqual(len(mail.outbox), 0)
+
+        call_command('send_invitations', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(f'http://testserver/users/accept-invitation/{new_invitation.token}/', mail.outbox[0].body)
+        new_invitation.refresh_from_db()
+        self.assertFalse(new_invitation.email_pending)
+
+    def test_csv_import_queues_the_invitations_in_constant_queries(self):
+        rows = ['name,email'] + [f'Person {index},person{index}@example.com' for index in range(50)]
+        csv_file = SimpleUploadedFile('team.csv', '\n'.join(rows).encode(), content_type='text/csv')
+
+        expected_queries = self._bulk_queries()
+
+        with self.assertNumQueries(expected_queries):
+            self.client.post(self.url, {'csv_file': csv_file, 'role': Membership.Role.MEMBER})
+
+        self.assertEqual(Invitation.objects.filter(email_pending=True).count(), 50)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def _bulk_queries(self):
+        # Session and user, organization and membership checks, then one
+        # dedupe query and one bulk insert, independent of the list size
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(self.url, {'emails': 'warmup@example.com', 'role': Membership.Role.MEMBER})
+        Invitation.objects.all().delete()
+        return len(queries)
+
+    def test_pending_invitations_are_sent_over_one_connection(self):
+        self.client.post(self.url, {
+            'emails': ' '.join(f'person{index}@example.com' for index in range(7)), 'role': Membership.Role.MEMBER,
+        })
+        Invitation.objects.create(email='single@example.com', organization=self.organization)
+
+        out = StringIO()
+        with patch('users.invitations.get_connection', wraps=get_connection) as connection_factory:
+            call_command('send_invitations', batch_size=3, stdout=out)
+
+        self.assertIn('Sent 7 invitation(s).', out.getvalue())
+        self.assertEqual(connection_factory.call_count, 1)
+        self.assertEqual(len(mail.outbox), 7)
+        self.assertFalse(Invitation.objects.filter(email_pending=True).exists())
+
+        call_command('send_invitations', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 7)
+
+    def test_partly_sent_batch_stays_pending(self):
+        self.client.post(self.url, {'emails': 'a@example.com b@example.com c@example.com', 'role': Membership.Role.MEMBER})
+
+        with self.assertLogs('users.invitations', 'WARNING'):
+            sent = send_pending_invitations(batch_size=2, connection=ShortEmailBackend())
+
+        self.assertEqual(sent, 0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(Invitation.objects.filter(email_pending=True).count(), 3)
+
+        self.assertEqual(send_pending_invitations(), 3)
+        self.assertFalse(Invitation.objects.filter(email_pending=True).exists())
+
+    def test_requires_admin_or_manager(self):
+        Membership.objects.filter(user=self.user).update(role=Membership.Role.MEMBER)
+        response = self.client.post(self.url, {'emails': 'new@example.com', 'role': Membership.Role.MEMBER})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Invitation.objects.exists())
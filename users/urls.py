@@ -5,5 +5,6 @@ app_name = 'users'
 
 urlpatterns = [
     path('send-invitation/', views.send_invitation, name='send_invitation'),
+    path('send-invitation/bulk/', views.bulk_send_invitation, name='bulk_send_invitation'),
     path('accept-invitation/<str:token>/', views.accept_invitation, name='accept_invitation'),
 ]
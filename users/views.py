@@ -2,7 +2,8 @@ from django.shortcuts import render, redirect, get_object_or_404
 from allauth.account.views import LoginView as AllauthLoginView
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
-from .forms import InvitationForm
+from .forms import BulkInvitationForm, InvitationForm
+from .invitations import create_invitations
 from .models import Invitation, Membership
 from django.contrib import messages
 from .decorators import role_required
@@ -58,6 +59,29 @@ def send_invitation(request):
     
     return render(request, 'users/send_invitation.html', {'form': form})
 
+@login_required
+@role_required(['ADMIN', 'MANAGER'])
+def bulk_send_invitation(request):
+    if request.method == 'POST':
+        form = BulkInvitationForm(request.POST, request.FILES)
+        if form.is_valid():
+            organization = request.user.organizations.first()
+            invitations, skipped = create_invitations(
+                request, organization, form.cleaned_data['emails'], form.cleaned_data['role']
+            )
+            if invitations:
+                messages.success(request, f'Queued {len(invitations)} invitation(s); the emails go out shortly.')
+            if skipped:
+                messages.info(request, f'Skipped {len(skipped)} already invited or existing member(s).')
+            invalid_emails = form.cleaned_data['invalid_emails']
+            if invalid_emails:
+                messages.warning(request, f"Ignored invalid address(es): {', '.join(invalid_emails)}")
+            return redirect('users:bulk_send_invitation')
+    else:
+        form = BulkInvitationForm()
+
+    return render(request, 'users/bulk_send_invitation.html', {'form': form})
+
 def accept_invitation(request, token):
     invitation = get_object_or_404(Invitation, token=token)
     if request.user.is_authenticated:
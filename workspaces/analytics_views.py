@@ -8,15 +8,21 @@ from django.urls import reverse
 from workspaces.models import TimeEntry, Project
 from reports.forms import ReportForm
 from django.contrib import messages
-from django.db.models import Sum, F, Min, Max
-from django.http import JsonResponse
+from django.db.models import Sum, F, Min, Max, Count
+from django.db.models.functions import TruncDate
+from django.http import JsonResponse, HttpResponseNotModified
 from datetime import timedelta, date, datetime, time
-from decimal import Decimal, InvalidOperation
+from decimal import Decimal
 from collections import defaultdict
 import csv
+import hashlib
 from googletrans import Translator, LANGUAGES
 from tracker.utils import render_to_pdf
+from .forms import IncomeCalculatorForm
 from .mixins import OrganizationPermissionMixin
+from .utils import date_range_q, local_date_bounds, worked_duration_expression
+from .earnings import compute_earnings, income_rate_grid
+from .bucketing import project_activity_matrix, choose_resolution, local_bucket_edges, lttb_indices, NO_PROJECT_ID
 
 # --- Report and Translation Views ---
 
@@ -64,14 +70,187 @@ def _calculate_summary_data(user, start_date):
     personal_duration = timedelta()
 
     # Calculate total earnings only from projects with an hourly rate > 0
-    earnings_entries = summary_qs.filter(project__hourly_rate__gt=0)
-    total_earnings = sum(
-        (entry.duration.total_seconds() / 3600) * float(entry.project.hourly_rate)
-        for entry in earnings_entries
-    )
+    total_earnings = sum(earnings for _, earnings in _project_earnings(summary_qs))
 
     return work_duration, personal_duration, total_earnings
 
+def _project_earnings(summary_qs):
+    """(project name, earnings) of the billable projects, from one grouped query."""
+    rows = summary_qs.filter(project__hourly_rate__gt=0).order_by().values(
+        'project_id', 'project__name', 'project__hourly_rate'
+    ).annotate(worked=Sum(worked_duration_expression())).order_by('project__name', 'project_id')
+    return [
+        (row['project__name'], (row['worked'].total_seconds() / 3600) * float(row['project__hourly_rate']))
+        for row in rows
+    ]
+
+def _get_doughnut_chart_data(summary_qs):
+    """Hours per project contact (client or category); entries without one are 'Uncategorized'."""
+    rows = summary_qs.order_by().values('project__contact__name').annotate(
+        worked=Sum(worked_duration_expression())
+    ).order_by('project__contact__name')
+    labels = [row['project__contact__name'] or 'Uncategorized' for row in rows]
+    data = [round(row['worked'].total_seconds() / 3600, 2) for row in rows]
+    return labels, data
+
+def _get_bar_chart_data(summary_qs):
+    earnings = _project_earnings(summary_qs)
+    return [name for name, _ in earnings], [round(amount, 2) for _, amount in earnings]
+
+# Upper bound for the optional LTTB downsampling of activity series
+ACTIVITY_MAX_POINTS = 1000
+
+def _get_activity_points(request):
+    """Reads the optional `points` downsampling target from the query string."""
+    try:
+        points = int(request.GET.get('points', 0))
+    except (TypeError, ValueError):
+        return None
+    if points < 3:
+        return None
+    return min(points, ACTIVITY_MAX_POINTS)
+
+def _get_activity_datasets(time_entries_qs, start_date, end_date, resolution, max_points=None):
+    """Buckets the entries and returns (labels, datasets) for the activity chart."""
+    labels, project_ids, hours = project_activity_matrix(time_entries_qs, start_date, end_date, resolution)
+
+    project_names = dict(
+        Project.objects.filter(pk__in=project_ids).values_list('pk', 'name')
+    )
+    datasets = []
+    for project_id, row in zip(project_ids, hours.round(2).tolist()):
+        if project_id == NO_PROJECT_ID:
+            label = 'No Project'
+        else:
+            label = project_names.get(project_id, 'Unknown Project')
+        dataset = {'label': label, 'data': row}
+        if max_points and max_points < len(row):
+            indices = lttb_indices(row, max_points).tolist()
+            dataset['x'] = indices
+            dataset['data'] = [row[i] for i in indices]
+        datasets.append(dataset)
+
+    return labels, datasets
+
+def _calculate_activity_by_project(time_entries_qs, start_date, period, user, max_points=None):
+    """
+    Returns chart labels, one dataset of worked hours per project and the
+    bucket resolution ('day', 'week' or 'month') chosen for the period length.
+
+    When max_points is given, each series is downsampled with LTTB and its
+    dataset carries an 'x' list of indices into the shared labels.
+    """
+    end_date = timezone.now()
+    if start_date is None:
+        start_date = time_entries_qs.aggregate(first=Min('start_time'))['first']
+        if start_date is None:
+            return [], [], choose_resolution(end_date, end_date)
+
+    resolution = choose_resolution(start_date, end_date)
+    labels, datasets = _get_activity_datasets(time_entries_qs, start_date, end_date, resolution, max_points)
+    return labels, datasets, resolution
+
+def _activity_version(time_entries_qs, *parts):
+    """
+    Returns a short fingerprint of the entries feeding the activity chart.
+
+    Every save or queryset update of an entry bumps its updated_at, so the
+    count and latest updated_at per project catch added, edited, moved and
+    removed entries without loading them. The project names are grouped on
+    too, so a rename changes the fingerprint; it all takes one query.
+    """
+    stats = list(
+        time_entries_qs.order_by().values('project_id', 'project__name').annotate(
+            count=Count('id'),
+            last_updated=Max('updated_at'),
+        ).order_by('project_id').values_list('project_id', 'project__name', 'count', 'last_updated')
+    )
+    fingerprint = repr((parts, stats))
+    return hashlib.sha256(fingerprint.encode()).hexdigest()[:16]
+
+def _local_day_start(day):
+    return local_date_bounds(day)[0]
+
+def _activity_head_version(time_entries_qs, label):
+    """Fingerprint of the entries that touch any bucket before `label`."""
+    bucket_start = _local_day_start(date.fromisoformat(label))
+    return _activity_version(time_entries_qs.filter(start_time__lt=bucket_start), label)
+
+def _calculate_activity_delta(time_entries_qs, start_date, since, head_version):
+    """
+    Recomputes only the buckets from `since` onwards.
+
+    Returns None when the client has to reload the whole series instead:
+    `since` is no longer part of the chart window, or an entry touching an
+    earlier bucket changed (its head fingerprint no longer matches).
+    """
+    try:
+        date.fromisoformat(since)
+    except (TypeError, ValueError):
+        return None
+
+    end_date = timezone.now()
+    if start_date is None:
+        start_date = time_entries_qs.aggregate(first=Min('start_time'))['first']
+        if start_date is None:
+            return None
+
+    resolution = choose_resolution(start_date, end_date)
+    edges, labels = local_bucket_edges(start_date, end_date, resolution)
+    if since not in labels or head_version != _activity_head_version(time_entries_qs, since):
+        return None
+
+    since_start = _local_day_start(date.fromisoformat(since))
+    tail_qs = time_entries_qs.filter(end_time__gt=since_start)
+    tail_labels, datasets = _get_activity_datasets(tail_qs, since_start, end_date, resolution)
+    return {
+        'delta': True,
+        'activity_chart_first_label': labels[0],
+        'activity_chart_labels': tail_labels,
+        'activity_chart_datasets': datasets,
+        'activity_chart_resolution': resolution,
+    }
+
+def _activity_json_response(request, time_entries_qs, start_date, period, user):
+    """
+    Answers the dashboard's AJAX activity requests.
+
+    Clients send back the `version` they hold and get a 304 when nothing
+    changed. With `since` (their last bucket label) and `head` (the
+    head_version they received) only the buckets from `since` onwards are
+    recomputed and returned as a delta. Downsampled requests are always full.
+    """
+    max_points = _get_activity_points(request)
+    version = _activity_version(time_entries_qs, period, max_points, timezone.localdate().isoformat())
+    if request.GET.get('version') == version:
+        response = HttpResponseNotModified()
+        response['ETag'] = f'"{version}"'
+        return response
+
+    payload = None
+    since = request.GET.get('since')
+    if since and not max_points:
+        payload = _calculate_activity_delta(time_entries_qs, start_date, since, request.GET.get('head'))
+
+    if payload is None:
+        activity_labels, activity_datasets, activity_resolution = _calculate_activity_by_project(
+            time_entries_qs, start_date, period, user, max_points=max_points
+        )
+        payload = {
+            'delta': False,
+            'activity_chart_labels': activity_labels,
+            'activity_chart_datasets': activity_datasets,
+            'activity_chart_resolution': activity_resolution,
+        }
+
+    labels = payload['activity_chart_labels']
+    payload['version'] = version
+    payload['head_version'] = _activity_head_version(time_entries_qs, labels[-1]) if labels else None
+
+    response = JsonResponse(payload)
+    response['ETag'] = f'"{version}"'
+    return response
+
 def _get_context_data(user, start_date, period, time_entries_qs):
     work_duration, personal_duration, total_earnings = _calculate_summary_data(user, start_date)
     summary_qs = TimeEntry.objects.filter(user=user, end_time__isnull=False)
@@ -79,7 +258,7 @@ def _get_context_data(user, start_date, period, time_entries_qs):
         summary_qs = summary_qs.filter(start_time__gte=start_date)
     category_chart_labels, category_chart_data = _get_doughnut_chart_data(summary_qs)
     earnings_labels, earnings_data = _get_bar_chart_data(summary_qs)
-    activity_labels, activity_datasets = _calculate_activity_by_project(time_entries_qs, start_date, period, user)
+    activity_labels, activity_datasets, activity_resolution = _calculate_activity_by_project(time_entries_qs, start_date, period, user)
 
     context = {
         'work_duration': work_duration,
@@ -95,6 +274,7 @@ def _get_context_data(user, start_date, period, time_entries_qs):
 
         'activity_chart_labels': activity_labels,
         'activity_chart_datasets': activity_datasets,
+        'activity_chart_resolution': activity_resolution,
     }
 
     return context
@@ -108,15 +288,11 @@ class AnalyticsDashboardView(LoginRequiredMixin, OrganizationPermissionMixin, Vi
         start_date, end_date, days_in_period = _get_date_range(period)
 
         # --- Main Queryset ---
-        time_entries_qs = self.get_queryset()
+        time_entries_qs = _get_base_queryset(user, start_date)
 
         # --- AJAX Request Handling ---
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            activity_labels, activity_datasets = _calculate_activity_by_project(time_entries_qs, start_date, period, user)
-            return JsonResponse({
-                'activity_chart_labels': activity_labels,
-                'activity_chart_datasets': activity_datasets,
-            })
+            return _activity_json_response(request, time_entries_qs, start_date, period, user)
 
         # --- Full Page Load Context ---
         context = _get_context_data(user, start_date, period, time_entries_qs)
@@ -147,8 +323,7 @@ class ReportView(LoginRequiredMixin, OrganizationPermissionMixin, View):
             export_format = request.GET.get('export')
 
             entries = self.get_queryset().filter(
-                start_time__date__gte=start_date,
-                end_time__date__lte=end_date,
+                date_range_q(start_date, end_date, end_field='end_time'),
                 end_time__isnull=False,
                 is_archived=False
             ).select_related('project')
@@ -210,6 +385,35 @@ class ReportView(LoginRequiredMixin, OrganizationPermissionMixin, View):
         
         return render(request, 'tracker/report_form.html', context)
 
+def _get_daily_worked_seconds(entries, start_date, end_date):
+    """
+    Returns (labels, seconds) with one point per local calendar day between
+    start_date and end_date, zero for days without work.
+
+    Entries are grouped by the local date of their start time in the active
+    timezone with a single aggregate query; the calendar is generated here so
+    the query never has to produce rows for empty days.
+    """
+    tz = timezone.get_current_timezone()
+    daily_rows = (
+        entries.order_by()
+        .annotate(day=TruncDate('start_time', tzinfo=tz))
+        .values('day')
+        .annotate(worked=Sum(worked_duration_expression()))
+    )
+    seconds_by_day = {
+        row['day']: round(row['worked'].total_seconds())
+        for row in daily_rows
+    }
+
+    labels = []
+    seconds = []
+    for offset in range((end_date - start_date).days + 1):
+        day = start_date + timedelta(days=offset)
+        labels.append(day.strftime('%Y-%m-%d'))
+        seconds.append(seconds_by_day.get(day, 0))
+    return labels, seconds
+
 class DailyEarningsTrackerView(LoginRequiredMixin, OrganizationPermissionMixin, View):
     def get(self, request, *args, **kwargs):
         form = ReportForm(request.GET or None, user=request.user)
@@ -218,13 +422,14 @@ class DailyEarningsTrackerView(LoginRequiredMixin, OrganizationPermissionMixin,
 
         # Set default values for initial page load
         if not request.GET:
-            today = date.today()
+            today = timezone.localdate()
             start_of_month = today.replace(day=1)
             
             # Find the most recent project to pre-select
-            latest_work_entry = self.get_queryset().filter(
+            latest_work_entry = TimeEntry.objects.filter(
+                user=request.user,
                 project__isnull=False
-            ).order_by('-start_time').first()
+            ).select_related('project').order_by('-start_time').first()
             
             initial_data = {
                 'start_date': start_of_month,
@@ -245,54 +450,28 @@ class DailyEarningsTrackerView(LoginRequiredMixin, OrganizationPermissionMixin,
                 project = get_object_or_404(Project, pk=project_id.pk, organization__members=request.user)
 
             if project and project.hourly_rate and start_date and end_date:
-                # --- Swedish Tax Constants ---
-                SOCIAL_FEES_RATE = Decimal('0.2897')
-                MUNICIPAL_TAX_RATE = Decimal('0.32') # Using a common average
-
-                # Make datetimes timezone-aware to prevent warnings
-                start_dt = timezone.make_aware(datetime.combine(start_date, time.min))
-                end_dt = timezone.make_aware(datetime.combine(end_date, time.max))
-
-                entries = self.get_queryset().filter(
+                entries = TimeEntry.objects.filter(
+                    date_range_q(start_date, end_date, end_field='end_time'),
+                    user=request.user,
                     project=project,
-                    start_time__gte=start_dt,
-                    end_time__lt=end_dt,
+                ).annotate(
+                    worked_duration=worked_duration_expression()
                 ).order_by('start_time')
 
                 hourly_rate = Decimal(project.hourly_rate)
 
-                total_worked_duration = timedelta(0)
-                for entry in entries:
-                    duration = (entry.end_time - entry.start_time) - entry.paused_duration
-                    entry.worked_duration = max(duration, timedelta(0))
-                    total_worked_duration += entry.worked_duration
+                # Data for chart, one aggregate query whatever the range length
+                chart_labels, daily_seconds = _get_daily_worked_seconds(entries, start_date, end_date)
+                chart_data = compute_earnings(daily_seconds, hourly_rate, year=end_date.year)['gross']
 
                 # Summary Calculations based on Swedish Sole Trader model
-                total_hours = Decimal(total_worked_duration.total_seconds()) / Decimal(3600)
-                # Round to 2 decimal places for currency
-                gross_pay = (total_hours * hourly_rate).quantize(Decimal('0.01'))
-
-                social_fees_amount = gross_pay * SOCIAL_FEES_RATE
-                taxable_income = gross_pay - social_fees_amount
-                income_tax_amount = taxable_income * MUNICIPAL_TAX_RATE
-                net_pay = taxable_income - income_tax_amount
-
-                # Data for chart
-                daily_earnings = defaultdict(Decimal)
-                # Create a date range for the chart to include days with zero earnings
-                all_days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
-                
-                for day in all_days:
-                    daily_earnings[day.strftime('%Y-%m-%d')] = Decimal(0)
-
-                for entry in entries:
-                    date_key = entry.start_time.strftime('%Y-%m-%d')
-                    worked_hours_entry = Decimal(entry.worked_duration.total_seconds()) / Decimal(3600)
-                    if date_key in daily_earnings:
-                        daily_earnings[date_key] += worked_hours_entry * hourly_rate
-                
-                chart_labels = sorted(daily_earnings.keys())
-                chart_data = [daily_earnings[label] for label in chart_labels]
+                total_seconds = sum(daily_seconds)
+                total_hours = Decimal(total_seconds) / Decimal(3600)
+                summary = compute_earnings([total_seconds], hourly_rate, year=end_date.year)
+                gross_pay = summary['gross'][0]
+                social_fees_amount = summary['social_fees'][0]
+                income_tax_amount = summary['income_tax'][0]
+                net_pay = summary['net'][0]
 
                 context.update({
                     'project': project,
@@ -309,47 +488,6 @@ class DailyEarningsTrackerView(LoginRequiredMixin, OrganizationPermissionMixin,
 
         return render(request, 'tracker/daily_earnings_tracker.html', context)
 
-class IncomeCalculatorView(LoginRequiredMixin, View):
-    def get(self, request, *args, **kwargs):
-        context = {}
-        desired_salary_str = request.GET.get('desired_salary')
-
-        if desired_salary_str:
-            try:
-                # --- Input Data ---
-                desired_salary = Decimal(desired_salary_str)
-                overhead_costs = Decimal(request.GET.get('overhead_costs', '0'))
-                profit_margin_perc = Decimal(request.GET.get('profit_margin', '0'))
-                billable_hours = Decimal(request.GET.get('billable_hours', '1')) # Avoid division by zero
-                municipal_tax_perc = Decimal(request.GET.get('municipal_tax', '0'))
-
-                # --- Constants for Swedish calculations ---
-                SOCIAL_FEES_RATE = Decimal('0.2897')
-                VACATION_PAY_RATE = Decimal('0.12')
-                PENSION_RATE = Decimal('0.045')
-                SICK_LEAVE_BUFFER_RATE = Decimal('0.05')
-                STATE_TAX_THRESHOLD = Decimal('598500') # For 2023/2024, annual income
-                
-                # --- Calculations ---
-                social_fees = desired_salary * SOCIAL_FEES_RATE
-                vacation_pay = desired_salary * VACATION_PAY_RATE
-                pension_savings = desired_salary * PENSION_RATE
-                sick_leave_buffer = desired_salary * SICK_LEAVE_BUFFER_RATE
-
-                total_monthly_cost = (desired_salary + social_fees + vacation_pay + 
-                                      pension_savings + sick_leave_buffer + overhead_costs)
-                
-                profit_amount = total_monthly_cost * (profit_margin_perc / 100)
-                total_to_invoice = total_monthly_cost + profit_amount
-                
-                hourly_rate_to_charge = total_to_invoice / billable_hours if billable_hours > 0 else 0
-
-                # Personal take-home pay calculation
-            except (InvalidOperation, TypeError):
-                # Handle cases where conversion to Decimal fails or inputs are not numbers
-                pass
-        return render(request, 'tracker/income_calculator.html', context)
-
 class TranslateReportView(LoginRequiredMixin, OrganizationPermissionMixin, View):
     def get(self, request, *args, **kwargs):
         start_date = request.GET.get('start_date')
@@ -362,8 +500,7 @@ class TranslateReportView(LoginRequiredMixin, OrganizationPermissionMixin, View)
             return redirect('workspaces:analytics:reports')
 
         entries = self.get_queryset().filter(
-            start_time__date__gte=start_date,
-            end_time__date__lte=end_date,
+            date_range_q(start_date, end_date, end_field='end_time'),
             end_time__isnull=False
         ).select_related('project')
 
@@ -407,42 +544,59 @@ class TranslateReportView(LoginRequiredMixin, OrganizationPermissionMixin, View)
         return render(request, 'tracker/report_translated.html', context)
 
 class IncomeCalculatorView(LoginRequiredMixin, View):
+    # Offsets around the requested salary and hours for the what-if table
+    SALARY_STEPS = (Decimal('-10000'), Decimal('-5000'), Decimal('0'), Decimal('5000'), Decimal('10000'))
+    HOURS_STEPS = (Decimal('-20'), Decimal('0'), Decimal('20'))
+
     def get(self, request, *args, **kwargs):
         context = {}
-        desired_salary_str = request.GET.get('desired_salary')
 
-        if desired_salary_str:
-            try:
+        if request.GET.get('desired_salary'):
+            form = IncomeCalculatorForm(request.GET)
+            context['form'] = form
+            if form.is_valid():
                 # --- Input Data ---
-                desired_salary = Decimal(desired_salary_str)
-                overhead_costs = Decimal(request.GET.get('overhead_costs', '0'))
-                profit_margin_perc = Decimal(request.GET.get('profit_margin', '0'))
-                billable_hours = Decimal(request.GET.get('billable_hours', '1')) # Avoid division by zero
-                municipal_tax_perc = Decimal(request.GET.get('municipal_tax', '0'))
-
-                # --- Constants for Swedish calculations ---
-                SOCIAL_FEES_RATE = Decimal('0.2897')
-                VACATION_PAY_RATE = Decimal('0.12')
-                PENSION_RATE = Decimal('0.045')
-                SICK_LEAVE_BUFFER_RATE = Decimal('0.05')
-                STATE_TAX_THRESHOLD = Decimal('598500') # For 2023/2024, annual income
-                
-                # --- Calculations ---
-                social_fees = desired_salary * SOCIAL_FEES_RATE
-                vacation_pay = desired_salary * VACATION_PAY_RATE
-                pension_savings = desired_salary * PENSION_RATE
-                sick_leave_buffer = desired_salary * SICK_LEAVE_BUFFER_RATE
-
-                total_monthly_cost = (desired_salary + social_fees + vacation_pay + 
-                                      pension_savings + sick_leave_buffer + overhead_costs)
-                
-                profit_amount = total_monthly_cost * (profit_margin_perc / 100)
-                total_to_invoice = total_monthly_cost + profit_amount
-                
-                hourly_rate_to_charge = total_to_invoice / billable_hours if billable_hours > 0 else 0
-
-                # Personal take-home pay calculation
-            except (InvalidOperation, TypeError):
-                # Handle cases where conversion to Decimal fails or inputs are not numbers
-                pass
+                desired_salary = form.cleaned_data['desired_salary']
+                overhead_costs = form.cleaned_data['overhead_costs']
+                profit_margin_perc = form.cleaned_data['profit_margin']
+                billable_hours = form.cleaned_data['billable_hours']
+                municipal_tax_perc = form.cleaned_data['municipal_tax']
+
+                # --- Calculations, requested values plus the what-if sweep in one call ---
+                salaries = [desired_salary] + [desired_salary + step for step in self.SALARY_STEPS if desired_salary + step > 0]
+                hours = [billable_hours] + [billable_hours + step for step in self.HOURS_STEPS if billable_hours + step > 0]
+                try:
+                    grid = income_rate_grid(
+                        salaries, hours,
+                        overhead_costs=overhead_costs,
+                        profit_margin=profit_margin_perc,
+                        municipal_tax=municipal_tax_perc,
+                    )
+                except (OverflowError, ValueError):
+                    form.add_error(None, 'These amounts are too large to calculate.')
+                else:
+                    context.update({
+                        'desired_salary': desired_salary,
+                        'overhead_costs': overhead_costs,
+                        'profit_margin': profit_margin_perc,
+                        'billable_hours': billable_hours,
+                        'municipal_tax': municipal_tax_perc,
+                        'social_fees': grid['social_fees'][0],
+                        'vacation_pay': grid['vacation_pay'][0],
+                        'pension_savings': grid['pension_savings'][0],
+                        'sick_leave_buffer': grid['sick_leave_buffer'][0],
+                        'total_monthly_cost': grid['total_monthly_cost'][0],
+                        'profit_amount': grid['profit_amount'][0],
+                        'total_to_invoice': grid['total_to_invoice'][0],
+                        'hourly_rate_to_charge': grid['hourly_rate'][0][0],
+                        # Personal take-home pay calculation
+                        'total_tax_amount': grid['income_tax'][0],
+                        'net_salary': grid['net_salary'][0],
+                        'state_tax_threshold': grid['state_tax_threshold'],
+                        'what_if_hours': hours[1:],
+                        'what_if_rows': [
+                            {'salary': salary, 'hourly_rates': row[1:]}
+                            for salary, row in zip(salaries[1:], grid['hourly_rate'][1:])
+                        ],
+                    })
         return render(request, 'tracker/income_calculator.html', context)
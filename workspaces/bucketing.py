@@ -0,0 +1,208 @@
+"""
+Vectorised time bucketing for the analytics charts.
+
+Time entries are loaded as flat NumPy arrays (start epoch, end epoch, paused
+seconds, project id) and their worked time is split across local day or week
+boundaries without a Python loop per entry, so long periods such as "1y" or
+"all" stay cheap even with a large history.
+"""
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.utils import timezone
+
+RESOLUTION_DAY = 'day'
+RESOLUTION_WEEK = 'week'
+RESOLUTION_MONTH = 'month'
+
+# Longest span (in days) still charted at each resolution
+DAY_RESOLUTION_MAX_DAYS = 93
+WEEK_RESOLUTION_MAX_DAYS = 731
+
+NO_PROJECT_ID = -1
+
+
+def load_entry_arrays(queryset):
+    """
+    Loads the columns needed for bucketing from a TimeEntry queryset.
+
+    Returns a dict of equally sized arrays: 'start' and 'end' as epoch seconds,
+    'paused' in seconds and 'project' ids (NO_PROJECT_ID for entries without
+    a project). Running entries should be excluded by the caller.
+    """
+    rows = list(queryset.order_by().values_list('start_time', 'end_time', 'paused_duration', 'project_id'))
+    count = len(rows)
+    return {
+        'start': np.fromiter((row[0].timestamp() for row in rows), dtype=np.float64, count=count),
+        'end': np.fromiter((row[1].timestamp() for row in rows), dtype=np.float64, count=count),
+        'paused': np.fromiter((row[2].total_seconds() for row in rows), dtype=np.float64, count=count),
+        'project': np.fromiter(
+            (NO_PROJECT_ID if row[3] is None else row[3] for row in rows), dtype=np.int64, count=count
+        ),
+    }
+
+
+def choose_resolution(start, end):
+    """Picks a bucket size that keeps the number of points per series bounded."""
+    days = (end - start).days
+    if days <= DAY_RESOLUTION_MAX_DAYS:
+        return RESOLUTION_DAY
+    if days <= WEEK_RESOLUTION_MAX_DAYS:
+        return RESOLUTION_WEEK
+    return RESOLUTION_MONTH
+
+
+def _next_bucket_day(day, resolution):
+    if resolution == RESOLUTION_MONTH:
+        if day.month == 12:
+            return day.replace(year=day.year + 1, month=1)
+        return day.replace(month=day.month + 1)
+    if resolution == RESOLUTION_WEEK:
+        return day + timedelta(days=7)
+    return day + timedelta(days=1)
+
+
+def local_bucket_edges(start, end, resolution=RESOLUTION_DAY, tz=None):
+    """
+    Returns (edges, labels) for buckets covering the local dates of start..end.
+
+    Edges are the epoch seconds of each local midnight (one more edge than
+    buckets) so DST changes produce 23h or 25h days. Labels are the ISO dates
+    of the first day in each bucket. Weeks start on Monday and months on the
+    first.
+    """
+    tz = tz or timezone.get_current_timezone()
+    first_day = timezone.localtime(start, tz).date()
+    last_day = timezone.localtime(end, tz).date()
+
+    if resolution == RESOLUTION_WEEK:
+        first_day -= timedelta(days=first_day.weekday())
+    elif resolution == RESOLUTION_MONTH:
+        first_day = first_day.replace(day=1)
+
+    bucket_days = []
+    day = first_day
+    while day <= last_day:
+        bucket_days.append(day)
+        day = _next_bucket_day(day, resolution)
+
+    edge_days = bucket_days + [day]
+    edges = np.array(
+        [timezone.make_aware(datetime.combine(d, time.min), tz).timestamp() for d in edge_days],
+        dtype=np.float64,
+    )
+    labels = [d.isoformat() for d in bucket_days]
+    return edges, labels
+
+
+def bucket_worked_seconds(starts, ends, paused, groups, n_groups, edges):
+    """
+    Spreads the worked time of each interval over the buckets between edges.
+
+    `groups` holds the row index (0..n_groups-1) of every interval. Returns a
+    (n_groups, n_buckets) matrix of worked seconds. Pauses are not timestamped,
+    so an entry's paused time is spread evenly over its span. Intervals are
+    clipped to the edges, so entries overlapping the window only count the
+    part that falls inside it.
+    """
+    n_buckets = len(edges) - 1
+    if n_buckets <= 0 or n_groups == 0:
+        return np.zeros((n_groups, max(n_buckets, 0)))
+
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    paused = np.asarray(paused, dtype=np.float64)
+    groups = np.asarray(groups, dtype=np.int64)
+
+    gross = ends - starts
+    rate = np.divide(
+        np.maximum(gross - paused, 0.0), gross,
+        out=np.zeros_like(gross), where=gross > 0,
+    )
+
+    s = np.clip(starts, edges[0], edges[-1])
+    e = np.clip(ends, edges[0], edges[-1])
+    keep = e > s
+    s, e, rate, groups = s[keep], e[keep], rate[keep], groups[keep]
+
+    first = np.searchsorted(edges, s, side='right') - 1
+    last = np.searchsorted(edges, e, side='left') - 1
+    size = n_groups * n_buckets
+
+    # Entries that fit inside a single bucket
+    same = first == last
+    flat = groups[same] * n_buckets + first[same]
+    worked = np.zeros(size)
+    worked += np.bincount(flat, weights=(e[same] - s[same]) * rate[same], minlength=size)
+
+    # Entries crossing at least one boundary: partial head and tail buckets...
+    cross = ~same
+    g, f, l, r = groups[cross], first[cross], last[cross], rate[cross]
+    worked += np.bincount(g * n_buckets + f, weights=(edges[f + 1] - s[cross]) * r, minlength=size)
+    worked += np.bincount(g * n_buckets + l, weights=(e[cross] - edges[l]) * r, minlength=size)
+    worked = worked.reshape(n_groups, n_buckets)
+
+    # ...plus every full bucket in between, via a cumulative coverage array
+    width = n_buckets + 1
+    coverage = np.bincount(g * width + f + 1, weights=r, minlength=n_groups * width)
+    coverage -= np.bincount(g * width + l, weights=r, minlength=n_groups * width)
+    coverage = coverage.reshape(n_groups, width)
+    worked += np.cumsum(coverage, axis=1)[:, :n_buckets] * np.diff(edges)
+
+    return worked
+
+
+def project_activity_matrix(queryset, start, end, resolution=RESOLUTION_DAY, tz=None):
+    """
+    Buckets the worked hours of a TimeEntry queryset per project.
+
+    Returns (labels, project_ids, hours) where hours is a
+    (len(project_ids), len(labels)) matrix.
+    """
+    edges, labels = local_bucket_edges(start, end, resolution, tz)
+    arrays = load_entry_arrays(queryset)
+    project_ids, groups = np.unique(arrays['project'], return_inverse=True)
+    seconds = bucket_worked_seconds(
+        arrays['start'], arrays['end'], arrays['paused'], groups, len(project_ids), edges
+    )
+    return labels, project_ids.tolist(), seconds / 3600
+
+
+def lttb_indices(values, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling of a series.
+
+    Returns the sorted indices of at most `threshold` points that preserve the
+    visual shape of `values` (x is the point index). The first and last points
+    are always kept.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    size = len(values)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+
+    x = np.arange(size, dtype=np.float64)
+    # Interior points are split into threshold - 2 buckets of near equal size
+    bounds = np.linspace(1, size - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        # Average of the next bucket, or the last point for the final bucket
+        if i + 2 < len(bounds):
+            next_lo, next_hi = bounds[i + 1], bounds[i + 2]
+            avg_x, avg_y = x[next_lo:next_hi].mean(), values[next_lo:next_hi].mean()
+        else:
+            avg_x, avg_y = x[-1], values[-1]
+
+        area = np.abs(
+            (x[previous] - avg_x) * (values[lo:hi] - values[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y - values[previous])
+        )
+        previous = lo + int(area.argmax())
+        selected[i + 1] = previous
+
+    return selected
@@ -0,0 +1,174 @@
+"""
+Earnings and tax calculations for Swedish sole traders.
+
+Rates are versioned per tax year in RATE_TABLES. Amounts are computed for
+whole arrays at once with NumPy integer arithmetic in öre (1/100 SEK) and
+rates in 1/10000 units, so every step rounds half-up exactly like Decimal
+would. Values only become Decimal at the boundaries of the public functions.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+from django.utils import timezone
+
+# Rates are fractions, thresholds annual SEK. The state tax threshold is
+# the "skiktgräns" on annual taxable income.
+RATE_TABLES = {
+    2023: {
+        'social_fees': Decimal('0.2897'),
+        'municipal_tax': Decimal('0.32'),
+        'vacation_pay': Decimal('0.12'),
+        'pension': Decimal('0.045'),
+        'sick_leave_buffer': Decimal('0.05'),
+        'state_tax_threshold': Decimal('598500'),
+    },
+    2024: {
+        'social_fees': Decimal('0.2897'),
+        'municipal_tax': Decimal('0.32'),
+        'vacation_pay': Decimal('0.12'),
+        'pension': Decimal('0.045'),
+        'sick_leave_buffer': Decimal('0.05'),
+        'state_tax_threshold': Decimal('613900'),
+    },
+    2025: {
+        'social_fees': Decimal('0.2897'),
+        'municipal_tax': Decimal('0.32'),
+        'vacation_pay': Decimal('0.12'),
+        'pension': Decimal('0.045'),
+        'sick_leave_buffer': Decimal('0.05'),
+        'state_tax_threshold': Decimal('625800'),
+    },
+}
+
+RATE_SCALE = 10000
+ORE_PER_SEK = 100
+
+INT64_MAX = int(np.iinfo(np.int64).max)
+
+
+def get_rates(year=None):
+    """
+    Returns the rate table for a tax year.
+
+    Defaults to the current year; years without a table use the closest
+    earlier one (or the earliest table for years before it).
+    """
+    year = year or timezone.localdate().year
+    known_years = sorted(RATE_TABLES)
+    candidates = [known for known in known_years if known <= year]
+    return RATE_TABLES[candidates[-1] if candidates else known_years[0]]
+
+
+def _to_units(values, scale):
+    """
+    Converts Decimal-compatible values to int64 multiples of 1/scale,
+    rounding half-up. Raises OverflowError for values int64 cannot hold.
+    """
+    units = [int((Decimal(str(value)) * scale).to_integral_value(rounding=ROUND_HALF_UP)) for value in np.ravel(values)]
+    if any(abs(unit) > INT64_MAX for unit in units):
+        raise OverflowError('Amount out of range')
+    return np.array(units, dtype=np.int64).reshape(np.shape(values))
+
+
+def _multiply(left, right):
+    """Element-wise int64 product; raises OverflowError where NumPy would silently wrap."""
+    left, right = np.asarray(left, dtype=np.int64), np.asarray(right, dtype=np.int64)
+    if left.size and right.size and int(np.abs(left).max()) * int(np.abs(right).max()) > INT64_MAX:
+        raise OverflowError('Amount out of range')
+    return left * right
+
+
+def _divide_half_up(numerator, denominator):
+    """Integer division rounding half away from zero, element-wise."""
+    numerator = np.asarray(numerator, dtype=np.int64)
+    quotient = (_multiply(np.abs(numerator), 2) + denominator) // (2 * denominator)
+    return np.sign(numerator) * quotient
+
+
+def _apply_rate(ore, rate):
+    """Multiplies öre amounts by a fractional rate and rounds to whole öre."""
+    return _divide_half_up(_multiply(ore, _to_units(rate, RATE_SCALE)), RATE_SCALE)
+
+
+def to_decimal(ore):
+    """Converts öre (scalar or array) back to Decimal SEK, keeping the shape as lists."""
+    if np.ndim(ore) == 0:
+        return Decimal(int(ore)).scaleb(-2)
+    return [to_decimal(value) for value in np.asarray(ore)]
+
+
+def compute_earnings(worked_seconds, hourly_rates, year=None, municipal_tax_rate=None):
+    """
+    Computes gross pay, social fees, income tax and net pay in one pass.
+
+    `worked_seconds` is a sequence (days, projects, users...) and
+    `hourly_rates` a single rate or one per element. Returns a dict of lists
+    of Decimal SEK under 'gross', 'social_fees', 'taxable_income',
+    'income_tax' and 'net'.
+    """
+    rates = get_rates(year)
+    municipal_tax_rate = rates['municipal_tax'] if municipal_tax_rate is None else municipal_tax_rate
+
+    seconds = np.rint(np.asarray(worked_seconds, dtype=np.float64)).astype(np.int64)
+    hourly_ore = np.broadcast_to(_to_units(hourly_rates, ORE_PER_SEK), seconds.shape)
+
+    gross = _divide_half_up(_multiply(seconds, hourly_ore), 3600)
+    social_fees = _apply_rate(gross, rates['social_fees'])
+    taxable_income = gross - social_fees
+    income_tax = _apply_rate(taxable_income, municipal_tax_rate)
+    net = taxable_income - income_tax
+
+    return {
+        'gross': to_decimal(gross),
+        'social_fees': to_decimal(social_fees),
+        'taxable_income': to_decimal(taxable_income),
+        'income_tax': to_decimal(income_tax),
+        'net': to_decimal(net),
+    }
+
+
+def income_rate_grid(desired_salaries, billable_hours, overhead_costs=0, profit_margin=0,
+                     municipal_tax=None, year=None):
+    """
+    Sweeps monthly salary x billable hours for the income calculator.
+
+    `desired_salaries` and `billable_hours` are sequences; percentages
+    (`profit_margin`, `municipal_tax`) are given as in the form, e.g. 32 for
+    32%. Per-salary amounts are lists of Decimal SEK; 'hourly_rate' is a
+    matrix with one row per salary and one column per billable hours value.
+    """
+    rates = get_rates(year)
+    municipal_tax_rate = rates['municipal_tax'] if municipal_tax is None else Decimal(str(municipal_tax)) / 100
+
+    salary = _to_units(desired_salaries, ORE_PER_SEK)
+    hours = _to_units(billable_hours, 100)
+    overhead = _to_units(overhead_costs, ORE_PER_SEK)
+
+    social_fees = _apply_rate(salary, rates['social_fees'])
+    vacation_pay = _apply_rate(salary, rates['vacation_pay'])
+    pension = _apply_rate(salary, rates['pension'])
+    sick_leave_buffer = _apply_rate(salary, rates['sick_leave_buffer'])
+    total_monthly_cost = salary + social_fees + vacation_pay + pension + sick_leave_buffer + overhead
+    profit_amount = _apply_rate(total_monthly_cost, Decimal(str(profit_margin)) / 100)
+    total_to_invoice = total_monthly_cost + profit_amount
+
+    # Hours are in hundredths, so scale the amount up to keep whole öre per hour
+    safe_hours = np.where(hours > 0, hours, 1)
+    hourly_rate = _divide_half_up(_multiply(total_to_invoice[:, None], 100), safe_hours[None, :])
+    hourly_rate = np.where(hours[None, :] > 0, hourly_rate, 0)
+
+    income_tax = _apply_rate(salary, municipal_tax_rate)
+
+    return {
+        'social_fees': to_decimal(social_fees),
+        'vacation_pay': to_decimal(vacation_pay),
+        'pension_savings': to_decimal(pension),
+        'sick_leave_buffer': to_decimal(sick_leave_buffer),
+        'total_monthly_cost': to_decimal(total_monthly_cost),
+        'profit_amount': to_decimal(profit_amount),
+        'total_to_invoice': to_decimal(total_to_invoice),
+        'income_tax': to_decimal(income_tax),
+        'net_salary': to_decimal(salary - income_tax),
+        'hourly_rate': to_decimal(hourly_rate),
+        'state_tax_threshold': rates['state_tax_threshold'],
+    }
@@ -2,6 +2,7 @@ from django import forms
 from .models import TimeEntry, Project, Contact
 from django.core.exceptions import ValidationError
 from datetime import timedelta
+from decimal import Decimal
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -116,4 +117,29 @@ class CategoryForm(forms.ModelForm):
         fields = ['name']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control'}),
-        }
\ No newline at end of file
+        }
+class IncomeCalculatorForm(forms.Form):
+    """
+    Inputs of the income calculator, read from the query string. The bounds
+    keep every amount well inside the calculator's int64 öre arithmetic.
+    """
+    # Optional inputs and the value they fall back to
+    DEFAULTS = {
+        'overhead_costs': Decimal('0'),
+        'profit_margin': Decimal('0'),
+        'billable_hours': Decimal('1'),
+        'municipal_tax': Decimal('0'),
+    }
+
+    desired_salary = forms.DecimalField(min_value=0, max_value=10_000_000)
+    overhead_costs = forms.DecimalField(required=False, min_value=0, max_value=10_000_000)
+    profit_margin = forms.DecimalField(required=False, min_value=0, max_value=1000)
+    billable_hours = forms.DecimalField(required=False, min_value=0, max_value=744)
+    municipal_tax = forms.DecimalField(required=False, min_value=0, max_value=100)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for name, default in self.DEFAULTS.items():
+            if name not in self.errors and cleaned_data.get(name) is None:
+                cleaned_data[name] = default
+        return cleaned_data
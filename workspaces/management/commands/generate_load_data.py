@@ -0,0 +1,269 @@
+import time
+from datetime import date, datetime, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from invoicing.billing import generate_invoices
+from invoicing.models import Invoice
+from subscriptions.models import Subscription, SubscriptionPlan
+from users.models import Membership, Organization
+from workspaces.models import Contact, Project, TimeEntry, TimeEntryImage
+
+User = get_user_model()
+
+ENTRY_TITLES = [
+    'Development', 'Code review', 'Meeting', 'Planning', 'Design', 'Testing', 'Bug fixing',
+    'Documentation', 'Support', 'Research', 'Deployment', 'Client call', 'Refactoring', 'Workshop',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates a reproducible synthetic dataset (organizations, members, clients, projects, '
+        'invoices and time entries) for load testing and benchmarks.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--organizations', type=int, default=5)
+        parser.add_argument('--members', type=int, default=5, help='Members per organization.')
+        parser.add_argument('--clients', type=int, default=4, help='Client contacts per organization.')
+        parser.add_argument('--projects', type=int, default=3, help='Projects per client.')
+        parser.add_argument('--entries', type=int, default=100_000, help='Time entries in total.')
+        parser.add_argument('--days', type=int, default=365, help='Days of history ending today.')
+        parser.add_argument('--invoiced-months', type=int, default=3,
+                            help='Bill the oldest months of history, leaving the rest unbilled.')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data.')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per insert batch.')
+
+    def handle(self, *args, **options):
+        if options['organizations'] < 1 or options['members'] < 1:
+            raise CommandError('At least one organization with one member is needed.')
+
+        started = time.perf_counter()
+        self.rng = np.random.default_rng(options['seed'])
+        self.seed = options['seed']
+        self.chunk_size = options['chunk_size']
+
+        with transaction.atomic():
+            organizations = self._create_organizations(options['organizations'])
+            members = self._create_members(organizations, options['members'])
+            projects = self._create_projects(organizations, options['clients'], options['projects'])
+            entry_count, image_count = self._create_time_entries(
+                organizations, members, projects, options['entries'], options['days']
+            )
+        invoice_count = self._create_invoices(organizations, options['days'], options['invoiced_months'])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(organizations)} organizations, {sum(map(len, members.values()))} members, "
+            f"{sum(map(len, projects.values()))} projects, {entry_count} time entries "
+            f"({image_count} images) and {invoice_count} invoices in {elapsed:.1f}s "
+            f"({entry_count / elapsed:,.0f} entries/s)."
+        ))
+
+    # --- Organizations, members, clients and projects ---
+
+    def _create_organizations(self, count):
+        organizations = Organization.objects.bulk_create([
+            Organization(name=f'Load Org {self.seed}-{index}', iban='DE89370400440532013000', bic='COBADEFFXXX')
+            for index in range(count)
+        ])
+        plan, _ = SubscriptionPlan.objects.get_or_create(
+            name='Pro', defaults={'price': Decimal('99.00'), 'description': 'Pro plan'}
+        )
+        today = timezone.localdate()
+        Subscription.objects.bulk_create([
+            Subscription(organization=organization, plan=plan, start_date=today - timedelta(days=365),
+                         end_date=today + timedelta(days=365))
+            for organization in organizations
+        ])
+        return organizations
+
+    def _create_members(self, organizations, per_organization):
+        # Members cannot log in with a password; benchmarks use force_login
+        password = make_password(None)
+        users = User.objects.bulk_create([
+            User(username=f'load{self.seed}-{organization.pk}-{index}',
+                 email=f'load{self.seed}-{organization.pk}-{index}@example.com',
+                 password=password)
+            for organization in organizations for index in range(per_organization)
+        ], batch_size=self.chunk_size)
+
+        members = {}
+        memberships = []
+        for position, user in enumerate(users):
+            organization = organizations[position // per_organization]
+            role = Membership.Role.OWNER if position % per_organization == 0 else Membership.Role.MEMBER
+            memberships.append(Membership(user=user, organization=organization, role=role))
+            members.setdefault(organization.pk, []).append(user.pk)
+        Membership.objects.bulk_create(memberships, batch_size=self.chunk_size)
+        return members
+
+    def _create_projects(self, organizations, clients_per_organization, projects_per_client):
+        contacts = Contact.objects.bulk_create([
+            Contact(organization=organization, name=f'Client {index}', contact_type=Contact.ContactType.CLIENT,
+                    email=f'billing{index}@client{organization.pk}.example.com', send_reminders=index % 2 == 0)
+            for organization in organizations for index in range(clients_per_organization)
+        ] + [
+            Contact(organization=organization, name='Internal')
+            for organization in organizations
+        ])
+
+        rates = [Decimal(rate) for rate in (650, 800, 950, 1100, 1250)]
+        new_projects = []
+        for contact in contacts:
+            count = projects_per_client if contact.contact_type == Contact.ContactType.CLIENT else 1
+            for index in range(count):
+                new_projects.append(Project(
+                    organization_id=contact.organization_id, contact=contact,
+                    name=f'{contact.name} project {index}',
+                    hourly_rate=rates[int(self.rng.integers(len(rates)))],
+                    is_archived=bool(self.rng.random() < 0.1),
+                ))
+        projects = {}
+        for project in Project.objects.bulk_create(new_projects, batch_size=self.chunk_size):
+            projects.setdefault(project.organization_id, []).append(project.pk)
+        return projects
+
+    # --- Time entries ---
+
+    def _entry_intervals(self, count, days):
+        """Start and end epochs and pause seconds of `count` entries."""
+        rng = self.rng
+        today = timezone.localdate()
+        first_day = today - timedelta(days=days - 1)
+        first_midnight = timezone.make_aware(datetime.combine(first_day, datetime.min.time())).timestamp()
+
+        day_offsets = rng.integers(0, days, count)
+        # Office hours around 9:00-17:00, with a share of late sessions running past midnight
+        start_hours = np.clip(rng.normal(11.0, 2.5, count), 6.0, 20.0)
+        late = rng.random(count) < 0.03
+        start_hours[late] = rng.uniform(21.0, 23.5, int(late.sum()))
+        durations = np.clip(rng.lognormal(np.log(5400), 0.6, count), 300, 36000)
+        durations[late] = rng.uniform(7200, 18000, int(late.sum()))
+
+        paused = np.where(rng.random(count) < 0.3, rng.uniform(0, 1, count) * np.minimum(1800, durations / 3), 0)
+
+        starts = first_midnight + day_offsets * 86400 + np.round(start_hours * 3600)
+        ends = starts + np.round(durations)
+        # Nothing may end in the future: move those entries back by whole days
+        days_late = np.ceil(np.maximum(ends - (time.time() - 60), 0) / 86400)
+        starts -= days_late * 86400
+        ends -= days_late * 86400
+        return starts, ends, np.round(paused)
+
+    def _insert_rows(self, model, field_names, rows):
+        """
+        Inserts plain value tuples with one executemany per chunk.
+
+        Used for the time entry volume instead of bulk_create, which builds a
+        model instance per row and is capped at 999 parameters per INSERT on
+        SQLite (about 70 entries), i.e. roughly 100µs per row.
+        """
+        fields = [model._meta.get_field(name) for name in field_names]
+        quote = connection.ops.quote_name
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(model._meta.db_table),
+            ', '.join(quote(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+        with connection.cursor() as cursor:
+            for chunk_start in range(0, len(rows), self.chunk_size):
+                cursor.executemany(sql, rows[chunk_start:chunk_start + self.chunk_size])
+
+    def _datetime_values(self, epochs):
+        """Database values of whole-second UTC epochs."""
+        if connection.vendor == 'sqlite':
+            # Django stores naive UTC text on SQLite; format the whole column at once
+            text = np.datetime_as_string(epochs.astype('datetime64[s]'), unit='s')
+            return np.char.replace(text, 'T', ' ').tolist()
+        return [
+            connection.ops.adapt_datetimefield_value(datetime.fromtimestamp(epoch, dt_timezone.utc))
+            for epoch in epochs.tolist()
+        ]
+
+    def _duration_values(self, seconds):
+        """Database values of durations given in whole seconds."""
+        if connection.features.has_native_duration_field:
+            return [timedelta(seconds=value) for value in seconds.tolist()]
+        return (seconds.astype(np.int64) * 1_000_000).tolist()
+
+    def _create_time_entries(self, organizations, members, projects, total, days):
+        starts, ends, paused = self._entry_intervals(total, days)
+        count = len(starts)
+        rng = self.rng
+
+        organization_index = rng.integers(0, len(organizations), count)
+        member_pick = rng.random(count)
+        project_pick = rng.random(count)
+        no_project = rng.random(count) < 0.05
+        title_index = rng.integers(0, len(ENTRY_TITLES), count)
+        is_manual = rng.random(count) < 0.1
+        was_edited = ~is_manual & (rng.random(count) < 0.05)
+        is_archived = rng.random(count) < 0.02
+
+        organization_members = [members[organization.pk] for organization in organizations]
+        organization_projects = [projects[organization.pk] for organization in organizations]
+
+        start_values = self._datetime_values(starts)
+        end_values = self._datetime_values(ends)
+        paused_values = self._duration_values(paused)
+        rows = []
+        for i in range(count):
+            organization = organization_index[i]
+            user_ids = organization_members[organization]
+            project_ids = organization_projects[organization]
+            rows.append((
+                user_ids[int(member_pick[i] * len(user_ids))],
+                None if no_project[i] else project_ids[int(project_pick[i] * len(project_ids))],
+                ENTRY_TITLES[title_index[i]], '', '',
+                start_values[i], end_values[i], paused_values[i],
+                bool(is_manual[i]), bool(was_edited[i]), bool(is_archived[i]), False,
+                # Last changed when the timer stopped
+                end_values[i],
+            ))
+        self._insert_rows(TimeEntry, [
+            'user', 'project', 'title', 'description', 'notes', 'start_time', 'end_time', 'paused_duration',
+            'is_manual', 'was_edited', 'is_archived', 'is_paused', 'updated_at',
+        ], rows)
+
+        # Image rows only: the files are not needed to exercise the queries
+        member_ids = [user_id for user_ids in organization_members for user_id in user_ids]
+        entry_ids = np.fromiter(
+            TimeEntry.objects.filter(user_id__in=member_ids).order_by('pk').values_list('pk', flat=True), dtype=np.int64
+        )
+        image_entry_ids = entry_ids[rng.random(len(entry_ids)) < 0.02]
+        TimeEntryImage.objects.bulk_create([
+            TimeEntryImage(time_entry_id=int(entry_id), image=f'time_entry_images/load-{entry_id}.jpg')
+            for entry_id in image_entry_ids
+        ], batch_size=self.chunk_size)
+        return count, len(image_entry_ids)
+
+    # --- Invoices ---
+
+    def _create_invoices(self, organizations, days, invoiced_months):
+        """Bills the oldest months of history, then marks most of those invoices paid."""
+        today = timezone.localdate()
+        month = (today - timedelta(days=days - 1)).replace(day=1)
+        invoice_ids = []
+        for _ in range(invoiced_months):
+            next_month = (month + timedelta(days=32)).replace(day=1)
+            if next_month > today.replace(day=1):
+                break
+            for organization in organizations:
+                invoices = generate_invoices(
+                    organization, month, next_month - timedelta(days=1), due_date=next_month + timedelta(days=30)
+                )
+                invoice_ids.extend(invoice.pk for invoice in invoices)
+            month = next_month
+
+        paid = [pk for pk in invoice_ids if self.rng.random() < 0.7]
+        Invoice.objects.filter(pk__in=paid).update(is_paid=True)
+        return len(invoice_ids)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from workspaces.sync import purge_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Deletes time entry tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS. Safe to rerun.'
+
+    def handle(self, *args, **options):
+        deleted = purge_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} tombstone(s)."))
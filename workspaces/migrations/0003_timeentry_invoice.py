@@ -0,0 +1,20 @@
+# Generated by Django 4.2.23 on 2026-10-19 09:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoicing', '0002_invoiceitem_project_alter_invoiceitem_quantity'),
+        ('workspaces', '0002_remove_project_category_remove_timeentry_category_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeentry',
+            name='invoice',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='time_entries', to='invoicing.invoice'),
+        ),
+    ]
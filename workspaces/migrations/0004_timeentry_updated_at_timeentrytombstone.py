@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-19 09:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_apitoken'),
+        ('workspaces', '0003_timeentry_invoice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='timeentry',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='TimeEntryTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('organization', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='users.organization')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['organization', 'deleted_at'], name='tombstone_org_deleted_idx')],
+            },
+        ),
+    ]
@@ -1,5 +1,9 @@
-from django.db import models
+from django.core.exceptions import EmptyResultSet
+from django.db import connections, models, transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
 from django.conf import settings
+from django.utils import timezone
 from datetime import timedelta
 
 class Contact(models.Model):
@@ -36,9 +40,56 @@ class Project(models.Model):
     is_archived = models.BooleanField(default=False)
     hourly_rate = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_organization_id = instance.__dict__.get('organization_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_organization_id', None)
+        if self.pk is None or loaded is None or loaded == self.organization_id:
+            super().save(*args, **kwargs)
+        else:
+            # Moving to another organization: its entries leave the old one's sync
+            with transaction.atomic(using=kwargs.get('using')):
+                TimeEntryTombstone.record(self.time_entries.all())
+                super().save(*args, **kwargs)
+                self.time_entries.update()
+        self._loaded_organization_id = self.organization_id
+
     def __str__(self):
         return self.name
 
+class TimeEntryQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Bulk updates skip auto_now; incremental sync relies on updated_at moving
+        kwargs.setdefault('updated_at', timezone.now())
+        if 'project' not in kwargs and 'project_id' not in kwargs:
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            self.tombstone_moved(kwargs.get('project', kwargs.get('project_id')))
+            return super().update(**kwargs)
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            TimeEntryTombstone.record(self)
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def tombstone_moved(self, project):
+        """Tombstones for the entries that moving to `project` (a Project, its pk or None) takes out of their organization."""
+        moved = self
+        if project is not None:
+            if isinstance(project, Project):
+                organization = project.organization_id
+            else:
+                organization = models.Subquery(Project.objects.filter(pk=project).values('organization_id'))
+            moved = self.exclude(project__organization_id=organization)
+        TimeEntryTombstone.record(moved)
+
 class TimeEntry(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     project = models.ForeignKey(Project, on_delete=models.CASCADE, null=True, blank=True, related_name='time_entries')
@@ -53,10 +104,39 @@ class TimeEntry(models.Model):
     paused_duration = models.DurationField(default=timedelta(0))
     is_manual = models.BooleanField(default=False)
     was_edited = models.BooleanField(default=False)
+    invoice = models.ForeignKey('invoicing.Invoice', on_delete=models.SET_NULL, null=True, blank=True, related_name='time_entries')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = TimeEntryQuerySet.as_manager()
 
     class Meta:
         ordering = ['-start_time']
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_project_id = instance.__dict__.get('project_id')
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_project_id', None)
+        if self.pk is None or loaded is None or loaded == self.project_id:
+            super().save(*args, **kwargs)
+        else:
+            with transaction.atomic(using=kwargs.get('using')):
+                TimeEntry.objects.filter(pk=self.pk).tombstone_moved(self.project_id)
+                super().save(*args, **kwargs)
+        self._loaded_project_id = self.project_id
+
+    save.alters_data = True
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            TimeEntryTombstone.record(TimeEntry.objects.filter(pk=self.pk))
+            return super().delete(*args, **kwargs)
+
+    delete.alters_data = True
+
     @property
     def duration(self):
         if self.end_time:
@@ -74,4 +154,53 @@ class TimeEntryImage(models.Model):
         indexes = [models.Index(fields=['time_entry'])]
 
     def __str__(self):
-        return f"Image for {self.time_entry.title}"
\ No newline at end of file
+        return f"Image for {self.time_entry.title}"
+
+class TimeEntryTombstone(models.Model):
+    """
+    A time entry deleted from, or moved out of, an organization's projects,
+    kept so incremental sync clients learn that it is gone.
+    """
+    entry_id = models.BigIntegerField()
+    # No constraint: entries are also deleted while their organization is
+    organization = models.ForeignKey(
+        'users.Organization', on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['organization', 'deleted_at'], name='tombstone_org_deleted_idx')]
+
+    def __str__(self):
+        return f"Deleted time entry #{self.entry_id}"
+
+    @classmethod
+    def record(cls, entries):
+        """
+        Writes a tombstone for each of `entries` (a TimeEntry queryset) that
+        belongs to a project, with one INSERT ... SELECT so the entries are
+        never loaded. Returns how many were written.
+        """
+        rows = entries.filter(project__isnull=False).order_by().annotate(
+            tombstone_deleted_at=models.Value(timezone.now(), output_field=models.DateTimeField())
+        ).values_list('pk', 'project__organization_id', 'tombstone_deleted_at')
+        try:
+            select_sql, params = rows.query.get_compiler(using=entries.db).as_sql()
+        except EmptyResultSet:
+            return 0
+        connection = connections[entries.db]
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(cls._meta.get_field(name).column) for name in ('entry_id', 'organization', 'deleted_at'))
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {quote(cls._meta.db_table)} ({columns}) {select_sql}', params)
+            return cursor.rowcount
+
+# Cascades from a deleted project (or its organization) or user bypass
+# TimeEntry.delete(); record their entries in one go before they are gone
+@receiver(pre_delete, sender=Project)
+def record_project_tombstones(sender, instance, **kwargs):
+    TimeEntryTombstone.record(instance.time_entries.all())
+
+@receiver(pre_delete, sender=settings.AUTH_USER_MODEL)
+def record_user_tombstones(sender, instance, **kwargs):
+    TimeEntryTombstone.record(TimeEntry.objects.filter(user=instance))
@@ -0,0 +1,91 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET, each page continues strictly after the last row of the
+previous one, so fetching a deep page costs the same as the first and rows
+inserted meanwhile do not shift the pages. The cursor is an opaque token
+holding the ordering values of that last row.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, per_page):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset on `ordering`, which must end with a unique field
+    (usually 'pk' or '-pk') so that every row has a distinct position.
+    Ordering fields must be non-nullable.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset.order_by(*ordering)
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+        self.per_page = per_page
+
+    def _field(self, name):
+        model = self.queryset.model
+        return model._meta.pk if name == 'pk' else model._meta.get_field(name)
+
+    def encode_cursor(self, obj):
+        values = [self._field(name).value_to_string(obj) for name, _ in self.ordering]
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise InvalidCursor(cursor)
+            return [
+                self._field(name).to_python(value)
+                for (name, _), value in zip(self.ordering, values)
+            ]
+        except (ValueError, TypeError, ValidationError):
+            raise InvalidCursor(cursor)
+
+    def _after(self, values):
+        # Lexicographic "comes after": (a > x) OR (a = x AND b > y) OR ...
+        condition = Q()
+        for index, (name, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[index]})
+            for previous, (previous_name, _) in enumerate(self.ordering[:index]):
+                step &= Q(**{previous_name: values[previous]})
+            condition |= step
+        return condition
+
+    def get_page(self, cursor=None):
+        """Returns the page after `cursor` (the first page when empty). Raises InvalidCursor."""
+        queryset = self.queryset
+        if cursor:
+            queryset = queryset.filter(self._after(self.decode_cursor(cursor)))
+        # One extra row tells whether there is a next page without a COUNT
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = self.encode_cursor(rows[self.per_page - 1]) if len(rows) > self.per_page else None
+        return KeysetPage(rows[:self.per_page], next_cursor, self.per_page)
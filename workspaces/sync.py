@@ -0,0 +1,141 @@
+"""
+Incremental NDJSON export of an organization's time entries.
+
+GET with "Authorization: Bearer <ApiToken key>" streams one JSON object
+per line: first {"type": "deleted"} tombstones, then {"type":
+"time_entry"} rows in updated_at order, and finally a {"type": "cursor"}
+line. Passing that cursor back as `since` returns only what changed in
+the meantime; without `since` every entry is exported and no tombstones.
+
+The cursor lags the export start by SYNC_CURSOR_OVERLAP_SECONDS so that
+rows committed late with an earlier updated_at are not skipped; clients
+upsert by id and may see a row twice. Tombstones are kept for
+SYNC_TOMBSTONE_RETENTION_DAYS, and older cursors get 410 Gone, after which
+the client runs a full export again.
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+
+from users.models import ApiToken
+from .models import TimeEntry, TimeEntryTombstone
+
+DEFAULT_CURSOR_OVERLAP_SECONDS = 300
+DEFAULT_TOMBSTONE_RETENTION_DAYS = 90
+
+# Rows fetched per round trip, and lines per chunk written to the client
+STREAM_CHUNK_SIZE = 2000
+
+ENTRY_FIELDS = (
+    'id', 'user_id', 'user__username', 'project_id', 'project__name', 'title', 'description', 'notes',
+    'start_time', 'end_time', 'paused_duration', 'is_archived', 'is_manual', 'invoice_id', 'updated_at',
+)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_RETENTION_DAYS', DEFAULT_TOMBSTONE_RETENTION_DAYS))
+
+
+def encode_cursor(moment):
+    return base64.urlsafe_b64encode(moment.isoformat().encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        moment = datetime.fromisoformat(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+    if timezone.is_naive(moment):
+        raise InvalidCursor(cursor)
+    return moment
+
+
+def _entry_line(values):
+    paused = values.pop('paused_duration')
+    values['username'] = values.pop('user__username')
+    values['project'] = values.pop('project__name')
+    values['paused_seconds'] = paused.total_seconds()
+    return json.dumps(dict(values, type='time_entry'), cls=DjangoJSONEncoder)
+
+
+def sync_lines(organization, since, next_cursor):
+    """The NDJSON lines of the export, read in chunks so memory stays flat."""
+    if since is not None:
+        tombstones = TimeEntryTombstone.objects.filter(
+            organization=organization, deleted_at__gte=since
+        ).order_by('deleted_at', 'pk').values_list('entry_id', 'deleted_at')
+        for entry_id, deleted_at in tombstones.iterator(chunk_size=STREAM_CHUNK_SIZE):
+            yield json.dumps({'type': 'deleted', 'id': entry_id, 'deleted_at': deleted_at}, cls=DjangoJSONEncoder)
+
+    entries = TimeEntry.objects.filter(project__organization=organization)
+    if since is not None:
+        entries = entries.filter(updated_at__gte=since)
+    for values in entries.order_by('updated_at', 'pk').values(*ENTRY_FIELDS).iterator(chunk_size=STREAM_CHUNK_SIZE):
+        yield _entry_line(values)
+
+    yield json.dumps({'type': 'cursor', 'cursor': next_cursor})
+
+
+def _chunked(lines):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+
+
+def _error(message, status):
+    response = JsonResponse({'error': message}, status=status)
+    if status == 401:
+        response['WWW-Authenticate'] = 'Bearer'
+    return response
+
+
+@require_GET
+def time_entry_sync(request):
+    """Streams the organization's time entries changed since the `since` cursor as NDJSON."""
+    authorization = request.headers.get('Authorization', '')
+    scheme, _, key = authorization.partition(' ')
+    token = ApiToken.authenticate(key.strip()) if scheme.lower() == 'bearer' else None
+    if token is None:
+        return _error('A valid API token is required.', 401)
+
+    started = timezone.now()
+    since = None
+    if request.GET.get('since'):
+        try:
+            since = decode_cursor(request.GET['since'])
+        except InvalidCursor:
+            return _error('Invalid cursor.', 400)
+        if since < started - tombstone_retention():
+            return _error('Cursor expired; run a full export without `since`.', 410)
+    ApiToken.objects.filter(pk=token.pk).update(last_used_at=started)
+
+    overlap = timedelta(seconds=getattr(settings, 'SYNC_CURSOR_OVERLAP_SECONDS', DEFAULT_CURSOR_OVERLAP_SECONDS))
+    next_cursor = encode_cursor(started - overlap)
+    response = StreamingHttpResponse(
+        _chunked(sync_lines(token.organization, since, next_cursor)), content_type='application/x-ndjson'
+    )
+    response['X-Sync-Cursor'] = next_cursor
+    return response
+
+
+def purge_tombstones(now=None):
+    """Deletes tombstones past the retention period; returns how many."""
+    cutoff = (now or timezone.now()) - tombstone_retention()
+    deleted, _ = TimeEntryTombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
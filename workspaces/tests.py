@@ -1,14 +1,28 @@
-from django.test import TestCase
+from django.conf import settings
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
-from .models import Project, TimeEntry, TimeEntryImage
-from users.models import Organization
+from .models import Contact, Project, TimeEntry, TimeEntryImage, TimeEntryTombstone
+from invoicing.models import Invoice
+from users.models import ApiToken, Organization
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, timedelta
+from io import StringIO
+from decimal import Decimal
 from urllib.parse import urlencode
 from PIL import Image
 from django.core.files import File
+from zoneinfo import ZoneInfo
+import json
+import numpy as np
 import os
+from .analytics_views import _get_daily_worked_seconds
+from .earnings import RATE_TABLES, compute_earnings, get_rates, income_rate_grid
+from .bucketing import bucket_worked_seconds, choose_resolution, local_bucket_edges, lttb_indices
+from .utils import date_range_q, local_date_bounds
+from .sync import encode_cursor
+from .views import TimeEntryListView
 
 User = get_user_model()
 
@@ -471,4 +485,596 @@ class BulkActionViewsTest(TestCase):
         response = self.client.get(toggle_url)
         self.assertRedirects(response, reverse('workspaces:entry_list'))
         self.entry1.refresh_from_db()
-        self.assertFalse(self.entry1.is_archived)
\ No newline at end of file
+        self.assertFalse(self.entry1.is_archived)
+
+class BucketingTest(TestCase):
+    def setUp(self):
+        self.tz = ZoneInfo('Europe/Stockholm')
+        self.start = timezone.make_aware(timezone.datetime(2024, 3, 29, 12), self.tz)
+        self.end = timezone.make_aware(timezone.datetime(2024, 4, 2, 12), self.tz)
+
+    def test_day_edges_follow_local_midnight_across_dst(self):
+        edges, labels = local_bucket_edges(self.start, self.end, 'day', self.tz)
+        self.assertEqual(labels, ['2024-03-29', '2024-03-30', '2024-03-31', '2024-04-01', '2024-04-02'])
+        # The last Sunday of March only has 23 hours in Stockholm
+        self.assertEqual(np.diff(edges).tolist(), [86400, 86400, 82800, 86400, 86400])
+
+    def test_week_edges_start_on_monday(self):
+        edges, labels = local_bucket_edges(self.start, self.end, 'week', self.tz)
+        self.assertEqual(labels, ['2024-03-25', '2024-04-01'])
+        self.assertEqual(len(edges), 3)
+
+    def test_month_edges_start_on_the_first(self):
+        end = timezone.make_aware(timezone.datetime(2024, 5, 3, 12), self.tz)
+        edges, labels = local_bucket_edges(self.start, end, 'month', self.tz)
+        self.assertEqual(labels, ['2024-03-01', '2024-04-01', '2024-05-01'])
+        self.assertEqual(np.diff(edges).tolist(), [31 * 86400 - 3600, 30 * 86400, 31 * 86400])
+
+    def test_resolution_depends_on_period_length(self):
+        now = timezone.now()
+        self.assertEqual(choose_resolution(now - timedelta(days=30), now), 'day')
+        self.assertEqual(choose_resolution(now - timedelta(days=365), now), 'week')
+        self.assertEqual(choose_resolution(now - timedelta(days=3 * 365), now), 'month')
+
+    def test_lttb_keeps_endpoints_and_peaks(self):
+        values = np.zeros(500)
+        values[137] = 10
+        values[-1] = 3
+        indices = lttb_indices(values, 50)
+        self.assertEqual(len(indices), 50)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], 499)
+        self.assertIn(137, indices.tolist())
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_lttb_returns_all_points_below_threshold(self):
+        self.assertEqual(lttb_indices([1, 2, 3], 10).tolist(), [0, 1, 2])
+
+    def test_midnight_spanning_entry_is_split(self):
+        edges, labels = local_bucket_edges(self.start, self.end, 'day', self.tz)
+        start = timezone.make_aware(timezone.datetime(2024, 3, 29, 22), self.tz).timestamp()
+        end = timezone.make_aware(timezone.datetime(2024, 3, 30, 3), self.tz).timestamp()
+        hours = bucket_worked_seconds([start], [end], [0], [0], 1, edges) / 3600
+        self.assertEqual(hours.round(6).tolist(), [[2, 3, 0, 0, 0]])
+
+    def test_multi_day_entry_with_pause(self):
+        edges, labels = local_bucket_edges(self.start, self.end, 'day', self.tz)
+        start = timezone.make_aware(timezone.datetime(2024, 3, 29, 12), self.tz).timestamp()
+        end = timezone.make_aware(timezone.datetime(2024, 4, 1, 12), self.tz).timestamp()
+        gross = end - start
+        hours = bucket_worked_seconds([start], [end], [gross / 2], [0], 1, edges) / 3600
+        # Half of the span was paused, so every covered hour counts as half
+        self.assertEqual(hours.round(6).tolist(), [[6, 12, 11.5, 6, 0]])
+        self.assertAlmostEqual(hours.sum(), gross / 2 / 3600)
+
+    def test_entries_are_grouped_and_clipped_to_window(self):
+        edges, labels = local_bucket_edges(self.start, self.end, 'day', self.tz)
+        before = edges[0] - 3600
+        starts = [before, edges[1] + 3600, edges[1] + 7200]
+        ends = [edges[0] + 3600, edges[1] + 5400, edges[1] + 9000]
+        hours = bucket_worked_seconds(starts, ends, [0, 0, 0], [0, 1, 1], 2, edges) / 3600
+        self.assertEqual(hours.round(6).tolist(), [[1, 0, 0, 0, 0], [0, 1, 0, 0, 0]])
+
+
+class AnalyticsActivityTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.organization = Organization.objects.create(name='Test Organization')
+        self.organization.members.add(self.user)
+        self.project = Project.objects.create(name='Activity Project', organization=self.organization)
+        self.client.login(username='testuser', password='testpassword')
+        self.url = reverse('workspaces:analytics:dashboard')
+
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        TimeEntry.objects.create(
+            user=self.user, project=self.project, title='Late shift',
+            start_time=today - timedelta(days=2, hours=1),
+            end_time=today - timedelta(days=2, hours=-2),
+        )
+        TimeEntry.objects.create(
+            user=self.user, title='No project work',
+            start_time=today - timedelta(days=1, hours=-9),
+            end_time=today - timedelta(days=1, hours=-10),
+        )
+
+    def test_ajax_returns_daily_hours_per_project(self):
+        response = self.client.get(self.url, {'period': '7d'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        datasets = {d['label']: d['data'] for d in data['activity_chart_datasets']}
+        self.assertEqual(set(datasets), {'Activity Project', 'No Project'})
+        self.assertEqual(len(data['activity_chart_labels']), len(datasets['Activity Project']))
+        self.assertEqual(datasets['Activity Project'][-4:-2], [1.0, 2.0])
+        self.assertEqual(datasets['No Project'][-2], 1.0)
+
+    def test_ajax_long_period_uses_weekly_buckets(self):
+        response = self.client.get(self.url, {'period': '1y'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        data = response.json()
+        self.assertEqual(data['activity_chart_resolution'], 'week')
+        self.assertLessEqual(len(data['activity_chart_labels']), 54)
+        totals = {d['label']: round(sum(d['data']), 2) for d in data['activity_chart_datasets']}
+        self.assertEqual(totals, {'Activity Project': 3.0, 'No Project': 1.0})
+
+    def test_ajax_downsamples_to_requested_points(self):
+        response = self.client.get(self.url, {'period': '3m', 'points': 10}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        data = response.json()
+        self.assertEqual(data['activity_chart_resolution'], 'day')
+        for dataset in data['activity_chart_datasets']:
+            self.assertEqual(len(dataset['x']), 10)
+            self.assertEqual(len(dataset['data']), 10)
+            self.assertEqual(dataset['x'][-1], len(data['activity_chart_labels']) - 1)
+
+    def test_ajax_all_period_starts_at_first_entry(self):
+        response = self.client.get(self.url, {'period': 'all'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        data = response.json()
+        self.assertEqual(len(data['activity_chart_labels']), 4)
+
+    def _get_activity(self, **params):
+        return self.client.get(self.url, {'period': '7d', **params}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_unchanged_data_returns_not_modified(self):
+        first = self._get_activity().json()
+        response = self._get_activity(version=first['version'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], '"%s"' % first['version'])
+
+    def test_new_entry_returns_only_recent_buckets(self):
+        first = self._get_activity().json()
+        today = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+        TimeEntry.objects.create(
+            user=self.user, project=self.project, title='Fresh work',
+            start_time=today, end_time=today + timedelta(minutes=30),
+        )
+        response = self._get_activity(
+            version=first['version'], since=first['activity_chart_labels'][-1], head=first['head_version']
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data['delta'])
+        self.assertEqual(data['activity_chart_labels'], first['activity_chart_labels'][-1:])
+        self.assertEqual(data['activity_chart_first_label'], first['activity_chart_labels'][0])
+        datasets = {d['label']: d['data'] for d in data['activity_chart_datasets']}
+        self.assertEqual(datasets, {'Activity Project': [0.5]})
+        self.assertNotEqual(data['version'], first['version'])
+
+    def test_changed_history_forces_full_response(self):
+        first = self._get_activity().json()
+        TimeEntry.objects.filter(title='Late shift').update(paused_duration=timedelta(minutes=30))
+        data = self._get_activity(
+            version=first['version'], since=first['activity_chart_labels'][-1], head=first['head_version']
+        ).json()
+        self.assertFalse(data['delta'])
+        self.assertEqual(len(data['activity_chart_labels']), len(first['activity_chart_labels']))
+
+    def test_moved_entry_returns_new_data(self):
+        first = self._get_activity().json()
+        entry = TimeEntry.objects.get(title='Late shift')
+        entry.start_time += timedelta(days=1)
+        entry.end_time += timedelta(days=1)
+        entry.save()
+        response = self._get_activity(version=first['version'])
+        self.assertEqual(response.status_code, 200)
+        datasets = {d['label']: d['data'] for d in response.json()['activity_chart_datasets']}
+        self.assertEqual(datasets['Activity Project'][-3:-1], [1.0, 2.0])
+
+    def test_renamed_project_returns_new_data(self):
+        first = self._get_activity().json()
+        Project.objects.filter(pk=self.project.pk).update(name='Renamed Project')
+        response = self._get_activity(version=first['version'])
+        self.assertEqual(response.status_code, 200)
+        labels = {d['label'] for d in response.json()['activity_chart_datasets']}
+        self.assertIn('Renamed Project', labels)
+
+
+class DailyEarningsAggregationTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.organization = Organization.objects.create(name='Test Organization')
+        self.organization.members.add(self.user)
+        self.project = Project.objects.create(name='Paid Project', organization=self.organization, hourly_rate=500)
+        self.tz = ZoneInfo('Europe/Stockholm')
+
+    def _create_entry(self, start, end, paused=timedelta(0)):
+        return TimeEntry.objects.create(
+            user=self.user, project=self.project, title='Work',
+            start_time=start, end_time=end, paused_duration=paused,
+        )
+
+    def test_days_are_grouped_in_the_active_timezone(self):
+        utc = ZoneInfo('UTC')
+        # 23:30 UTC on the 1st is already the 2nd in Stockholm
+        self._create_entry(
+            timezone.datetime(2024, 6, 1, 22, 30, tzinfo=utc),
+            timezone.datetime(2024, 6, 1, 23, 30, tzinfo=utc),
+        )
+        self._create_entry(
+            timezone.datetime(2024, 6, 3, 8, 0, tzinfo=utc),
+            timezone.datetime(2024, 6, 3, 11, 0, tzinfo=utc),
+            paused=timedelta(minutes=30),
+        )
+        start, end = timezone.datetime(2024, 6, 1).date(), timezone.datetime(2024, 6, 4).date()
+        with timezone.override(self.tz), self.assertNumQueries(1):
+            labels, seconds = _get_daily_worked_seconds(TimeEntry.objects.all(), start, end)
+        self.assertEqual(labels, ['2024-06-01', '2024-06-02', '2024-06-03', '2024-06-04'])
+        self.assertEqual(seconds, [0, 3600, 9000, 0])
+
+    def test_negative_worked_time_counts_as_zero(self):
+        now = timezone.now()
+        self._create_entry(now - timedelta(hours=1), now, paused=timedelta(hours=2))
+        labels, seconds = _get_daily_worked_seconds(TimeEntry.objects.all(), timezone.localdate(), timezone.localdate())
+        self.assertEqual(seconds, [0])
+
+
+class DateRangeFilterTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.tz = ZoneInfo('Europe/Stockholm')
+        utc = ZoneInfo('UTC')
+        # Stockholm is UTC+2 in June: 22:30 UTC on the 1st is the 2nd locally
+        self.late = TimeEntry.objects.create(
+            user=self.user, title='Late',
+            start_time=timezone.datetime(2024, 6, 1, 22, 30, tzinfo=utc),
+            end_time=timezone.datetime(2024, 6, 1, 23, 30, tzinfo=utc),
+        )
+        self.early = TimeEntry.objects.create(
+            user=self.user, title='Early',
+            start_time=timezone.datetime(2024, 6, 1, 21, 0, tzinfo=utc),
+            end_time=timezone.datetime(2024, 6, 1, 21, 45, tzinfo=utc),
+        )
+
+    def _assert_plain_range(self, sql):
+        lowered = sql.lower()
+        for cast in ('cast_date', '::date', 'at time zone', 'date('):
+            self.assertNotIn(cast, lowered)
+        self.assertIn('"start_time" >=', sql)
+
+    def test_bounds_are_half_open_local_midnights(self):
+        start, end = local_date_bounds(date(2024, 6, 2), '2024-06-03', tz=self.tz)
+        self.assertEqual(start, timezone.datetime(2024, 6, 2, tzinfo=self.tz))
+        self.assertEqual(end, timezone.datetime(2024, 6, 4, tzinfo=self.tz))
+        self.assertEqual(start.utcoffset(), timedelta(hours=2))
+        self.assertEqual(local_date_bounds(None, None), (None, None))
+        with self.assertRaises(ValueError):
+            local_date_bounds('not-a-date')
+
+    def test_days_are_matched_in_the_active_timezone(self):
+        with timezone.override(self.tz):
+            day = TimeEntry.objects.filter(date_range_q(date(2024, 6, 2), date(2024, 6, 2), end_field='end_time'))
+            self.assertEqual(list(day), [self.late])
+            self.assertEqual(list(TimeEntry.objects.filter(date_range_q(end_date=date(2024, 6, 1)))), [self.early])
+
+    def test_filter_compares_the_raw_column(self):
+        queryset = TimeEntry.objects.filter(date_range_q(date(2024, 6, 1), date(2024, 6, 2), end_field='end_time'))
+        sql = str(queryset.query)
+        self._assert_plain_range(sql)
+        self.assertIn('"end_time" <', sql)
+
+    def test_list_view_filters_with_range_predicates(self):
+        request = RequestFactory().get('/', {'start_date': '2024-06-02', 'end_date': '2024-06-02'})
+        request.user = self.user
+        view = TimeEntryListView()
+        view.setup(request)
+        with timezone.override(self.tz):
+            queryset = view.get_queryset()
+            self.assertEqual(list(queryset), [self.late])
+        self._assert_plain_range(str(queryset.query))
+
+    def test_list_view_ignores_invalid_dates(self):
+        request = RequestFactory().get('/', {'start_date': 'not-a-date'})
+        request.user = self.user
+        view = TimeEntryListView()
+        view.setup(request)
+        self.assertEqual(view.get_queryset().count(), 2)
+
+
+class EarningsEngineTest(TestCase):
+    def test_rates_fall_back_to_closest_earlier_year(self):
+        self.assertEqual(get_rates(2031), RATE_TABLES[max(RATE_TABLES)])
+        self.assertEqual(get_rates(2024)['state_tax_threshold'], Decimal('613900'))
+        self.assertEqual(get_rates(1999), get_rates(2023))
+
+    def test_compute_earnings_matches_decimal_arithmetic(self):
+        seconds = [0, 3600, 5401, 27000]
+        result = compute_earnings(seconds, Decimal('512.50'), year=2024)
+        for i, worked in enumerate(seconds):
+            gross = (Decimal(worked) / 3600 * Decimal('512.50')).quantize(Decimal('0.01'))
+            social_fees = (gross * Decimal('0.2897')).quantize(Decimal('0.01'))
+            income_tax = ((gross - social_fees) * Decimal('0.32')).quantize(Decimal('0.01'))
+            self.assertEqual(result['gross'][i], gross)
+            self.assertEqual(result['social_fees'][i], social_fees)
+            self.assertEqual(result['income_tax'][i], income_tax)
+            self.assertEqual(result['net'][i], gross - social_fees - income_tax)
+
+    def test_compute_earnings_accepts_rate_per_element(self):
+        result = compute_earnings([3600, 3600], [100, 250], municipal_tax_rate=Decimal('0.30'))
+        self.assertEqual(result['gross'], [Decimal('100.00'), Decimal('250.00')])
+        self.assertEqual(result['income_tax'][0], Decimal('21.31'))
+
+    def test_income_rate_grid_sweeps_salary_and_hours(self):
+        grid = income_rate_grid([40000, 50000], [140, 0, 160], overhead_costs=2000, profit_margin=10, municipal_tax=32, year=2024)
+        self.assertEqual(grid['social_fees'], [Decimal('11588.00'), Decimal('14485.00')])
+        self.assertEqual(grid['total_monthly_cost'][0], Decimal('40000') + Decimal('11588') + 4800 + 1800 + 2000 + 2000)
+        self.assertEqual(grid['total_to_invoice'][0], Decimal('68406.80'))
+        self.assertEqual(grid['hourly_rate'][0], [Decimal('488.62'), Decimal('0.00'), Decimal('427.54')])
+        self.assertEqual(len(grid['hourly_rate']), 2)
+        self.assertEqual(grid['net_salary'][0], Decimal('27200.00'))
+
+    def test_amounts_beyond_int64_raise_overflow(self):
+        with self.assertRaises(OverflowError):
+            income_rate_grid([Decimal('1e30')], [140])
+        with self.assertRaises(OverflowError):
+            income_rate_grid([Decimal('1e15')], [140], profit_margin=1000)
+        with self.assertRaises(OverflowError):
+            compute_earnings([3600 * 10 ** 9], Decimal('1e9'))
+
+
+class AnalyticsPageTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.organization = Organization.objects.create(name='Test Organization')
+        self.organization.members.add(self.user)
+        category = Contact.objects.create(
+            organization=self.organization, name='Design', contact_type=Contact.ContactType.CATEGORY
+        )
+        self.billable = Project.objects.create(
+            name='Billable', organization=self.organization, contact=category, hourly_rate=Decimal('500')
+        )
+        unbilled = Project.objects.create(name='Internal', organization=self.organization)
+        now = timezone.now()
+        for project, hours in [(self.billable, 2), (self.billable, 1), (unbilled, 4), (None, 1)]:
+            TimeEntry.objects.create(
+                user=self.user, project=project, title='Work',
+                start_time=now - timedelta(hours=hours + 1), end_time=now - timedelta(hours=1),
+            )
+        self.client.login(username='testuser', password='testpassword')
+
+    def test_charts_group_hours_by_category_and_earnings_by_project(self):
+        response = self.client.get(reverse('workspaces:analytics:dashboard'), {'period': '7d'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['category_chart_labels'], ['Uncategorized', 'Design'])
+        self.assertEqual(response.context['category_chart_data'], [5.0, 3.0])
+        self.assertEqual(response.context['earnings_chart_labels'], ['Billable'])
+        self.assertEqual(response.context['earnings_chart_data'], [1500.0])
+        self.assertAlmostEqual(response.context['total_earnings'], 1500.0)
+
+    def test_base_template_links_to_the_current_pages(self):
+        response = self.client.get(reverse('workspaces:project_list'))
+        for url in [
+            reverse('workspaces:home'), reverse('workspaces:time_entry_list'), reverse('reports:reports'),
+            reverse('workspaces:analytics:income_calculator'), reverse('workspaces:analytics:dashboard'),
+        ]:
+            self.assertContains(response, f'href="{url}"')
+        self.assertContains(response, f'v{settings.APP_VERSION}')
+
+    def test_daily_earnings_page_renders_with_the_tracker_tags(self):
+        response = self.client.get(reverse('workspaces:analytics:daily_earnings_tracker'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'tracker/daily_earnings_tracker.html')
+
+
+class IncomeCalculatorViewTest(TestCase):
+    def setUp(self):
+        User.objects.create_user(username='testuser', password='testpassword')
+        self.client.login(username='testuser', password='testpassword')
+        self.url = reverse('workspaces:analytics:income_calculator')
+
+    def test_valid_input_is_calculated(self):
+        response = self.client.get(self.url, {'desired_salary': 40000, 'billable_hours': 140})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['form'].errors)
+        self.assertIn('hourly_rate_to_charge', response.context)
+
+    def test_out_of_range_input_is_a_form_error(self):
+        for params in [{'desired_salary': '1e30'}, {'desired_salary': 'NaN'}, {'desired_salary': 40000, 'billable_hours': -5}]:
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['form'].errors)
+            self.assertNotIn('hourly_rate_to_charge', response.context)
+
+
+class GenerateLoadDataTest(TestCase):
+    def _generate(self, seed=7):
+        call_command(
+            'generate_load_data', organizations=2, members=2, clients=2, projects=1, entries=500,
+            days=60, invoiced_months=1, seed=seed, chunk_size=100, stdout=StringIO(),
+        )
+        return list(
+            TimeEntry.objects.filter(user__username__startswith=f'load{seed}-')
+            .order_by('pk').values_list('title', 'start_time', 'end_time', 'paused_duration')
+        )
+
+    def test_creates_the_requested_number_of_entries(self):
+        entries = self._generate()
+        self.assertEqual(len(entries), 500)
+        self.assertEqual(Organization.objects.filter(name__startswith='Load Org 7-').count(), 2)
+        self.assertFalse(TimeEntry.objects.filter(end_time__gt=timezone.now()).exists())
+        self.assertTrue(all(end > start for _, start, end, _ in entries))
+        self.assertTrue(any(paused > timedelta(0) for *_, paused in entries))
+
+    def test_members_are_not_staff_and_cannot_log_in_with_a_password(self):
+        self._generate()
+        members = User.objects.filter(username__startswith='load7-')
+        self.assertEqual(members.count(), 4)
+        self.assertFalse(members.filter(is_staff=True).exists())
+        self.assertFalse(any(member.has_usable_password() for member in members))
+
+    def test_same_seed_gives_the_same_entries(self):
+        first = self._generate()
+        User.objects.filter(username__startswith='load7-').delete()
+        Organization.objects.filter(name__startswith='Load Org 7-').delete()
+        second = self._generate()
+        self.assertEqual(
+            [(title, end - start, paused) for title, start, end, paused in first],
+            [(title, end - start, paused) for title, start, end, paused in second],
+        )
+
+
+@override_settings(SYNC_CURSOR_OVERLAP_SECONDS=0)
+class TimeEntrySyncTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='testuser', password='testpassword')
+        self.organization = Organization.objects.create(name='Test Organization')
+        self.organization.members.add(self.user)
+        self.project = Project.objects.create(name='Synced', organization=self.organization)
+        other_organization = Organization.objects.create(name='Other Organization')
+        other_project = Project.objects.create(name='Other', organization=other_organization)
+        now = timezone.now()
+        self.entries = [
+            TimeEntry.objects.create(
+                user=self.user, project=self.project, title=f'Entry {index}',
+                start_time=now - timedelta(hours=index + 2), end_time=now - timedelta(hours=index + 1),
+            )
+            for index in range(3)
+        ]
+        TimeEntry.objects.create(user=self.user, project=other_project, title='Other', start_time=now)
+        TimeEntry.objects.create(user=self.user, title='Personal', start_time=now)
+        self.token, self.key = ApiToken.create_for(self.organization, 'BI')
+        self.url = reverse('workspaces:time_entry_sync')
+
+    def _sync(self, since=None, key=None):
+        params = {'since': since} if since else {}
+        response = self.client.get(self.url, params, HTTP_AUTHORIZATION=f'Bearer {key or self.key}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(lines[-1], {'type': 'cursor', 'cursor': response['X-Sync-Cursor']})
+        return lines[:-1], lines[-1]['cursor']
+
+    def _age_everything(self):
+        past = timezone.now() - timedelta(minutes=5)
+        TimeEntry.objects.update(updated_at=past)
+        TimeEntryTombstone.objects.update(deleted_at=past)
+
+    def test_requires_an_active_token(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer')
+        ApiToken.objects.filter(pk=self.token.pk).update(revoked_at=timezone.now())
+        self.assertEqual(self.client.get(self.url, HTTP_AUTHORIZATION=f'Bearer {self.key}').status_code, 401)
+
+    def test_full_export_lists_the_organization_entries(self):
+        lines, _ = self._sync()
+        self.assertEqual([line['title'] for line in lines], ['Entry 0', 'Entry 1', 'Entry 2'])
+        self.assertEqual(lines[0]['type'], 'time_entry')
+        self.assertEqual(lines[0]['project'], 'Synced')
+        self.assertEqual(lines[0]['username'], 'testuser')
+        self.assertEqual(lines[0]['paused_seconds'], 0)
+        self.token.refresh_from_db()
+        self.assertIsNotNone(self.token.last_used_at)
+
+    def test_incremental_sync_returns_changes_and_deletions(self):
+        self._age_everything()
+        _, cursor = self._sync()
+        edited, archived, deleted = self.entries
+        edited.title = 'Edited'
+        edited.save()
+        TimeEntry.objects.filter(pk=archived.pk).update(is_archived=True)
+        deleted_pk = deleted.pk
+        deleted.delete()
+
+        lines, next_cursor = self._sync(since=cursor)
+        self.assertEqual(lines[0]['type'], 'deleted')
+        self.assertEqual(lines[0]['id'], deleted_pk)
+        self.assertEqual(
+            sorted((line['title'], line['is_archived']) for line in lines[1:]),
+            [('Edited', False), ('Entry 1', True)],
+        )
+        self._age_everything()
+        self.assertEqual(self._sync(since=next_cursor)[0], [])
+
+    def test_deleting_a_project_leaves_tombstones(self):
+        self._age_everything()
+        _, cursor = self._sync()
+        self.project.delete()
+        lines, _ = self._sync(since=cursor)
+        self.assertEqual(sorted(line['id'] for line in lines), sorted(entry.pk for entry in self.entries))
+        self.assertTrue(all(line['type'] == 'deleted' for line in lines))
+
+    def test_bulk_delete_writes_tombstones_in_one_query(self):
+        now = timezone.now()
+        TimeEntry.objects.bulk_create([
+            TimeEntry(user=self.user, project=self.project, title=f'Bulk {index}', start_time=now)
+            for index in range(20)
+        ])
+        # Savepoint, the tombstones' INSERT ... SELECT, the entries, their images, the delete, release
+        with self.assertNumQueries(6):
+            TimeEntry.objects.filter(project=self.project).delete()
+        self.assertEqual(TimeEntryTombstone.objects.filter(organization=self.organization).count(), 23)
+        with self.assertNumQueries(0):
+            self.assertEqual(TimeEntryTombstone.record(TimeEntry.objects.none()), 0)
+
+    def test_entries_moved_out_of_the_organization_leave_tombstones(self):
+        other_project = Project.objects.get(name='Other')
+        self._age_everything()
+        _, cursor = self._sync()
+        cleared, moved, bulk_moved = self.entries
+        cleared.project = None
+        cleared.save()
+        moved.project = other_project
+        moved.save()
+        TimeEntry.objects.filter(pk=bulk_moved.pk).update(project=other_project)
+        lines, _ = self._sync(since=cursor)
+        self.assertEqual(
+            sorted((line['type'], line['id']) for line in lines),
+            sorted(('deleted', entry.pk) for entry in self.entries),
+        )
+
+    def test_project_moved_to_another_organization_leaves_tombstones(self):
+        self._age_everything()
+        _, cursor = self._sync()
+        self.project.organization = Organization.objects.get(name='Other Organization')
+        self.project.save()
+        lines, _ = self._sync(since=cursor)
+        self.assertEqual(sorted(line['id'] for line in lines), sorted(entry.pk for entry in self.entries))
+        self.assertTrue(all(line['type'] == 'deleted' for line in lines))
+        moved_ids = {entry.pk for entry in self.entries}
+        other_key = ApiToken.create_for(self.project.organization, 'Other BI')[1]
+        other_lines, _ = self._sync(since=cursor, key=other_key)
+        self.assertEqual({line['id'] for line in other_lines if line['type'] == 'time_entry'}, moved_ids)
+
+    def test_moving_within_the_organization_is_an_update(self):
+        sibling = Project.objects.create(name='Sibling', organization=self.organization)
+        self._age_everything()
+        _, cursor = self._sync()
+        TimeEntry.objects.filter(pk=self.entries[0].pk).update(project=sibling)
+        lines, _ = self._sync(since=cursor)
+        self.assertEqual([(line['type'], line['project']) for line in lines], [('time_entry', 'Sibling')])
+
+    def test_query_count_does_not_grow_with_entries(self):
+        self._age_everything()
+        _, cursor = self._sync()
+        for entry in self.entries:
+            entry.save()
+        with self.assertNumQueries(4):
+            lines, _ = self._sync(since=cursor)
+        self.assertEqual(len(lines), 3)
+
+    def test_deleting_an_invoice_syncs_the_unbilled_entries(self):
+        client = Contact.objects.create(
+            organization=self.organization, name='Client', contact_type=Contact.ContactType.CLIENT
+        )
+        invoice = Invoice.objects.create(organization=self.organization, contact=client, due_date=date(2030, 1, 1))
+        TimeEntry.objects.filter(pk=self.entries[0].pk).update(invoice=invoice)
+        self._age_everything()
+        _, cursor = self._sync()
+        invoice.delete()
+        lines, _ = self._sync(since=cursor)
+        self.assertEqual([(line['id'], line['invoice_id']) for line in lines], [(self.entries[0].pk, None)])
+
+    def test_bad_and_expired_cursors(self):
+        self.assertEqual(
+            self.client.get(self.url, {'since': 'nope'}, HTTP_AUTHORIZATION=f'Bearer {self.key}').status_code, 400
+        )
+        expired = encode_cursor(timezone.now() - timedelta(days=365))
+        self.assertEqual(
+            self.client.get(self.url, {'since': expired}, HTTP_AUTHORIZATION=f'Bearer {self.key}').status_code, 410
+        )
+
+    def test_purge_removes_old_tombstones(self):
+        self.entries[0].delete()
+        TimeEntryTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=365))
+        recent_pk = self.entries[1].pk
+        self.entries[1].delete()
+        call_command('purge_sync_tombstones', stdout=StringIO())
+        self.assertEqual(list(TimeEntryTombstone.objects.values_list('entry_id', flat=True)), [recent_pk])
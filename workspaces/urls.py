@@ -1,5 +1,5 @@
 from django.urls import path, include
-from . import views
+from . import sync, views
 
 app_name = 'workspaces'
 
@@ -42,4 +42,7 @@ urlpatterns = [
     
     # Contacts
     path('contacts/', views.ManageContactsView.as_view(), name='manage_contacts'),
+
+    # Incremental NDJSON export for API token clients
+    path('api/sync/time-entries/', sync.time_entry_sync, name='time_entry_sync'),
 ]
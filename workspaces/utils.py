@@ -1,9 +1,14 @@
 from io import BytesIO
+from datetime import date, datetime, time, timedelta
 from django.http import HttpResponse
+from django.db.models import DurationField, ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Greatest
 from django.template.loader import get_template
 from xhtml2pdf import pisa
 from django.conf import settings
 from django.contrib.staticfiles import finders
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 def link_callback(uri, rel):
     """
@@ -21,14 +26,21 @@ def link_callback(uri, rel):
         return result[0] if isinstance(result, (list, tuple)) else result
     return uri # Return the original URI if not found
 
-def render_to_pdf(template_src, context_dict={}):
+def render_pdf_bytes(template_src, context_dict={}):
+    """Renders a template to PDF and returns the bytes, or None on error."""
     template = get_template(template_src)
     html  = template.render(context_dict)
     result = BytesIO()
     # The encoding is important for handling different languages
     pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result, link_callback=link_callback)
     if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type='application/pdf')
+        return result.getvalue()
+    return None
+
+def render_to_pdf(template_src, context_dict={}):
+    content = render_pdf_bytes(template_src, context_dict)
+    if content is not None:
+        return HttpResponse(content, content_type='application/pdf')
     return None
 
 def format_duration_hms(duration):
@@ -49,3 +61,47 @@ def format_duration_hms(duration):
         parts.append(f"{seconds}s")
         
     return " ".join(parts)
+
+def worked_duration_expression():
+    """Worked time of a TimeEntry in SQL: gross duration minus pauses, never negative."""
+    return Greatest(
+        ExpressionWrapper(F('end_time') - F('start_time') - F('paused_duration'), output_field=DurationField()),
+        Value(timedelta(0)),
+    )
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(f"Invalid date: {value!r}")
+    return parsed
+
+def local_date_bounds(start_date=None, end_date=None, tz=None):
+    """
+    Half-open aware datetimes [start, end) covering the local calendar days
+    start_date to end_date inclusive, in `tz` (the current timezone by
+    default). Dates may be date objects or ISO strings; either may be None.
+    """
+    tz = tz or timezone.get_current_timezone()
+    start_date, end_date = _as_date(start_date), _as_date(end_date)
+    start = timezone.make_aware(datetime.combine(start_date, time.min), tz) if start_date else None
+    end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz) if end_date else None
+    return start, end
+
+def date_range_q(start_date=None, end_date=None, field='start_time', end_field=None, tz=None):
+    """
+    Q selecting rows whose `field` falls on local days start_date..end_date.
+
+    Compares the raw column against datetime bounds instead of using
+    `__date` lookups, which cast every row and cannot use an index.
+    `end_field` applies the upper bound to another column, e.g. entries
+    starting on or after start_date and ending before end_date + 1 day.
+    """
+    start, end = local_date_bounds(start_date, end_date, tz)
+    q = Q()
+    if start is not None:
+        q &= Q(**{f'{field}__gte': start})
+    if end is not None:
+        q &= Q(**{f'{end_field or field}__lt': end})
+    return q
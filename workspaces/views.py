@@ -7,10 +7,10 @@ from django.urls import reverse_lazy, reverse
 from .models import TimeEntry, Project, TimeEntryImage, Contact
 from .forms import ProjectForm, TimeEntryManualForm, ClientForm, CategoryForm
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Prefetch, Q
 from django.http import JsonResponse
 from datetime import timedelta
-from .utils import format_duration_hms
+from .utils import date_range_q, format_duration_hms
 from django.db import transaction
 from django.utils import timezone
 from .mixins import OrganizationPermissionMixin
@@ -146,6 +146,24 @@ class TimeEntryListView(LoginRequiredMixin, OrganizationPermissionMixin, ListVie
     context_object_name = 'entries'
     paginate_by = 15
 
+    def get_queryset(self):
+        # TimeEntry has no organization, so entries are scoped to their owner.
+        # Rows show the project name and the first image; load both up front.
+        # The ordered Prefetch lets `entry.images.first` read the prefetch cache.
+        queryset = TimeEntry.objects.filter(user=self.request.user).select_related('project').prefetch_related(
+            Prefetch('images', queryset=TimeEntryImage.objects.order_by('pk'))
+        )
+        # Invalid dates are ignored rather than failing the whole list
+        try:
+            date_filter = date_range_q(
+                self.request.GET.get('start_date') or None, self.request.GET.get('end_date') or None
+            )
+        except ValueError:
+            date_filter = None
+        if date_filter:
+            queryset = queryset.filter(date_filter)
+        return queryset
+
     def get_paginate_by(self, queryset):
         filter_keys = ['start_date', 'end_date', 'project', 'show_archived']
         if any(self.request.GET.get(key) for key in filter_keys):
@@ -316,24 +334,15 @@ def get_projects_for_category(request):
 
 class ManageContactsView(LoginRequiredMixin, OrganizationPermissionMixin, View):
     def get(self, request, *args, **kwargs):
-        client_form = ClientForm()
-        category_form = CategoryForm()
-        clients = Contact.objects.filter(organization=request.user.organizations.first(), contact_type='CLIENT')
-        categories = Contact.objects.filter(organization=request.user.organizations.first(), contact_type='CATEGORY')
-        context = {
-            'client_form': client_form,
-            'category_form': category_form,
-            'clients': clients,
-            'categories': categories,
-        }
-        return render(request, 'workspaces/manage_contacts.html', context)
+        return self._render(request, request.user.organizations.first(), ClientForm(), CategoryForm())
 
     def post(self, request, *args, **kwargs):
+        organization = request.user.organizations.first()
         if 'submit_client' in request.POST:
             form = ClientForm(request.POST)
             if form.is_valid():
                 contact = form.save(commit=False)
-                contact.organization = request.user.organizations.first()
+                contact.organization = organization
                 contact.contact_type = 'CLIENT'
                 contact.save()
                 messages.success(request, 'Client created successfully.')
@@ -342,7 +351,7 @@ class ManageContactsView(LoginRequiredMixin, OrganizationPermissionMixin, View):
             form = CategoryForm(request.POST)
             if form.is_valid():
                 contact = form.save(commit=False)
-                contact.organization = request.user.organizations.first()
+                contact.organization = organization
                 contact.contact_type = 'CATEGORY'
                 contact.save()
                 messages.success(request, 'Category created successfully.')
@@ -355,13 +364,15 @@ class ManageContactsView(LoginRequiredMixin, OrganizationPermissionMixin, View):
             client_form = form
         elif 'submit_category' in request.POST:
             category_form = form
-            
-        clients = Contact.objects.filter(organization=request.user.organizations.first(), contact_type='CLIENT')
-        categories = Contact.objects.filter(organization=request.user.organizations.first(), contact_type='CATEGORY')
+        return self._render(request, organization, client_form, category_form)
+
+    def _render(self, request, organization, client_form, category_form):
+        # One query for both lists, split by type in Python
+        contacts = list(Contact.objects.filter(organization=organization))
         context = {
             'client_form': client_form,
             'category_form': category_form,
-            'clients': clients,
-            'categories': categories,
+            'clients': [contact for contact in contacts if contact.contact_type == 'CLIENT'],
+            'categories': [contact for contact in contacts if contact.contact_type == 'CATEGORY'],
         }
         return render(request, 'workspaces/manage_contacts.html', context)